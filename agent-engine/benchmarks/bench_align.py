@@ -0,0 +1,101 @@
+"""
+Cache Aligner benchmark — single-pass CacheAligner vs. the legacy
+one-re.sub-per-pattern loop, over multi-MB synthetic log dumps.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_align [--mb 2 8] [--repeat 3]
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+
+from crusher import CacheAligner
+
+# The pre-CacheAligner Stage 1, kept verbatim for comparison
+LEGACY_PATTERNS = [
+    (r'\b\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[.\d]*Z?\b', '[TIMESTAMP]'),
+    (r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', '[UUID]'),
+    (r'req-\d+', '[REQ_ID]'),
+    (r'session_[a-zA-Z0-9]+', '[SESSION_ID]'),
+]
+
+
+def legacy_align(text: str) -> str:
+    for pattern, replacement in LEGACY_PATTERNS:
+        text = re.sub(pattern, replacement, text)
+    return text
+
+
+# Tokens that overlap, where rule order decides the output
+OVERLAPS = [
+    "req-2024-01-01T12:00:00Z",
+    "req-5abcdef1-0000-4000-8000-123456789abc",
+    "session_req-5",
+    "session_xreq-5",
+    "session_xreq-2024-01-01T12:00:00Z",
+    "2024-01-01T12:00:00.12345678-aaaa-bbbb-cccc-123456789abc",
+]
+
+
+def make_log_dump(target_bytes: int, seed: int = 0) -> str:
+    """Agent tool output: dense access logs mixed with plain prose lines."""
+    rng = random.Random(seed)
+    levels = ["INFO", "INFO", "INFO", "DEBUG", "WARN", "ERROR"]
+    lines: list[str] = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        if i % 4 == 3:
+            line = f"    processed batch {i} of the nightly sync without incident ({rng.randint(1, 999)} rows)"
+        else:
+            line = (
+                f"2024-05-{i % 28 + 1:02d}T{i % 24:02d}:{i % 60:02d}:{rng.randint(0, 59):02d}.{rng.randint(0, 999):03d}Z "
+                f"{rng.choice(levels)} req-{rng.randint(1, 10**6)} session_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]} "
+                f"user={uuid.UUID(int=rng.getrandbits(128))} GET /api/items?page={i % 9} {rng.randint(1, 900)}ms"
+            )
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+
+def _best_of(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes_mb: list[float], repeat: int = 3) -> list[dict]:
+    aligner = CacheAligner()
+    for text in OVERLAPS:
+        assert aligner.align(text) == legacy_align(text), f"aligner output diverged from legacy on {text!r}"
+    results = []
+    for mb in sizes_mb:
+        text = make_log_dump(int(mb * 1024 * 1024))
+        assert aligner.align(text) == legacy_align(text), "aligner output diverged from legacy"
+        legacy = _best_of(legacy_align, text, repeat)
+        single = _best_of(aligner.align, text, repeat)
+        mbytes = len(text) / (1024 * 1024)
+        results.append({
+            "size_mb": round(mbytes, 2),
+            "legacy_mb_s": round(mbytes / legacy, 1),
+            "single_pass_mb_s": round(mbytes / single, 1),
+            "speedup": round(legacy / single, 2),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, nargs="+", default=[2, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for row in run(args.mb, args.repeat):
+        print(json.dumps(row))
@@ -0,0 +1,76 @@
+"""
+Batch endpoint benchmark — N single /crush and /recall requests vs. one
+/crush/batch and one /recall/batch carrying the same items, in process
+against the fake PostgREST.
+
+The item mix repeats documents and queries the way agents resend them,
+so batch dedupe shows up alongside the saved per-request overhead.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_batch [--items 100] [--distinct 20] [--db-latency-ms 5]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+import memory
+from benchmarks.bench_align import make_log_dump
+from db import AsyncPostgrest
+from executor import crush_executor
+from fakes import postgrest as fake
+from main import app
+from memory import Custodian
+
+QUERIES = ["deploy", "cadence", "decision 4", "steady", "keep deploy", "rollback"]
+
+
+async def run(items: int = 100, distinct: int = 20, db_latency_ms: float = 5) -> list[dict]:
+    fake.seed(agents=5, inbox=10, memories=500)
+    fake.LATENCY = db_latency_ms / 1000
+    db = AsyncPostgrest("http://fake", "fake", transport=httpx.ASGITransport(app=fake.app))
+    memory.custodian = Custodian(db)
+    docs = [make_log_dump(4096, seed=i % distinct) for i in range(items)]
+    queries = [QUERIES[i % len(QUERIES)] + ("" if i < distinct else f" {i % distinct}") for i in range(items)]
+
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://engine") as client:
+            await client.get("/recall", params={"query": "warmup"})
+
+            for name, single, batch in (
+                ("crush",
+                 lambda: asyncio.gather(*(client.post("/crush", json={"content": d}) for d in docs)),
+                 lambda: client.post("/crush/batch", json={"items": [{"content": d} for d in docs]})),
+                ("recall",
+                 lambda: asyncio.gather(*(client.get("/recall", params={"query": q}) for q in queries)),
+                 lambda: client.post("/recall/batch", json={"queries": [{"query": q} for q in queries]})),
+            ):
+                start = time.perf_counter()
+                await single()
+                singles = time.perf_counter() - start
+
+                start = time.perf_counter()
+                response = await batch()
+                batched = time.perf_counter() - start
+                response.raise_for_status()
+
+                results.append({"endpoint": name, "items": items, "singles_ms": round(singles * 1000, 1),
+                                "batch_ms": round(batched * 1000, 1), "speedup": round(singles / batched, 2)})
+    finally:
+        await memory.custodian.aclose()
+        crush_executor.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    args = parser.parse_args()
+    for row in asyncio.run(run(args.items, args.distinct, args.db_latency_ms)):
+        print(json.dumps(row))
@@ -0,0 +1,136 @@
+"""
+SmartCrusher benchmark — full crush() latency and savings over synthetic
+log, JSON and mixed payloads of increasing size.
+
+Cold runs use an empty result cache (all three stages); warm runs repeat
+the same payload so Stages 2–3 come from the cache. Per-stage means come
+from CrushResult.stage_seconds. JSON payloads run through both the
+structured path and the line-based text path.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_crusher [--kb 4 64 512] [--repeat 5]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks.bench_align import make_log_dump
+from cache import TTLCache
+from crusher import SmartCrusher
+
+SERVICES = ["api", "auth", "billing", "search", "worker"]
+
+
+def make_json(target_bytes: int, seed: int = 0) -> list[dict]:
+    """API response dump: uniform records with a few repeated values."""
+    rng = random.Random(seed)
+    records = []
+    size = 0
+    while size < target_bytes:
+        record = {
+            "id": f"{rng.getrandbits(128):032x}",
+            "service": rng.choice(SERVICES),
+            "status": rng.choice(["ok", "ok", "ok", "degraded", "error"]),
+            "latency_ms": rng.randint(1, 900),
+            "region": rng.choice(["us-east-1", "eu-west-1"]),
+            "tags": rng.sample(["p1", "canary", "retry", "cold", "batch"], 2),
+            "message": rng.choice(["request served", "cache miss", "upstream timeout", "rate limited"]),
+        }
+        records.append(record)
+        size += len(json.dumps(record)) + 2
+    return records
+
+
+def make_mixed(target_bytes: int, seed: int = 0) -> str:
+    """Tool output: log lines interleaved with pretty-printed JSON blobs
+    and stack traces."""
+    rng = random.Random(seed)
+    logs = make_log_dump(target_bytes // 2, seed).splitlines()
+    blobs = make_json(target_bytes // 3, seed)
+    parts: list[str] = []
+    size = 0
+    while size < target_bytes:
+        roll = rng.random()
+        if roll < 0.6 and logs:
+            part = logs[rng.randrange(len(logs))]
+        elif roll < 0.9:
+            part = json.dumps(blobs[rng.randrange(len(blobs))], indent=2)
+        else:
+            part = ("Traceback (most recent call last):\n"
+                    f'  File "/srv/{rng.choice(SERVICES)}/handler.py", line {rng.randint(10, 500)}, in handle\n'
+                    "TimeoutError: upstream did not respond")
+        parts.append(part)
+        size += len(part) + 1
+    return "\n".join(parts)
+
+
+PAYLOADS = {
+    "logs": lambda n: make_log_dump(n),
+    "json": make_json,
+    "mixed": make_mixed,
+}
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _valid_json(text: str) -> bool:
+    try:
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+
+def run(sizes_kb: list[int], repeat: int = 5, max_chars: int = 4000) -> list[dict]:
+    results = []
+    for name, make in PAYLOADS.items():
+        for kb, structured in [(kb, s) for kb in sizes_kb for s in ((True, False) if name == "json" else (True,))]:
+            payload = make(kb * 1024)
+            chars = len(SmartCrusher(structured=structured).serialize(payload))
+
+            cold: list[float] = []
+            stages: dict[str, list[float]] = {}
+            for _ in range(repeat):
+                crusher = SmartCrusher(max_chars=max_chars, cache=TTLCache(), structured=structured)
+                start = time.perf_counter()
+                result = crusher.crush(payload, retain=False)
+                cold.append(time.perf_counter() - start)
+                for stage, seconds in result.stage_seconds.items():
+                    stages.setdefault(stage, []).append(seconds)
+
+            warm: list[float] = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                crusher.crush(payload, retain=False)
+                warm.append(time.perf_counter() - start)
+
+            row = {
+                "payload": name,
+                "kb": round(chars / 1024, 1),
+                "cold_p50_ms": round(statistics.median(cold) * 1000, 3),
+                "cold_p95_ms": round(_percentile(cold, 0.95) * 1000, 3),
+                "warm_p50_ms": round(statistics.median(warm) * 1000, 3),
+                "cold_mb_per_s": round(chars / (1024 * 1024) / statistics.median(cold), 1),
+                "savings_pct": result.savings_pct,
+                **{f"{stage}_ms": round(statistics.mean(s) * 1000, 3) for stage, s in stages.items()},
+            }
+            if name == "json":
+                row.update(structured=structured, valid_json=_valid_json(result.content))
+            results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", type=int, nargs="+", default=[4, 64, 512])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-chars", type=int, default=4000)
+    args = parser.parse_args()
+    for row in run(args.kb, args.repeat, args.max_chars):
+        print(json.dumps(row))
@@ -0,0 +1,72 @@
+"""
+Custodian load test — concurrent /recall, /inbox and /fleet style queries
+against the in-process fake PostgREST with simulated network latency.
+
+Sequential awaits show what a blocking client costs; concurrent gathers
+show how far the pooled async client overlaps round-trips.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_custodian [--requests 300] [--latency-ms 20]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from db import AsyncPostgrest
+from fakes import postgrest as fake
+from memory import Custodian
+
+
+def _queries(custodian: Custodian, n: int):
+    calls = [
+        lambda: custodian.recall("deploy", 5),
+        lambda: custodian.get_inbox("NEW", 10),
+        lambda: custodian.get_fleet_status(),
+    ]
+    return [calls[i % len(calls)] for i in range(n)]
+
+
+async def run(requests: int = 300, latency_ms: float = 20, pool_size: int = 20) -> list[dict]:
+    fake.seed(agents=10, inbox=50, memories=500)
+    fake.LATENCY = latency_ms / 1000
+    db = AsyncPostgrest("http://fake", "fake", pool_size=pool_size, transport=httpx.ASGITransport(app=fake.app))
+    custodian = Custodian(db)
+
+    results = []
+    try:
+        start = time.perf_counter()
+        for call in _queries(custodian, requests):
+            await call()
+        sequential = time.perf_counter() - start
+        results.append({"mode": "sequential", "requests": requests, "seconds": round(sequential, 3),
+                        "req_per_s": round(requests / sequential, 1)})
+
+        semaphore = asyncio.Semaphore(pool_size)
+
+        async def bounded(call):
+            async with semaphore:
+                return await call()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(call) for call in _queries(custodian, requests)))
+        concurrent = time.perf_counter() - start
+        results.append({"mode": "concurrent", "requests": requests, "seconds": round(concurrent, 3),
+                        "req_per_s": round(requests / concurrent, 1),
+                        "speedup": round(sequential / concurrent, 2)})
+    finally:
+        await custodian.aclose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--pool-size", type=int, default=20)
+    args = parser.parse_args()
+    for row in asyncio.run(run(args.requests, args.latency_ms, args.pool_size)):
+        print(json.dumps(row))
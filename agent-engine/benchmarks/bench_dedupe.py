@@ -0,0 +1,121 @@
+"""
+Smart Crusher (Stage 2) benchmark — the legacy per-line dedupe vs. the
+fingerprinting LineDeduper, in exact and near-duplicate mode, over
+synthetic 100k-line logs.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_dedupe [--lines 100000] [--repeat 3]
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+
+from crusher import SmartCrusher
+
+SIGNALS = SmartCrusher.CRITICAL_SIGNALS
+
+
+def legacy_smart_crush(text: str) -> str:
+    """The pre-fingerprint Stage 2, kept verbatim for comparison."""
+    lines = text.split('\n')
+    if len(lines) <= 10:
+        return text
+
+    seen_patterns: set[str] = set()
+    kept_lines: list[str] = []
+    skipped_count = 0
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        is_critical = any(signal in stripped.lower() for signal in SIGNALS)
+        if is_critical:
+            if skipped_count > 0:
+                kept_lines.append(f"  [... {skipped_count} similar entries omitted ...]")
+                skipped_count = 0
+            kept_lines.append(line)
+            continue
+
+        normalized = re.sub(r'\d+', 'N', stripped)
+        if normalized in seen_patterns:
+            skipped_count += 1
+            continue
+
+        seen_patterns.add(normalized)
+        if skipped_count > 0:
+            kept_lines.append(f"  [... {skipped_count} similar entries omitted ...]")
+            skipped_count = 0
+        kept_lines.append(line)
+
+    if skipped_count > 0:
+        kept_lines.append(f"  [... {skipped_count} similar entries omitted ...]")
+
+    return '\n'.join(kept_lines)
+
+
+def make_log(lines: int, seed: int = 0) -> str:
+    """Service log: mostly access lines, some cache paths and hex ids, ~1% errors."""
+    rng = random.Random(seed)
+    services = ["api", "db", "cache", "auth", "queue"]
+    out = []
+    for i in range(lines):
+        roll = rng.random()
+        if roll < 0.01:
+            out.append(f"  ERROR worker {i % 7} failed: upstream timeout after {rng.randint(1, 90)}s")
+        elif roll < 0.2:
+            out.append(f"  DEBUG evicted /var/cache/{rng.choice(services)}/{rng.getrandbits(32):08x}.bin ({rng.randint(1, 900)} KB)")
+        elif roll < 0.3:
+            out.append(f"  INFO object 0x{rng.getrandbits(48):012x} handed to {rng.choice(services)} pool")
+        else:
+            out.append(
+                f"  INFO [{rng.choice(services)}] GET /v1/items/{rng.randint(1, 5000)} 200 "
+                f"{rng.randint(1, 900)}ms user=u{rng.randint(1, 500)}"
+            )
+    return "\n".join(out)
+
+
+def _best_of(fn, text: str, repeat: int) -> tuple[float, str]:
+    best = float("inf")
+    output = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+def run(lines: int = 100_000, repeat: int = 3) -> list[dict]:
+    text = make_log(lines)
+    variants = {
+        "legacy": legacy_smart_crush,
+        "fingerprint": SmartCrusher()._smart_crush,
+        "near_duplicates": SmartCrusher(near_duplicates=True)._smart_crush,
+    }
+    results = []
+    baseline = None
+    for name, fn in variants.items():
+        seconds, output = _best_of(fn, text, repeat)
+        baseline = baseline or seconds
+        results.append({
+            "variant": name,
+            "lines": lines,
+            "seconds": round(seconds, 4),
+            "lines_per_s": int(lines / seconds),
+            "speedup": round(baseline / seconds, 2),
+            "kept_lines": output.count('\n') + 1,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for row in run(args.lines, args.repeat):
+        print(json.dumps(row))
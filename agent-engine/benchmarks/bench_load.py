@@ -0,0 +1,136 @@
+"""
+API load test — the FastAPI app end to end, in process, with Supabase
+replaced by the fake PostgREST (or the SQLite storage backend) and
+Gemini by MockLLM.
+
+Concurrent clients replay a weighted, seeded request mix (crush, fleet,
+inbox, recall, context, memory writes, health) through ASGITransport, so
+the numbers cover routing, validation, the crusher and the Custodian but
+no real network.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_load [--requests 2000] [--concurrency 32] [--db-latency-ms 5]
+    python -m benchmarks.bench_load --storage memory   # SQLite in RAM instead of the fake
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+import memory
+import worker
+from benchmarks.bench_align import make_log_dump
+from db import AsyncPostgrest
+from executor import crush_executor
+from fakes import postgrest as fake
+from llm import MockLLM
+from main import app
+from memory import Custodian
+from storage import SCHEMA, SqliteStorage
+
+# (route label, weight, request builder)
+MIX = [
+    ("GET /health", 5, lambda rng, logs: ("GET", "/health", None)),
+    ("GET /fleet", 20, lambda rng, logs: ("GET", "/fleet", None)),
+    ("GET /inbox", 20, lambda rng, logs: ("GET", "/inbox?status=NEW&limit=10", None)),
+    ("GET /recall", 15, lambda rng, logs: ("GET", f"/recall?query={rng.choice(['deploy', 'cadence', 'decision 4'])}", None)),
+    ("GET /context", 10, lambda rng, logs: ("GET", "/context", None)),
+    ("POST /crush", 25, lambda rng, logs: ("POST", "/crush", {"content": rng.choice(logs)})),
+    ("POST /memory", 5, lambda rng, logs: ("POST", "/memory", {"content": f"Load test note {rng.random()}"})),
+]
+
+
+def _workload(requests: int, seed: int) -> list[tuple[str, str, str, dict | None]]:
+    rng = random.Random(seed)
+    logs = [make_log_dump(kb * 1024, seed=i) for i, kb in enumerate((2, 8, 32) * 3)]
+    labels = [label for label, _, _ in MIX]
+    weights = [weight for _, weight, _ in MIX]
+    builders = {label: build for label, _, build in MIX}
+    workload = []
+    for label in rng.choices(labels, weights, k=requests):
+        workload.append((label, *builders[label](rng, logs)))
+    return workload
+
+
+def _summary(label: str, latencies: list[float], errors: int) -> dict:
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+    return {"route": label, "requests": len(ordered), "errors": errors,
+            "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+            "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+
+
+async def _storage(kind: str, db_latency_ms: float):
+    """Seeded storage: the fake PostgREST, or SQLite ("memory" / a file path)
+    loaded with the same rows."""
+    fake.seed(agents=10, inbox=50, memories=500)
+    fake.LATENCY = db_latency_ms / 1000
+    if kind == "fake":
+        return AsyncPostgrest("http://fake", "fake", transport=httpx.ASGITransport(app=fake.app))
+    db = SqliteStorage(":memory:" if kind == "memory" else kind)
+    for table, rows in fake.tables.items():
+        await db.insert(table, [{k: v for k, v in row.items() if k in SCHEMA[table]} for row in rows])
+    return db
+
+
+async def run(requests: int = 2000, concurrency: int = 32, db_latency_ms: float = 5, seed: int = 0,
+              storage: str = "fake") -> list[dict]:
+    memory.custodian = Custodian(await _storage(storage, db_latency_ms))  # Handlers and the worker resolve it at call time
+    worker._llm = MockLLM(seed=seed)
+
+    workload = _workload(requests, seed)
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    queue = iter(workload)
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        for label, method, url, body in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.setdefault(label, []).append(time.perf_counter() - start)
+            errors[label] = errors.get(label, 0) + failed
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://engine") as client:
+            await client.get("/fleet")  # Warm views and the recall index outside the timed window
+            await client.get("/recall?query=warmup")
+            await client.post("/crush", json={"content": make_log_dump(64 * 1024, seed=99)})  # Spawns the crush pool
+            start = time.perf_counter()
+            await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+    finally:
+        await memory.custodian.aclose()
+        crush_executor.shutdown()
+
+    results = [_summary(label, latencies[label], errors[label]) for label, _, _ in MIX if label in latencies]
+    everything = [value for values in latencies.values() for value in values]
+    total = _summary("ALL", everything, sum(errors.values()))
+    total.update({"storage": storage, "concurrency": concurrency, "seconds": round(elapsed, 3),
+                  "req_per_s": round(requests / elapsed, 1)})
+    results.append(total)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--storage", default="fake", help="fake | memory | path to a SQLite file")
+    args = parser.parse_args()
+    for row in asyncio.run(run(args.requests, args.concurrency, args.db_latency_ms, args.seed, args.storage)):
+        print(json.dumps(row))
@@ -0,0 +1,91 @@
+"""
+Recall benchmark — BM25 inverted index vs. the ILIKE-style substring scan
+it replaces, at growing memory-log sizes.
+
+The scan is a case-insensitive `in` over every row, which is what a
+sequential `ilike '%query%'` does server-side before sorting by date.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_recall [--sizes 10000,100000,1000000] [--queries 50]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from recall import InvertedIndex
+
+WORDS = (
+    "deploy rollback incident latency database migration cache alert budget review "
+    "release hotfix customer outage scaling queue worker billing invoice retry timeout "
+    "postgres redis gemini prompt token context inbox fleet heartbeat schedule"
+).split()
+CATEGORIES = ["DECISION", "NOTE", "REVIEW", "CONTEXT"]
+QUERIES = ["rollback", "migration svc412", "latency spike", "invoice retry", "ticket7781"]
+
+
+def make_memories(n: int, seed: int = 7) -> list[str]:
+    """Agent log lines; words are Zipf-distributed like natural text."""
+    rng = random.Random(seed)
+    vocabulary = WORDS + [f"svc{i}" for i in range(2000)] + [f"ticket{i}" for i in range(20000)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    words = rng.choices(vocabulary, weights, k=n * 12)
+    return [
+        f"{rng.choice(CATEGORIES)} Cycle {i}: {' '.join(words[i * 12:i * 12 + rng.randint(6, 12)])}"
+        for i in range(n)
+    ]
+
+
+def scan(memories: list[str], query: str, limit: int) -> list[str]:
+    needle = query.lower()
+    return [m for m in reversed(memories) if needle in m.lower()][:limit]
+
+
+def run(sizes: list[int], queries: int = 50, limit: int = 5) -> list[dict]:
+    results = []
+    for size in sizes:
+        memories = make_memories(size)
+
+        start = time.perf_counter()
+        index = InvertedIndex()
+        for memory in memories:
+            index.add(memory)
+        index.search("warmup", limit)  # sorts the vocabulary and length norms once
+        build = time.perf_counter() - start
+
+        workload = [QUERIES[i % len(QUERIES)] for i in range(queries)]
+        start = time.perf_counter()
+        for query in workload:
+            index.search(query, limit)
+        indexed = (time.perf_counter() - start) / queries
+
+        scan_queries = max(1, queries // 10)  # the scan is slow; sample fewer
+        start = time.perf_counter()
+        for query in workload[:scan_queries]:
+            scan(memories, query, limit)
+        scanned = (time.perf_counter() - start) / scan_queries
+
+        start = time.perf_counter()
+        index.add("DECISION fresh memory appended after build")
+        add = time.perf_counter() - start
+
+        results.append({
+            "memories": size,
+            "build_s": round(build, 3),
+            "add_us": round(add * 1e6, 1),
+            "index_query_ms": round(indexed * 1000, 3),
+            "scan_query_ms": round(scanned * 1000, 3),
+            "speedup": round(scanned / indexed, 1),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+    for row in run([int(s) for s in args.sizes.split(",")], args.queries, args.limit):
+        print(json.dumps(row))
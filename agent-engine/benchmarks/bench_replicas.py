@@ -0,0 +1,126 @@
+"""
+Replica benchmark — N standalone worker processes (`python worker.py`)
+sharing one fleet through the fake PostgREST served over HTTP, with and
+without WORKER_LEASES.
+
+Reports agent decisions per second and duplicate replies (inbox items
+answered more than once). Without leases every worker turns every agent,
+so extra workers add duplicate turns; with leases they split the fleet.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_replicas [--workers 1 2 4] [--agents 24] [--seconds 10]
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 15) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(f"{url}/rest/v1/agents", params={"limit": "1"}).raise_for_status()
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _seed(url: str, agents: int, inbox: int) -> None:
+    rest = f"{url}/rest/v1"
+    httpx.patch(f"{rest}/agents", params={"status": "neq.x"}, json={"status": "IDLE"}).raise_for_status()
+    httpx.post(f"{rest}/agents", json=[
+        {"name": f"WORKER AGENT {i}", "role": "Operations", "status": "RUNNING", "last_heartbeat": None}
+        for i in range(agents)
+    ]).raise_for_status()
+    httpx.post(f"{rest}/inbox_items", json=[
+        {"type": "ALERT", "source": "BENCH", "title": f"Alert {i}", "body": f"Queue depth alarm #{i}",
+         "priority": "P1", "status": "NEW"}
+        for i in range(inbox)
+    ]).raise_for_status()
+
+
+def _count(url: str) -> tuple[int, int]:
+    """(decisions, duplicate replies) from what the workers wrote."""
+    rest = f"{url}/rest/v1"
+    memories = httpx.get(f"{rest}/boss_memory", params={"category": "like.WORKER AGENT*"}).json()
+    replies = httpx.get(f"{rest}/inbox_items", params={"type": "eq.MESSAGE"}).json()
+    answered = httpx.get(f"{rest}/inbox_items", params={"source": "eq.BENCH", "status": "eq.READ"}).json()
+    # UPDATE_TASK saves a memory too; count it once
+    decisions = sum(1 for m in memories if not m["category"].endswith("TASK")) + len(replies)
+    return decisions, len(replies) - len(answered)
+
+
+def run_once(workers: int, leases: bool, agents: int, seconds: float, llm_latency_ms: float) -> dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    fake = subprocess.Popen([sys.executable, "-m", "uvicorn", "fakes.postgrest:app", "--port", str(port),
+                             "--log-level", "warning"], cwd=ENGINE_DIR)
+    procs = []
+    try:
+        _wait_ready(url)
+        _seed(url, agents, inbox=agents * 4)
+        env = {
+            **os.environ,
+            "SUPABASE_URL": url,
+            "SUPABASE_KEY": "fake",
+            "LLM_BACKEND": "mock",
+            "LLM_MOCK_LATENCY": str(llm_latency_ms / 1000),
+            "LLM_RATE_PER_MIN": "1000000",
+            "AGENT_CONCURRENCY": "4",
+            "WORKER_WAKE_MODE": "poll",
+            "MIN_POLL_INTERVAL": "0",
+            "MAX_POLL_INTERVAL": "0",
+            "WORKER_LEASES": "1" if leases else "0",
+            "WORKER_ID": "",
+        }
+        procs = [subprocess.Popen([sys.executable, "worker.py"], cwd=ENGINE_DIR, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                 for _ in range(workers)]
+        time.sleep(seconds)
+    finally:
+        for proc in procs:
+            proc.send_signal(signal.SIGINT)  # worker.main() flushes deferred writes on the way out
+        for proc in procs:
+            proc.wait()
+        try:
+            decisions, duplicates = _count(url)
+        finally:
+            fake.terminate()
+            fake.wait()
+    return {"workers": workers, "leases": leases, "agents": agents, "seconds": seconds,
+            "decisions": decisions, "decisions_per_s": round(decisions / seconds, 1),
+            "duplicate_replies": duplicates}
+
+
+def run(workers: list[int], agents: int = 24, seconds: float = 10, llm_latency_ms: float = 200) -> list[dict]:
+    return [run_once(n, leases, agents, seconds, llm_latency_ms) for leases in (False, True) for n in workers]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--agents", type=int, default=24)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    args = parser.parse_args()
+    for row in run(args.workers, args.agents, args.seconds, args.llm_latency_ms):
+        print(json.dumps(row))
@@ -0,0 +1,91 @@
+"""
+Startup benchmark — cold-start cost in fresh interpreters, as a
+scale-to-zero replica pays it.
+
+- import: `import main` (what uvicorn does before binding)
+- first_crush: import plus the first POST /crush, driven straight through
+  ASGI so the harness itself imports nothing extra
+- eager: import plus building the Supabase client and Gemini backend up
+  front, i.e. the cost import used to carry before they became lazy
+
+Each row lists which heavy dependencies ended up loaded.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent
+HEAVY = ["httpx", "google.generativeai", "numpy", "memory"]
+
+CHILD = r"""
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+scenario = sys.argv[1]
+if scenario == "first_crush":
+    body = json.dumps({"content": "INFO ok\n" * 200}).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/crush", "raw_path": b"/crush", "root_path": "", "query_string": b"",
+             "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+             "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80)}
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    async def send(message):
+        sent.append(message)
+    asyncio.run(main.app(scope, receive, send))
+    assert sent[0]["status"] == 200, sent[0]
+elif scenario == "eager":
+    from memory import custodian
+    main.get_llm()
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % HEAVY
+
+
+def _run_child(scenario: str) -> dict:
+    env = {
+        **os.environ,
+        "SUPABASE_URL": "http://127.0.0.1:9",  # Never contacted; only configures the client
+        "SUPABASE_KEY": "fake",
+        "GOOGLE_API_KEY": "offline",
+        "LLM_BACKEND": "gemini",
+        "CRUSH_EXECUTOR": "inline",
+    }
+    out = subprocess.run([sys.executable, "-c", CHILD, scenario], cwd=ENGINE_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(runs: int = 5) -> list[dict]:
+    results = []
+    for scenario in ("import", "first_crush", "eager"):
+        samples = [_run_child(scenario) for _ in range(runs)]
+        seconds = [s["seconds"] for s in samples]
+        results.append({
+            "scenario": scenario,
+            "runs": runs,
+            "median_ms": round(statistics.median(seconds) * 1000, 1),
+            "min_ms": round(min(seconds) * 1000, 1),
+            "loaded": samples[-1]["loaded"],
+        })
+    eager = results[-1]["median_ms"]
+    for row in results[:-1]:
+        row["vs_eager_speedup"] = round(eager / row["median_ms"], 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    for row in run(args.runs):
+        print(json.dumps(row))
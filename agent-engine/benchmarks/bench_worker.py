@@ -0,0 +1,89 @@
+"""
+Worker benchmark — agent turns end to end, fully offline: MockLLM for
+Gemini, the in-process fake PostgREST for Supabase.
+
+Reports decisions per minute and parse failures for scheduler cycles,
+plus the per-turn cost of building a Gemini model object (the old
+per-iteration GenerativeModel) vs. reusing the pooled one.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_worker [--agents 20] [--cycles 5] [--llm-latency-ms 300]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+import memory
+import worker
+from db import AsyncPostgrest
+from fakes import postgrest as fake
+from llm import MockLLM
+from memory import Custodian
+from scheduler import AgentScheduler
+
+
+async def run_cycles(agents: int, cycles: int, llm_latency_ms: float, concurrency: int) -> dict:
+    fake.seed(agents=agents, inbox=10, memories=100)
+    fake.LATENCY = 0.005
+    db = AsyncPostgrest("http://fake", "fake", transport=httpx.ASGITransport(app=fake.app))
+    memory.custodian = custodian = Custodian(db)
+    worker._llm = MockLLM(latency=llm_latency_ms / 1000, seed=1)
+    scheduler = AgentScheduler(concurrency=concurrency, rate_per_minute=1e6, burst=concurrency)
+
+    start = time.perf_counter()
+    try:
+        for _ in range(cycles):
+            fleet = await custodian.get_fleet_status()
+            inbox = await custodian.get_inbox(status="NEW")
+            snapshot = await custodian.context_snapshot(fleet=fleet, inbox=inbox)
+            await scheduler.run_cycle(fleet, lambda agent: worker.run_agent_turn(agent, snapshot), inbox)
+    finally:
+        await custodian.aclose()
+    elapsed = time.perf_counter() - start
+    stats = scheduler.stats()
+    return {"bench": "cycles", "agents": agents, "cycles": cycles, "seconds": round(elapsed, 3),
+            "decisions": stats["decisions"], "failures": stats["failures"],
+            "decisions_per_minute": round(stats["decisions"] * 60 / elapsed, 1),
+            "context_chars_sent": worker.contexts.stats()["chars_sent"],
+            "context_chars_full": worker.contexts.stats()["chars_full"]}
+
+
+def model_construction(iterations: int = 200) -> dict | None:
+    try:
+        from llm import GeminiPool
+        pool = GeminiPool(api_key="offline")
+    except ImportError:
+        return None
+    instruction = worker.system_instruction("THE ENGINEER")
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pool._build("THE ENGINEER", instruction)
+    fresh = (time.perf_counter() - start) / iterations
+
+    async def reuse() -> float:
+        await pool.model_for("THE ENGINEER", instruction)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await pool.model_for("THE ENGINEER", instruction)
+        return (time.perf_counter() - start) / iterations
+
+    pooled = asyncio.run(reuse())
+    return {"bench": "model_construction", "fresh_us": round(fresh * 1e6, 1), "pooled_us": round(pooled * 1e6, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_cycles(args.agents, args.cycles, args.llm_latency_ms, args.concurrency))))
+    row = model_construction()
+    if row:
+        print(json.dumps(row))
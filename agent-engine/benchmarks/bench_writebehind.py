@@ -0,0 +1,66 @@
+"""
+Write-behind benchmark — agent-loop writes (heartbeats + memory logs)
+sent one request each vs. through the write-behind buffer, against the
+in-process fake PostgREST with simulated latency.
+
+Usage (from agent-engine/):
+    python -m benchmarks.bench_writebehind [--agents 50] [--cycles 20] [--latency-ms 20]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from db import AsyncPostgrest
+from fakes import postgrest as fake
+from memory import Custodian
+
+
+async def _cycle(custodian: Custodian, agent: str, cycle: int, defer: bool) -> None:
+    await custodian.update_agent(agent, {"last_heartbeat": str(cycle)}, defer=defer)
+    await custodian.save(f"{agent} cycle {cycle}: monitoring", category=f"{agent} LOG", defer=defer)
+
+
+async def run(agents: int = 50, cycles: int = 20, latency_ms: float = 20) -> list[dict]:
+    fake.LATENCY = latency_ms / 1000
+    results = []
+    for defer in (False, True):
+        fake.seed(agents=agents, memories=0)
+        db = AsyncPostgrest("http://fake", "fake", transport=httpx.ASGITransport(app=fake.app))
+        requests = 0
+
+        async def counting(request: httpx.Request) -> None:
+            nonlocal requests
+            requests += 1
+
+        db.client.event_hooks["request"].append(counting)
+        custodian = Custodian(db)
+        names = [a["name"] for a in fake.tables["agents"]]
+
+        start = time.perf_counter()
+        for cycle in range(cycles):
+            await asyncio.gather(*(_cycle(custodian, name, cycle, defer) for name in names))
+        await custodian.flush()
+        elapsed = time.perf_counter() - start
+
+        row = {"mode": "write_behind" if defer else "direct", "writes": agents * cycles * 2,
+               "http_requests": requests, "seconds": round(elapsed, 3),
+               "rows": len(fake.tables["boss_memory"])}
+        if custodian.writes is not None and defer:
+            row.update(custodian.writes.stats())
+        results.append(row)
+        await custodian.aclose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+    for row in asyncio.run(run(args.agents, args.cycles, args.latency_ms)):
+        print(json.dumps(row))
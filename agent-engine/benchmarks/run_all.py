@@ -0,0 +1,144 @@
+"""
+Benchmark suite — runs every benchmark and writes one JSON report, and
+optionally fails on regressions against a saved baseline.
+
+Rows are matched to the baseline by suite and position (same profile,
+same rows). Latency-like fields (`*_ms`, `*_us`, `*_s`, `seconds`) may
+not grow, and throughput-like fields (`*_per_s`, `*_mb_s`,
+`*_per_minute`, `speedup`) may not shrink, by more than --tolerance.
+
+Usage (from agent-engine/):
+    python -m benchmarks.run_all --output bench.json
+    python -m benchmarks.run_all --output new.json --baseline bench.json [--tolerance 0.25]
+    python -m benchmarks.run_all --profile full --only crusher load
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import (
+    bench_align, bench_batch, bench_crusher, bench_custodian, bench_dedupe,
+    bench_load, bench_recall, bench_replicas, bench_startup, bench_worker, bench_writebehind,
+)
+
+# suite -> (quick, full) runners
+SUITES = {
+    "crusher": (lambda: bench_crusher.run([4, 64], repeat=3),
+                lambda: bench_crusher.run([4, 64, 512, 2048], repeat=5)),
+    "align": (lambda: bench_align.run([1], repeat=2),
+              lambda: bench_align.run([2, 8], repeat=3)),
+    "dedupe": (lambda: bench_dedupe.run(20_000, repeat=2),
+               lambda: bench_dedupe.run(100_000, repeat=3)),
+    "recall": (lambda: bench_recall.run([1_000, 10_000], queries=50),
+               lambda: bench_recall.run([1_000, 10_000, 100_000], queries=200)),
+    "custodian": (lambda: asyncio.run(bench_custodian.run(requests=150, latency_ms=10)),
+                  lambda: asyncio.run(bench_custodian.run(requests=600, latency_ms=20))),
+    "writebehind": (lambda: asyncio.run(bench_writebehind.run(agents=20, cycles=10, latency_ms=10)),
+                    lambda: asyncio.run(bench_writebehind.run(agents=50, cycles=20, latency_ms=20))),
+    "worker": (lambda: [asyncio.run(bench_worker.run_cycles(20, 3, llm_latency_ms=50, concurrency=8))],
+               lambda: [asyncio.run(bench_worker.run_cycles(50, 10, llm_latency_ms=300, concurrency=8))]),
+    "startup": (lambda: bench_startup.run(runs=3),
+                lambda: bench_startup.run(runs=10)),
+    "load": (lambda: asyncio.run(bench_load.run(requests=1000, concurrency=16)),
+             lambda: asyncio.run(bench_load.run(requests=10_000, concurrency=64))),
+    "load_sqlite": (lambda: asyncio.run(bench_load.run(requests=1000, concurrency=16, storage="memory")),
+                    lambda: asyncio.run(bench_load.run(requests=10_000, concurrency=64, storage="memory"))),
+    "batch": (lambda: asyncio.run(bench_batch.run(items=50, distinct=10)),
+              lambda: asyncio.run(bench_batch.run(items=200, distinct=40))),
+    "replicas": (lambda: bench_replicas.run([1, 2], seconds=5),
+                 lambda: bench_replicas.run([1, 2, 4], seconds=15)),
+}
+
+LOWER_IS_BETTER = ("_ms", "_us", "_s", "seconds")
+HIGHER_IS_BETTER = ("_per_s", "_mb_s", "_per_minute", "speedup")
+
+
+def _direction(key: str) -> int:
+    """+1 if larger is better, -1 if smaller is better, 0 if not a metric."""
+    if key.endswith(HIGHER_IS_BETTER):
+        return 1
+    if key.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Metrics that moved the wrong way by more than `tolerance`."""
+    regressions = []
+    for suite, rows in report["results"].items():
+        for i, (row, old) in enumerate(zip(rows, baseline.get("results", {}).get(suite, []))):
+            for key, value in row.items():
+                direction = _direction(key)
+                before = old.get(key)
+                if not direction or not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                    continue
+                change = (value - before) / before
+                if change * direction < -tolerance:
+                    regressions.append({"suite": suite, "row": i, "metric": key,
+                                        "baseline": before, "current": value, "change_pct": round(change * 100, 1)})
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=["quick", "full"], default="quick")
+    parser.add_argument("--only", nargs="+", choices=list(SUITES), help="Run just these suites")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier report to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "profile": args.profile,
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": {},
+    }
+    for suite in args.only or SUITES:
+        quick, full = SUITES[suite]
+        start = time.perf_counter()
+        report["results"][suite] = quick() if args.profile == "quick" else full()
+        print(f"{suite}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("profile") != args.profile:
+            print(f"⚠️ Baseline profile differs ({baseline.get('meta', {}).get('profile')})", file=sys.stderr)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        for r in report["regressions"]:
+            print(f"❌ {r['suite']}[{r['row']}].{r['metric']}: {r['baseline']} → {r['current']} ({r['change_pct']:+}%)",
+                  file=sys.stderr)
+        status = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
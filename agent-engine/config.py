@@ -1,41 +1,99 @@
 import os
-from dotenv import load_dotenv
+import socket
 from pathlib import Path
 
-print(f"DEBUG: CWD={os.getcwd()}")
-env_path = Path(__file__).resolve().parent / '.env'
-print(f"DEBUG: Loading env from {env_path}, exists={env_path.exists()}")
-
-# Manual Fallback if dotenv fails
-def manual_load(path):
-    try:
-        with open(path, 'r', encoding='utf-8-sig') as f:
-            for line in f:
-                if '=' in line and not line.startswith('#'):
-                    key, val = line.strip().split('=', 1)
-                    key = key.strip()
-                    val = val.strip().strip('"').strip("'")
-                    if key and val:
-                        os.environ[key] = val
-                        print(f"DEBUG: Manually loaded {key}")
-    except Exception as e:
-        print(f"DEBUG: Manual load failed: {e}")
-
-manual_load(env_path)
-load_dotenv(dotenv_path=env_path, override=True) # Let dotenv verify/override if it works
-
-api_key = os.getenv('GOOGLE_API_KEY')
-print(f"DEBUG: GOOGLE_API_KEY loaded: {bool(api_key)}, length={len(api_key) if api_key else 0}")
+from dotenv import load_dotenv
+
+# Single parse of agent-engine/.env (utf-8-sig tolerates a BOM); file values
+# override the process environment. Nothing else happens at import time.
+load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env", override=True, encoding="utf-8-sig")
 
 # Supabase
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
+# Custodian storage
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")  # supabase | sqlite (local file) | memory (SQLite in RAM, lost on exit)
+SQLITE_PATH = os.getenv("SQLITE_PATH", "agent-engine.db")  # STORAGE_BACKEND=sqlite
+STORAGE_CONFIGURED = STORAGE_BACKEND != "supabase" or bool(SUPABASE_URL and SUPABASE_KEY)  # else memory routes 503
+
+# Supabase REST client pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))  # seconds
+DB_RETRIES = int(os.getenv("DB_RETRIES", "2"))
+DB_HTTP2 = os.getenv("DB_HTTP2", "1") == "1"
+CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "5"))  # seconds; /context summary pieces
+VIEW_TTL = float(os.getenv("VIEW_TTL", "15"))  # seconds; in-memory agents / inbox views refetch after this
+INBOX_VIEW_SIZE = int(os.getenv("INBOX_VIEW_SIZE", "200"))  # most recent inbox rows held in memory
+
+# Write-behind buffer for agent-loop writes (memory inserts, heartbeats, inbox updates)
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "200"))  # flush at this many pending writes
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1"))  # seconds between flushes
+
+# Memory recall
+RECALL_ENGINE = os.getenv(
+    "RECALL_ENGINE", "index" if STORAGE_BACKEND == "supabase" else "fts",
+)  # index (ranked, in-process) | ilike (database scan) | fts (SQLite FTS5; sqlite/memory storage only)
+RECALL_SEMANTIC = os.getenv("RECALL_SEMANTIC", "0") == "1"  # add vector similarity (requires numpy)
+RECALL_REFRESH_INTERVAL = float(os.getenv("RECALL_REFRESH_INTERVAL", "30"))  # seconds between catch-up syncs
+
 # Google AI
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # gemini | mock (offline, canned decisions)
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+LLM_CONTEXT_CACHE = os.getenv("LLM_CONTEXT_CACHE", "0") == "1"  # provider-side cache of system instructions
+LLM_MOCK_LATENCY = float(os.getenv("LLM_MOCK_LATENCY", "0"))  # seconds per mock call
+
+# Per-turn prompt section budgets (tokens), enforced by SmartCrusher
+PROMPT_BUDGET_TASK = int(os.getenv("PROMPT_BUDGET_TASK", "100"))
+PROMPT_BUDGET_CONTEXT = int(os.getenv("PROMPT_BUDGET_CONTEXT", "400"))
+PROMPT_BUDGET_INBOX = int(os.getenv("PROMPT_BUDGET_INBOX", "600"))
+CONTEXT_MODE = os.getenv("CONTEXT_MODE", "delta")  # delta (only what changed since the agent's last turn) | full
+CONTEXT_FULL_REFRESH = int(os.getenv("CONTEXT_FULL_REFRESH", "10"))  # turns; every Nth turn per agent is a full context
 
 # Service
 PORT = int(os.getenv("PORT", "8000"))
 MIN_POLL_INTERVAL = int(os.getenv("MIN_POLL_INTERVAL", "45"))
 MAX_POLL_INTERVAL = int(os.getenv("MAX_POLL_INTERVAL", "90"))
+
+# Worker wakeups
+EVENTS_SECRET = os.getenv("EVENTS_SECRET", "")  # X-Events-Secret header /events requires; unset disables /events
+WORKER_WAKE_MODE = os.getenv(
+    "WORKER_WAKE_MODE", "events" if EVENTS_SECRET else "poll",
+)  # events (webhook + adaptive backoff) | poll (every MIN..MAX_POLL_INTERVAL); defaults to events only with a webhook
+MAX_IDLE_INTERVAL = int(os.getenv("MAX_IDLE_INTERVAL", "600"))  # seconds; backoff ceiling when nothing changes
+
+# Dependency probes behind /ready
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))  # seconds
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))  # seconds
+
+# Worker placement and leases (multiple replicas / uvicorn --workers)
+WORKER_MODE = os.getenv("WORKER_MODE", "embedded")  # embedded (agent loop in the API process) | external (run `python worker.py`)
+WORKER_LEASES = os.getenv("WORKER_LEASES", "0") == "1"  # claim agents / inbox items per worker; needs migrations/001_worker_leases.sql
+WORKER_ID = os.getenv("WORKER_ID", "") or f"{socket.gethostname()}-{os.getpid()}"  # lease owner; unique per process
+WORKER_LEASE_TTL = int(os.getenv("WORKER_LEASE_TTL", "300"))  # seconds; a crashed worker's claims lapse after this
+WORKER_LEASE_BATCH = int(os.getenv("WORKER_LEASE_BATCH", "0"))  # agents claimed at a time (more as turns free up); 0 = AGENT_CONCURRENCY
+
+# Agent scheduler
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "4"))  # agent turns in flight at once
+LLM_RATE_PER_MIN = float(os.getenv("LLM_RATE_PER_MIN", "15"))  # Gemini requests per minute
+LLM_BURST = int(os.getenv("LLM_BURST", "5"))  # requests allowed back-to-back
+
+# Crusher originals store (/crush/{hash} retrieval)
+ORIGINALS_MAX_ENTRIES = int(os.getenv("ORIGINALS_MAX_ENTRIES", "1024"))
+ORIGINALS_MAX_BYTES = int(os.getenv("ORIGINALS_MAX_BYTES", str(64 * 1024 * 1024)))
+ORIGINALS_COMPRESSION = os.getenv("ORIGINALS_COMPRESSION", "zlib")  # none | zlib | zstd
+ORIGINALS_SPILL_PATH = os.getenv("ORIGINALS_SPILL_PATH", "")  # SQLite file; empty disables spill
+ORIGINALS_SPILL_MAX_ENTRIES = int(os.getenv("ORIGINALS_SPILL_MAX_ENTRIES", "100000"))
+
+# Crusher result cache (memoizes Stage 2/3 per aligned payload and budget)
+CRUSH_CACHE_TTL = float(os.getenv("CRUSH_CACHE_TTL", "300"))
+CRUSH_CACHE_MAX_ENTRIES = int(os.getenv("CRUSH_CACHE_MAX_ENTRIES", "2048"))
+CRUSH_CACHE_MAX_BYTES = int(os.getenv("CRUSH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Crush executor (keeps large crushes off the event loop)
+CRUSH_EXECUTOR = os.getenv("CRUSH_EXECUTOR", "process")  # inline | thread | process
+CRUSH_WORKERS = int(os.getenv("CRUSH_WORKERS", "0"))  # 0 = one per CPU
+CRUSH_INLINE_THRESHOLD = int(os.getenv("CRUSH_INLINE_THRESHOLD", "20000"))  # chars
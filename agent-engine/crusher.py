@@ -6,13 +6,24 @@ Three-stage pipeline:
 1. Cache Aligner — Normalizes dynamic tokens (timestamps, UUIDs, IDs) 
 2. Smart Crusher — Removes redundant/repetitive content, keeps critical data
 3. Context Fitter — Score-based token fitting within budget
+
+JSON arrays and objects take a structured Stage 2/3 (JsonCrusher) that
+summarizes records instead of deduping their lines, and emits valid JSON.
 """
 
 import re
+import functools
 import hashlib
 import json
-from typing import Any
-from dataclasses import dataclass
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+from dataclasses import dataclass, field
+from cache import TTLCache
+from config import CRUSH_CACHE_TTL, CRUSH_CACHE_MAX_ENTRIES, CRUSH_CACHE_MAX_BYTES
+from metrics import crush_cache_hits, crush_chars, crush_stage_duration
+from originals import OriginalsStore, originals
 
 
 @dataclass
@@ -23,19 +34,464 @@ class CrushResult:
     savings_pct: float
     content: str
     originals_hash: str  # Hash to retrieve full content if needed
+    stage_seconds: dict[str, float] = field(default_factory=dict)  # Empty stages were cache hits
+
+
+def content_hash(text: str) -> str:
+    """Short content fingerprint; the key originals are retrievable by."""
+    return hashlib.sha256(text.encode()).hexdigest()[:12]
+
+
+def record_crush_metrics(result: CrushResult) -> None:
+    """Feed a crush's sizes and stage timings into /metrics. Called where
+    the crush ran, and again in the parent for process-pool crushes."""
+    crush_chars.inc(result.original_chars, kind="original")
+    crush_chars.inc(result.crushed_chars, kind="crushed")
+    if "smart_crush" not in result.stage_seconds:
+        crush_cache_hits.inc()
+    for stage, seconds in result.stage_seconds.items():
+        crush_stage_duration.observe(seconds, stage=stage)
+
+
+class AlignRule(NamedTuple):
+    """A dynamic-token pattern and the placeholder it normalizes to.
+
+    `backtrack` is the number of characters the token starts *before* the
+    regex match. Built-in rules anchor on a rare literal ('-' or '_') and
+    verify the token's head with a fixed-width lookbehind, so the combined
+    scanner only stops at those characters instead of at every digit or
+    hex letter.
+    """
+    pattern: str
+    replacement: str
+    backtrack: int = 0
+
+
+class CacheAligner:
+    """Stage 1 engine — normalizes all dynamic tokens in a single pass.
+
+    Every rule is compiled into one alternation, so a payload is scanned
+    once regardless of how many rules are registered.
+    """
+
+    # The scanner takes the leftmost match, while the original rules ran as
+    # sequential substitutions in this order. Each rule therefore refuses
+    # to start a token that an earlier rule would have claimed first:
+    # req-2024-01-01T12:00:00Z is a timestamp, and session_xreq-7 ends
+    # where the request ID begins.
+    _TIMESTAMP = r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[.\d]*Z?\b'
+    _UUID = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b'
+    _REQ_ID = rf'req-(?!{_TIMESTAMP}|{_UUID})\d'
+
+    DEFAULT_RULES = (
+        # ISO timestamps: 2024-01-01T12:00:00.000Z
+        AlignRule(r'-(?<=(?<!\w)\d{4}-)\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[.\d]*Z?\b', '[TIMESTAMP]', 4),
+        # UUIDs
+        AlignRule(r'-(?<=(?<!\w)[0-9a-f]{8}-)[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', '[UUID]', 8),
+        # Request IDs: req-123
+        AlignRule(rf'-(?<=req-)(?!{_TIMESTAMP}|{_UUID})\d+', '[REQ_ID]', 3),
+        # Session IDs: session_abc123
+        AlignRule(rf'_(?<=session_)(?:(?!{_REQ_ID})[a-zA-Z0-9])+', '[SESSION_ID]', 7),
+    )
+
+    def __init__(self, rules: list[AlignRule] | tuple[AlignRule, ...] = DEFAULT_RULES):
+        self._lock = threading.Lock()
+        self._rules: list[AlignRule] = list(rules)
+        self._compiled = self._compile(self._rules)
+
+    @property
+    def rules(self) -> list[AlignRule]:
+        return list(self._rules)
+
+    def register(self, pattern: str, replacement: str, backtrack: int = 0) -> None:
+        """Add a dynamic-token rule. Patterns must not use named groups."""
+        rule = AlignRule(pattern, replacement, backtrack)
+        with self._lock:
+            rules = self._rules + [rule]
+            self._compiled = self._compile(rules)
+            self._rules = rules
+
+    @staticmethod
+    def _compile(rules: list[AlignRule]) -> tuple[re.Pattern | None, dict[int, AlignRule]]:
+        if not rules:
+            return None, {}
+        # Each rule is tagged by an empty group at its *end*: a group at the
+        # start would hide the anchor literal from re's prefix scan.
+        regex = re.compile('|'.join(f'(?:{rule.pattern})(?P<_r{i}>)' for i, rule in enumerate(rules)))
+        by_group = {regex.groupindex[f'_r{i}']: rule for i, rule in enumerate(rules)}
+        return regex, by_group
+
+    def align(self, text: str) -> str:
+        """Replace every dynamic token in `text` with its placeholder."""
+        regex, by_group = self._compiled
+        if regex is None:
+            return text
+
+        parts: list[str] = []
+        last = 0
+        for match in regex.finditer(text):
+            rule = by_group[match.lastindex]
+            start = match.start() - rule.backtrack
+            if start < last:
+                continue  # Token head overlaps a replacement already made
+            parts.append(text[last:start])
+            parts.append(rule.replacement)
+            last = match.end()
+
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return ''.join(parts)
+
+
+# Shared aligner — rules registered here apply to every SmartCrusher
+default_aligner = CacheAligner()
+
+
+# Gemini averages roughly four characters per token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate used when no tokenizer is plugged in."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ContextFitter:
+    """Stage 3 engine — keeps the most useful lines within a token budget.
+
+    Each line is scored on criticality, position and novelty. Lines are
+    then picked greedily by score per token (the fractional-knapsack
+    heuristic) and re-emitted in original order, with a marker per gap.
+    """
+
+    CRITICAL_WEIGHT = 10.0
+    HEAD_WEIGHT = 4.0  # The first lines usually frame everything after them
+    HEAD_LINES = 3
+    RECENCY_WEIGHT = 3.0  # Later lines are more recent in logs and transcripts
+    NOVELTY_WEIGHT = 2.0  # Share of a line's words not seen earlier
+    MARKER_SCORE = 0.5  # Existing "[... omitted ...]" markers
+
+    _WORDS = re.compile(r'[a-z]{3,}')
+
+    def __init__(self, signals: list[str], tokenizer: Callable[[str], int] = estimate_tokens):
+        self.critical = signal_matcher(signals)
+        self.tokenizer = tokenizer
+
+    def fit(self, text: str, budget: int) -> str:
+        """Return `text`, or its highest-value lines if it exceeds `budget` tokens."""
+        if self.tokenizer(text) <= budget:
+            return text
+
+        # No single line may take more than half the budget
+        max_line_chars = max(budget // 2, 1) * CHARS_PER_TOKEN
+        lines = [self._truncate(line, max_line_chars) for line in text.split('\n')]
+        costs = [self.tokenizer(line) + 1 for line in lines]  # +1 for the newline
+        scores = self._score(lines)
+
+        by_density = sorted(range(len(lines)), key=lambda i: scores[i] / costs[i], reverse=True)
+        kept: list[int] = []
+        used = 0
+        for i in by_density:
+            if used + costs[i] <= budget:
+                kept.append(i)
+                used += costs[i]
+
+        # Gap markers cost tokens too: shed the weakest picks until it fits
+        while True:
+            fitted = self._assemble(lines, sorted(kept))
+            overshoot = self.tokenizer(fitted) - budget
+            if overshoot <= 0:
+                return fitted
+            if not kept:
+                break
+            while kept and overshoot > 0:
+                overshoot -= costs[kept.pop()]
+        # Not even the lone gap marker fits: a bare one, or nothing
+        return '[...]' if self.tokenizer('[...]') <= budget else ''
+
+    def _score(self, lines: list[str]) -> list[float]:
+        last = max(len(lines) - 1, 1)
+        seen_words: set[str] = set()
+        scores = []
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if not stripped:
+                scores.append(0.0)
+                continue
+            if stripped.startswith('[...'):
+                scores.append(self.MARKER_SCORE)
+                continue
+
+            score = self.RECENCY_WEIGHT * i / last
+            if i < self.HEAD_LINES:
+                score += self.HEAD_WEIGHT
+            lowered = stripped.lower()
+            if self.critical.search(lowered):
+                score += self.CRITICAL_WEIGHT
+
+            words = self._WORDS.findall(lowered)
+            if words:
+                novel = sum(1 for w in words if w not in seen_words)
+                score += self.NOVELTY_WEIGHT * novel / len(words)
+                seen_words.update(words)
+            scores.append(score)
+        return scores
+
+    @staticmethod
+    def _truncate(line: str, max_chars: int) -> str:
+        if len(line) <= max_chars:
+            return line
+        return f"{line[:max_chars]} [... {len(line) - max_chars} chars truncated ...]"
+
+    @staticmethod
+    def _assemble(lines: list[str], kept: list[int]) -> str:
+        out: list[str] = []
+        prev = -1
+        for i in [*kept, len(lines)]:
+            gap = i - prev - 1
+            if gap:
+                marker = f"[... {gap} lines omitted ...]"
+                # A lone short line or marker says more than a new marker would
+                lone = lines[prev + 1] if gap == 1 else ''
+                out.append(lone if lone and (len(lone) <= len(marker) or lone.lstrip().startswith('[...')) else marker)
+            if i < len(lines):
+                out.append(lines[i])
+            prev = i
+        return '\n'.join(out)
+
+
+_JSON_TYPES = {str: "str", int: "int", float: "float", bool: "bool", type(None): "null", list: "list", dict: "object"}
+
+
+class JsonLevel(NamedTuple):
+    """How much detail one JsonCrusher pass keeps."""
+    max_str: int  # chars per string value
+    max_items: int  # items kept from long non-record arrays
+    samples: int  # representative records per collapsed array
+    max_critical: int  # critical records per collapsed array
+
+
+class JsonCrusher:
+    """Structured Stage 2/3 engine — compacts parsed JSON instead of its lines.
+
+    Arrays of same-shaped records collapse into a per-field summary (types,
+    value counts, numeric ranges, presence), a few sample records and the
+    records carrying critical signals. Empty fields are dropped and long
+    strings truncated. Detail is reduced level by level until the compact
+    serialization fits the budget; past the tersest level only field names
+    and counts remain, so the output is always valid JSON.
+    """
+
+    LEVELS = (
+        JsonLevel(max_str=400, max_items=20, samples=3, max_critical=10),
+        JsonLevel(max_str=160, max_items=8, samples=2, max_critical=5),
+        JsonLevel(max_str=60, max_items=4, samples=1, max_critical=3),
+        JsonLevel(max_str=24, max_items=2, samples=1, max_critical=1),
+    )
+    COLLAPSE_MIN = 6  # Arrays with at least this many items may be summarized...
+    RECORD_SHARE = 0.8  # ...when this share of them are objects
+    MAX_ENUM = 6  # Repeated string values listed with counts...
+    ENUM_CHARS = 40  # ...each cut to this length
+    MAX_DEPTH = 8
+
+    def __init__(self, signals: list[str], tokenizer: Callable[[str], int] = estimate_tokens):
+        self.critical = signal_matcher(signals)
+        self.tokenizer = tokenizer
+
+    def fit(self, value: list | dict, budget: int, source: str = "") -> str:
+        """Compact JSON for `value` within `budget` tokens. `source` is the
+        text `value` was parsed from, used to skip a lossless attempt that
+        cannot fit."""
+        # Compacting only removes whitespace, so this bounds the lossless size
+        floor = len(source) - source.count(' ') - source.count('\n')
+        if floor <= budget * CHARS_PER_TOKEN:
+            text = self.dump(value)
+            if self.tokenizer(text) <= budget:
+                return text  # Lossless; only whitespace removed
+        for level in self.LEVELS:
+            text = self.dump(self._walk(value, level, 0))
+            if self.tokenizer(text) <= budget:
+                return text
+        *stubs, empty = self._stubs(value)
+        for stub in stubs:
+            text = self.dump(stub)
+            if self.tokenizer(text) <= budget:
+                return text
+        return self.dump(empty)  # Nothing smaller is valid JSON
+
+    @staticmethod
+    def _stubs(value: list | dict) -> list:
+        """Last-resort outlines of `value`, tersest last: field names and
+        counts, counts only, then an empty container."""
+        if isinstance(value, dict):
+            return [{"_keys": list(value)}, {"_keys": len(value)}, {}]
+        fields = list(dict.fromkeys(key for item in value if isinstance(item, dict) for key in item))
+        outline = [{"_items": len(value), "_fields": fields}] if fields else []
+        return [*outline, {"_items": len(value)}, []]
+
+    @staticmethod
+    def dump(value: Any) -> str:
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+    @staticmethod
+    def parse(text: str) -> list | dict | None:
+        """The array or object `text` holds, or None if it is not JSON."""
+        if text.lstrip()[:1] not in ('[', '{'):
+            return None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return None
+        return value if isinstance(value, (list, dict)) else None
+
+    def _walk(self, value: Any, level: JsonLevel, depth: int) -> Any:
+        if isinstance(value, dict):
+            if depth >= self.MAX_DEPTH:
+                return f"[... object with {len(value)} keys ...]"
+            return {k: self._walk(v, level, depth + 1) for k, v in value.items() if not self._empty(v)}
+        if isinstance(value, list):
+            if depth >= self.MAX_DEPTH:
+                return f"[... array of {len(value)} items ...]"
+            return self._walk_list(value, level, depth)
+        if isinstance(value, str) and len(value) > level.max_str:
+            return f"{value[:level.max_str]}[... {len(value) - level.max_str} chars]"
+        return value
+
+    def _walk_list(self, items: list, level: JsonLevel, depth: int) -> Any:
+        records = [item for item in items if isinstance(item, dict)]
+        if len(items) >= self.COLLAPSE_MIN and len(records) >= self.RECORD_SHARE * len(items):
+            return self._collapse(records, len(items) - len(records), level, depth)
+        if len(items) <= level.max_items:
+            return [self._walk(item, level, depth + 1) for item in items]
+
+        # Long array of scalars or mixed items: head, tail and critical items
+        edge = max(level.max_items // 2, 1)
+        keep = set(range(edge)) | set(range(len(items) - edge, len(items)))
+        critical = [i for i, item in enumerate(items) if i not in keep and self._is_critical(item)]
+        keep.update(critical[:level.max_critical])
+        out: list = []
+        prev = -1
+        for i in [*sorted(keep), len(items)]:
+            if i - prev > 1:
+                out.append(f"[... {i - prev - 1} items omitted ...]")
+            if i < len(items):
+                out.append(self._walk(items[i], level, depth + 1))
+            prev = i
+        return out
+
+    def _collapse(self, records: list[dict], others: int, level: JsonLevel, depth: int) -> dict:
+        """Summary of an array of records: field stats, samples, criticals."""
+        columns: dict[str, list] = {}
+        owners: dict[str, list[int]] = {}
+        for i, record in enumerate(records):
+            for key, value in record.items():
+                columns.setdefault(key, []).append(value)
+                owners.setdefault(key, []).append(i)
+
+        critical: list = []
+        seen: set[str] = set()
+        omitted = 0
+        plain: list[int] = []
+        for i, flagged in enumerate(self._critical_rows(columns, owners, len(records))):
+            if not flagged:
+                plain.append(i)
+            elif len(critical) >= level.max_critical:
+                omitted += 1
+            else:
+                walked = self._walk(records[i], level, depth + 1)
+                key = self.dump(walked)
+                if key not in seen:  # Identical critical records are shown once
+                    seen.add(key)
+                    critical.append(walked)
+
+        # Leading samples plus the last record (logs and feeds end with the newest)
+        picks = plain[:level.samples - 1] + plain[-1:] if level.samples > 1 else plain[:1]
+        out: dict = {
+            "_records": len(records),
+            "_fields": {key: self._describe(values, len(records), level) for key, values in columns.items()},
+            "_samples": [self._walk(records[i], level, depth + 1) for i in dict.fromkeys(picks)],
+        }
+        if critical:
+            out["_critical"] = critical
+        if omitted:
+            out["_critical_omitted"] = omitted
+        if others:
+            out["_other_items"] = others
+        return out
+
+    def _critical_rows(self, columns: dict[str, list], owners: dict[str, list[int]], count: int) -> list[bool]:
+        """Which records carry a signal, checked column by column so each
+        distinct string is matched once."""
+        flagged = [False] * count
+        memo: dict[str, bool] = {}
+        for key, values in columns.items():
+            named = self._signal(key, memo)
+            for i, value in zip(owners[key], values):
+                if flagged[i]:
+                    continue
+                if isinstance(value, str):
+                    hit = memo.get(value)
+                    if hit is None:
+                        hit = self._signal(value, memo)
+                elif isinstance(value, (dict, list)):
+                    hit = self._is_critical(value, memo)
+                else:
+                    hit = False
+                flagged[i] = hit or (named and bool(value))
+        return flagged
+
+    def _describe(self, values: list, total: int, level: JsonLevel) -> str:
+        """One-line field summary, e.g. "str ok=40, error=3" or "int 1..900 (12/50)"."""
+        text = '|'.join(sorted({_JSON_TYPES.get(type(v), "?") for v in values}))
+        present = [v for v in values if v is not None]
+        if present and all(isinstance(v, bool) for v in present):
+            text += f" true={sum(present)}"
+        elif present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+            low, high = min(present), max(present)
+            text += f" {low}..{high}" if low != high else f" {low}"
+        elif present and all(isinstance(v, str) for v in present):
+            counts = Counter(present)
+            if len(counts) <= self.MAX_ENUM and len(counts) < len(present):
+                text += ' ' + ', '.join(f"{v[:min(level.max_str, self.ENUM_CHARS)]}={c}" for v, c in counts.most_common())
+        if len(values) < total:
+            text += f" ({len(values)}/{total})"
+        return text
+
+    def _is_critical(self, value: Any, memo: dict[str, bool] | None = None) -> bool:
+        """A string value matches a signal, or a signal-named key holds a
+        truthy value (e.g. "error": "...", "failed": true, "errors": 3)."""
+        memo = {} if memo is None else memo
+        if isinstance(value, str):
+            return self._signal(value, memo)
+        if isinstance(value, dict):
+            for k, v in value.items():
+                if isinstance(v, str):
+                    if self._signal(v, memo):
+                        return True
+                elif isinstance(v, (dict, list)) and self._is_critical(v, memo):
+                    return True
+                if v and self._signal(k, memo):
+                    return True
+            return False
+        if isinstance(value, list):
+            return any(self._is_critical(v, memo) for v in value)
+        return False
+
+    def _signal(self, text: str, memo: dict[str, bool]) -> bool:
+        hit = memo.get(text)
+        if hit is None:
+            hit = memo[text] = self.critical.search(text.lower()) is not None
+        return hit
+
+    @staticmethod
+    def _empty(value: Any) -> bool:
+        return value is None or value == "" or value == [] or value == {}
 
 
 class SmartCrusher:
     """Compresses LLM context while preserving critical information."""
 
-    # Patterns that are dynamic and can be normalized for cache alignment
-    DYNAMIC_PATTERNS = [
-        (r'\b\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[.\d]*Z?\b', '[TIMESTAMP]'),  # ISO timestamps
-        (r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', '[UUID]'),  # UUIDs
-        (r'req-\d+', '[REQ_ID]'),  # Request IDs
-        (r'session_[a-zA-Z0-9]+', '[SESSION_ID]'),  # Session IDs
-    ]
-
     # Signals that indicate critical content that must be preserved
     CRITICAL_SIGNALS = [
         'error', 'fatal', 'critical', 'fail', 'exception', 'crash',
@@ -43,112 +499,493 @@ class SmartCrusher:
         'decision', 'approved', 'important', 'required', 'must',
     ]
 
-    def __init__(self, max_chars: int = 4000):
+    # Texts with this many lines or fewer skip Stage 2
+    SHORT_TEXT_LINES = 10
+
+    def __init__(
+        self,
+        max_chars: int = 4000,
+        aligner: CacheAligner | None = None,
+        store: OriginalsStore | None = None,
+        cache: TTLCache | None = None,
+        max_tokens: int | None = None,
+        tokenizer: Callable[[str], int] = estimate_tokens,
+        near_duplicates: bool = False,
+        structured: bool = True,
+    ):
         self.max_chars = max_chars
-        self._originals: dict[str, str] = {}  # hash -> original content
-
-    def crush(self, content: str | list | dict) -> CrushResult:
-        """Compress content while preserving critical information."""
-        # Normalize input to string
-        if isinstance(content, (list, dict)):
-            raw = json.dumps(content, indent=2)
-        else:
-            raw = str(content)
-
-        original_chars = len(raw)
+        self.near_duplicates = near_duplicates
+        self.structured = structured  # JSON arrays/objects go through JsonCrusher
+        # Stage 3 budget; derived from max_chars unless given explicitly
+        self.max_tokens = max_tokens or max(max_chars // CHARS_PER_TOKEN, 1)
+        self.fitter = ContextFitter(self.CRITICAL_SIGNALS, tokenizer)
+        self.json_crusher = JsonCrusher(self.CRITICAL_SIGNALS, tokenizer)
+        self.aligner = aligner or default_aligner
+        self.store = store or originals  # hash -> original content, shared by default
+        self.cache = cache or result_cache  # (aligned hash, budget) -> crushed content
+
+    def crush(self, content: str | list | dict, retain: bool = True) -> CrushResult:
+        """Compress content while preserving critical information.
+
+        With `retain=False` the original is not stored for retrieval (the
+        caller keeps it, e.g. when crushing in a worker process).
+        """
+        raw = self.serialize(content)
 
         # Stage 1: Cache Alignment — normalize dynamic tokens
+        start = time.perf_counter()
         aligned = self._align_cache(raw)
+        stage_seconds = {"align_cache": time.perf_counter() - start}
+
+        # Aligned payloads that repeat (agents resend context every poll)
+        # reuse the earlier Stage 2/3 output
+        cache_key = self.cache_key(aligned)
+        fitted = self.cache.get(cache_key)
+        if fitted is None:
+            fitted = self.fit(aligned, stage_seconds)
+            self.cache.set(cache_key, fitted, size=len(fitted))
+        return self.result(raw, fitted, stage_seconds, retain)
+
+    def cache_key(self, aligned: str) -> tuple:
+        """Result-cache key of an aligned payload under this crusher's budget."""
+        return (
+            hashlib.blake2b(aligned.encode(), digest_size=16).digest(),
+            self.max_tokens,
+            self.fitter.tokenizer,  # The object, not its name: lambdas and partials share names
+            self.near_duplicates,
+            self.structured,
+        )
+
+    def fit(self, aligned: str, stage_seconds: dict[str, float]) -> str:
+        """Stages 2 and 3 over an aligned payload; adds their timings to
+        `stage_seconds`. Bypasses the result cache."""
+        # Structured mode: JSON is summarized as a value, never cut mid-object
+        value = self.json_crusher.parse(aligned) if self.structured else None
+        if value is not None:
+            start = time.perf_counter()
+            fitted = self.json_crusher.fit(value, self.max_tokens, aligned)
+            stage_seconds["smart_crush"] = time.perf_counter() - start
+            return fitted
 
         # Stage 2: Smart Crush — remove redundancy, keep critical
+        start = time.perf_counter()
         crushed = self._smart_crush(aligned)
+        stage_seconds["smart_crush"] = time.perf_counter() - start
 
         # Stage 3: Context Fit — trim to budget if still over
+        start = time.perf_counter()
         fitted = self._fit_context(crushed)
+        stage_seconds["fit_context"] = time.perf_counter() - start
+        return fitted
 
-        # Store original for retrieval
-        content_hash = hashlib.sha256(raw.encode()).hexdigest()[:12]
-        self._originals[content_hash] = raw
+    def result(self, raw: str, fitted: str, stage_seconds: dict[str, float], retain: bool = True) -> CrushResult:
+        """Package a crush of `raw`, keep the original retrievable (unless
+        `retain=False`) and record its metrics."""
+        original_hash = content_hash(raw)
+        if retain:
+            self.store.put(original_hash, raw)
 
+        original_chars = len(raw)
         crushed_chars = len(fitted)
         savings = ((original_chars - crushed_chars) / original_chars * 100) if original_chars > 0 else 0
 
-        return CrushResult(
+        result = CrushResult(
             original_chars=original_chars,
             crushed_chars=crushed_chars,
             savings_pct=round(savings, 1),
             content=fitted,
-            originals_hash=content_hash,
+            originals_hash=original_hash,
+            stage_seconds=stage_seconds,
         )
+        record_crush_metrics(result)
+        return result
+
+    def serialize(self, content: str | list | dict) -> str:
+        """Normalize input to the string the pipeline operates on, stored as
+        the original: JSON one value per line. The structured path parses it
+        back, so only its crushed output is compact."""
+        if isinstance(content, (list, dict)):
+            return json.dumps(content, indent=2)
+        return str(content)
+
+    def stream(self, ndjson: bool = False) -> "StreamCrusher":
+        """Start an incremental crush over chunked input."""
+        return StreamCrusher(self, ndjson=ndjson)
+
+    def crush_stream(self, chunks: Iterable[str], ndjson: bool = False) -> Iterator[str]:
+        """Generator pipeline: yields crushed output as input chunks arrive."""
+        stream = self.stream(ndjson=ndjson)
+        for chunk in chunks:
+            yield from stream.feed(chunk)
+        yield from stream.close()
 
     def retrieve(self, content_hash: str) -> str | None:
         """Retrieve original uncompressed content by hash."""
-        return self._originals.get(content_hash)
+        return self.store.get(content_hash)
 
     def _align_cache(self, text: str) -> str:
         """Stage 1: Normalize dynamic tokens for better cache hits."""
-        result = text
-        for pattern, replacement in self.DYNAMIC_PATTERNS:
-            result = re.sub(pattern, replacement, result)
-        return result
+        return self.aligner.align(text)
 
     def _smart_crush(self, text: str) -> str:
         """Stage 2: Remove redundant lines, preserve critical ones."""
         lines = text.split('\n')
-        if len(lines) <= 10:
+        if len(lines) <= self.SHORT_TEXT_LINES:
             return text  # Too short to compress
 
-        seen_patterns: set[str] = set()
         kept_lines: list[str] = []
-        skipped_count = 0
-
-        for line in lines:
-            stripped = line.strip()
-            if not stripped:
-                continue
-
-            # Always keep critical lines
-            is_critical = any(signal in stripped.lower() for signal in self.CRITICAL_SIGNALS)
-            if is_critical:
-                if skipped_count > 0:
-                    kept_lines.append(f"  [... {skipped_count} similar entries omitted ...]")
-                    skipped_count = 0
-                kept_lines.append(line)
-                continue
-
-            # Deduplicate similar lines (normalize numbers for comparison)
-            normalized = re.sub(r'\d+', 'N', stripped)
-            if normalized in seen_patterns:
-                skipped_count += 1
-                continue
-
-            seen_patterns.add(normalized)
-            if skipped_count > 0:
-                kept_lines.append(f"  [... {skipped_count} similar entries omitted ...]")
-                skipped_count = 0
-            kept_lines.append(line)
-
-        if skipped_count > 0:
-            kept_lines.append(f"  [... {skipped_count} similar entries omitted ...]")
+        deduper = LineDeduper(self.CRITICAL_SIGNALS, self.near_duplicates)
+        deduper.push_text(text, kept_lines)
+        deduper.flush(kept_lines)
 
         return '\n'.join(kept_lines)
 
     def _fit_context(self, text: str) -> str:
-        """Stage 3: Trim to fit within max_chars budget."""
-        if len(text) <= self.max_chars:
-            return text
-
-        # Keep first 30% and last 20%, summarize middle
-        first_cut = int(self.max_chars * 0.3)
-        last_cut = int(self.max_chars * 0.2)
-        middle_budget = self.max_chars - first_cut - last_cut - 50  # 50 for separator
-
-        first = text[:first_cut]
-        last = text[-last_cut:]
-        middle_chars = len(text) - first_cut - last_cut
-
-        return f"{first}\n[... {middle_chars} chars compressed ...]\n{last}"
-
+        """Stage 3: Keep the highest-value lines within the token budget."""
+        return self.fitter.fit(text, self.max_tokens)
+
+
+def signal_matcher(signals: list[str]) -> re.Pattern:
+    """One compiled alternation over all critical signals.
+
+    Match it against lowercased text — cheaper than re.IGNORECASE.
+    """
+    return re.compile('|'.join(map(re.escape, signals)))
+
+
+@functools.cache
+def _spread16() -> list[int]:
+    """16-bit value -> the same bits spread one per byte (SimHash counters)."""
+    table = [0] * 65536
+    for value in range(65536):
+        spread = 0
+        for bit in range(16):
+            if value >> bit & 1:
+                spread |= 1 << (8 * bit)
+        table[value] = spread
+    return table
+
+
+_SIMHASH_TOKENS = re.compile(r'\w+')
+_SIMHASH_BIAS = int.from_bytes(b'\x01' * 64, 'little')
+_SIMHASH_BITS = bytes(0x31 if i >= 128 else 0x30 for i in range(256))  # counter byte -> '1' / '0'
+
+
+@functools.lru_cache(maxsize=65536)
+def _token_hash(token: str) -> int:
+    """Stable 64-bit token hash. The built-in hash() is salted per process,
+    so crush workers and restarts would fold different lines."""
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little')
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the word tokens in `text`.
+
+    All 64 per-bit vote counters live in one integer, one byte each, so a
+    token costs four table lookups rather than a 64-step loop.
+    """
+    spread = _spread16()
+    tokens = _SIMHASH_TOKENS.findall(text)[:127]  # Keeps every counter within a byte
+    acc = 0
+    for token in tokens:
+        h = _token_hash(token)
+        acc += (
+            spread[h & 0xFFFF]
+            | spread[h >> 16 & 0xFFFF] << 128
+            | spread[h >> 32 & 0xFFFF] << 256
+            | spread[h >> 48] << 384
+        )
+    # Bias every counter so it reaches 128 exactly when most tokens set that bit
+    acc += (127 - len(tokens) // 2) * _SIMHASH_BIAS
+    return int(acc.to_bytes(64, 'little').translate(_SIMHASH_BITS)[::-1], 2)
+
+
+class SimHashIndex:
+    """Finds earlier SimHashes within `max_distance` bits.
+
+    Fingerprints are bucketed by four 16-bit bands; two hashes at distance
+    3 or less must agree on at least one band, so lookups stay exhaustive.
+    """
+
+    BANDS = 4
+
+    def __init__(self, max_distance: int = 3):
+        if max_distance >= self.BANDS:
+            raise ValueError(f"max_distance must be below {self.BANDS} for banded lookup")
+        self.max_distance = max_distance
+        self._buckets: list[dict[int, list[int]]] = [{} for _ in range(self.BANDS)]
+
+    def match_or_add(self, fingerprint: int) -> bool:
+        """True if a near match exists; otherwise index `fingerprint`."""
+        for band, bucket in enumerate(self._buckets):
+            for other in bucket.get(fingerprint >> (16 * band) & 0xFFFF, ()):
+                if (fingerprint ^ other).bit_count() <= self.max_distance:
+                    return True
+        for band, bucket in enumerate(self._buckets):
+            bucket.setdefault(fingerprint >> (16 * band) & 0xFFFF, []).append(fingerprint)
+        return False
+
+    def clear(self) -> None:
+        for bucket in self._buckets:
+            bucket.clear()
+
+
+class LineDeduper:
+    """Stage 2 state machine — collapses repeated lines one line at a time.
+
+    Shared by the batch and streaming pipelines so both dedupe identically.
+    Line patterns are kept as 64-bit fingerprints rather than strings.
+    With `near_duplicates`, lines are also folded by shape (paths, hex,
+    quoted strings) and by SimHash distance.
+    """
+
+    # Forget seen patterns past this many, so long streams stay bounded
+    MAX_PATTERNS = 50_000
+
+    _DIGITS = re.compile(r'\d+', re.ASCII)  # ASCII digit classes scan faster
+    _SHAPE = re.compile(
+        r'0x[0-9a-fA-F]+'  # Hex literals
+        r'|\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{4,}\b'  # Hashes, addresses
+        r'|(?:/[\w.@~-]+)+/?'  # Paths and URL paths
+        r'|"[^"\n]*"|\'[^\'\n]*\''  # Quoted strings
+        r'|\d+'
+    )
+
+    def __init__(self, signals: list[str], near_duplicates: bool = False):
+        self.critical = signal_matcher(signals)
+        self.near_duplicates = near_duplicates
+        self._normalizer = self._SHAPE if near_duplicates else self._DIGITS
+        self._seen: set[int] = set()
+        self._simhashes = SimHashIndex() if near_duplicates else None
+        self.skipped_count = 0
+
+    def push(self, line: str, out: list[str]) -> None:
+        """Append `line` to `out` unless it repeats an earlier pattern."""
+        stripped = line.strip()
+        if not stripped:
+            return
+
+        # Always keep critical lines
+        if self.critical.search(stripped.lower()):
+            self._emit_skipped(out)
+            out.append(line)
+            return
+
+        self._push_normalized(line, self._normalizer.sub('N', stripped), out)
+
+    def push_text(self, text: str, out: list[str]) -> None:
+        """Batch form of push() over every line of `text`.
+
+        Signal scanning and normalization each run once over the whole
+        text instead of once per line.
+        """
+        lines = text.split('\n')
+        critical = self._critical_lines(text)
+        normalized = self._normalizer.sub('N', text).split('\n')
+
+        seen = self._seen
+        for i, line in enumerate(lines):
+            if i in critical:
+                self._emit_skipped(out)
+                out.append(line)
+                continue
+            pattern = normalized[i].strip()
+            if not pattern:
+                continue
+            if hash(pattern) in seen:  # Hot path for repetitive logs, inlined
+                self.skipped_count += 1
+                continue
+            self._push_normalized(line, pattern, out)
+
+    def flush(self, out: list[str]) -> None:
+        """Emit the marker for any trailing run of skipped lines."""
+        self._emit_skipped(out)
+
+    def _critical_lines(self, text: str) -> set[int]:
+        """Indices of lines containing a critical signal."""
+        lowered = text.lower()
+        hits: set[int] = set()
+        line_no = 0
+        pos = 0
+        for match in self.critical.finditer(lowered):
+            line_no += lowered.count('\n', pos, match.start())
+            pos = match.start()
+            hits.add(line_no)
+        return hits
+
+    def _push_normalized(self, line: str, pattern: str, out: list[str]) -> None:
+        fingerprint = hash(pattern)
+        if fingerprint in self._seen:
+            self.skipped_count += 1
+            return
+
+        if len(self._seen) >= self.MAX_PATTERNS:
+            self._seen.clear()
+            if self._simhashes is not None:
+                self._simhashes.clear()
+        self._seen.add(fingerprint)
+
+        if self._simhashes is not None and self._simhashes.match_or_add(simhash(pattern)):
+            self.skipped_count += 1
+            return
+
+        self._emit_skipped(out)
+        out.append(line)
+
+    def _emit_skipped(self, out: list[str]) -> None:
+        if self.skipped_count > 0:
+            out.append(f"  [... {self.skipped_count} similar entries omitted ...]")
+            self.skipped_count = 0
+
+
+class StreamFitter:
+    """Stage 3 for streams — head lines pass straight through, the tail is
+    held in a window bounded by `max_chars`.
+
+    Scoring needs the whole text, so streams use a 30/20 head-tail cut at
+    line granularity instead: while the output still fits the budget
+    nothing is dropped; once it overflows only the last 20% of the budget
+    is kept for the tail.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.head_budget = int(max_chars * 0.3)
+        self.tail_budget = int(max_chars * 0.2)
+        self.emitted_chars = 0
+        self.dropped_chars = 0
+        self._pending: deque[str] = deque()
+        self._pending_chars = 0
+        self._overflowed = False
+
+    def push(self, line: str, out: list[str]) -> None:
+        cost = len(line) + 1
+        if not self._pending and not self._overflowed and self.emitted_chars + cost <= self.head_budget:
+            self._emit(line, out)
+            return
+
+        self._pending.append(line)
+        self._pending_chars += cost
+        if not self._overflowed and self.emitted_chars + self._pending_chars > self.max_chars:
+            self._overflowed = True
+        if self._overflowed:
+            while self._pending and self._pending_chars > self.tail_budget:
+                dropped = self._pending.popleft()
+                self._pending_chars -= len(dropped) + 1
+                self.dropped_chars += len(dropped) + 1
+
+    def flush(self, out: list[str]) -> None:
+        if self.dropped_chars:
+            self._emit(f"[... {self.dropped_chars} chars compressed ...]", out)
+        while self._pending:
+            self._emit(self._pending.popleft(), out)
+        self._pending_chars = 0
+
+    def _emit(self, line: str, out: list[str]) -> None:
+        piece = f"\n{line}" if self.emitted_chars else line
+        self.emitted_chars += len(piece)
+        out.append(piece)
+
+
+class StreamCrusher:
+    """Incremental SmartCrusher pipeline over chunked text or NDJSON.
+
+    `feed()` returns output pieces as soon as they are decided, so callers
+    can stream them back before the input ends. Memory is bounded by the
+    fit budget plus the longest line; originals are hashed but not stored.
+    """
+
+    def __init__(self, crusher: "SmartCrusher", ndjson: bool = False):
+        self.crusher = crusher
+        self.ndjson = ndjson
+        self.original_chars = 0
+        self._hasher = hashlib.sha256()
+        self._partial: list[str] = []
+        self._head: list[str] | None = []  # Buffered until the text is known to be long
+        self._deduper = LineDeduper(crusher.CRITICAL_SIGNALS, crusher.near_duplicates)
+        self._fitter = StreamFitter(crusher.max_tokens * CHARS_PER_TOKEN)
+        self._stage2: list[str] = []
+
+    @property
+    def crushed_chars(self) -> int:
+        return self._fitter.emitted_chars
+
+    @property
+    def originals_hash(self) -> str:
+        return self._hasher.hexdigest()[:12]
+
+    def feed(self, chunk: str) -> list[str]:
+        """Consume a chunk of input; return output pieces ready to send."""
+        self._hasher.update(chunk.encode())
+        self.original_chars += len(chunk)
+
+        out: list[str] = []
+        if '\n' not in chunk:
+            self._partial.append(chunk)
+            return out
+
+        self._partial.append(chunk)
+        lines = ''.join(self._partial).split('\n')
+        self._partial = [lines.pop()]
+        for line in lines:
+            self._line(line, out)
+        return out
+
+    def close(self) -> list[str]:
+        """Finish the stream; return the remaining output pieces."""
+        out: list[str] = []
+        tail = ''.join(self._partial)
+        self._partial = []
+        if tail:
+            self._line(tail, out)
+
+        if self._head is not None:
+            # Short input: skip Stage 2, like the batch pipeline
+            for line in self._head:
+                self._fitter.push(line, out)
+            self._head = None
+        else:
+            self._deduper.flush(self._stage2)
+            self._fit(out)
+        self._fitter.flush(out)
+        return out
+
+    def _line(self, raw: str, out: list[str]) -> None:
+        for line in self._decode(raw):
+            line = self.crusher._align_cache(line)
+            if self._head is not None:
+                self._head.append(line)
+                if len(self._head) <= self.crusher.SHORT_TEXT_LINES:
+                    continue
+                head, self._head = self._head, None
+                for buffered in head:
+                    self._deduper.push(buffered, self._stage2)
+            else:
+                self._deduper.push(line, self._stage2)
+            self._fit(out)
+
+    def _fit(self, out: list[str]) -> None:
+        for line in self._stage2:
+            self._fitter.push(line, out)
+        self._stage2.clear()
+
+    def _decode(self, raw: str) -> list[str]:
+        """Turn one input line into text lines (unwrapping NDJSON records)."""
+        if not self.ndjson:
+            return [raw]
+        if not raw.strip():
+            return []
+        try:
+            record = json.loads(raw)
+        except json.JSONDecodeError:
+            return [raw]
+        if isinstance(record, str):
+            return record.split('\n')
+        return [json.dumps(record, separators=(',', ':'))]
+
+
+# Shared result cache — keyed on aligned content, so it survives per-request crushers
+result_cache = TTLCache(ttl=CRUSH_CACHE_TTL, max_entries=CRUSH_CACHE_MAX_ENTRIES, max_bytes=CRUSH_CACHE_MAX_BYTES)
 
 # Singleton instance
 crusher = SmartCrusher()
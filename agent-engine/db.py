@@ -0,0 +1,160 @@
+"""
+PostgREST Client — Async, pooled access to Supabase tables
+
+A thin httpx wrapper over Supabase's REST endpoint (/rest/v1):
+- One long-lived AsyncClient per process, HTTP/2 multiplexed
+- Configurable pool size, timeouts and retries
+- Filters are PostgREST query params, e.g. {"status": "eq.NEW"}
+"""
+
+import asyncio
+import time
+
+import httpx
+
+from config import DB_POOL_SIZE, DB_TIMEOUT, DB_RETRIES, DB_HTTP2
+from metrics import db_query_duration
+
+
+class PostgrestError(Exception):
+    """Non-retryable error response from PostgREST."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"PostgREST {status_code}: {detail}")
+        self.status_code = status_code
+
+
+class AsyncPostgrest:
+    """Pooled async client for one Supabase project's REST API."""
+
+    RETRY_STATUS = {429, 502, 503, 504}
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        pool_size: int = 20,
+        timeout: float = 10.0,
+        retries: int = 2,
+        http2: bool = True,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self.headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+        }
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.http2 = http2
+        self._transport = transport  # e.g. httpx.ASGITransport(fake_app) for offline runs
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                http2=self.http2 and self._transport is None,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def select(
+        self,
+        table: str,
+        filters: dict[str, str] | None = None,
+        columns: str = "*",
+        order: str | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        """GET rows. `order` uses PostgREST syntax, e.g. "created_at.desc"."""
+        params = {"select": columns, **(filters or {})}
+        if order:
+            params["order"] = order
+        if limit is not None:
+            params["limit"] = str(limit)
+        return await self._request("GET", table, params=params, idempotent=True)
+
+    async def insert(self, table: str, rows: dict | list[dict]) -> list[dict]:
+        """POST one or many rows; returns the inserted rows."""
+        return await self._request(
+            "POST", table, json=rows,
+            headers={"Prefer": "return=representation"},
+            idempotent=False,
+        )
+
+    async def update(self, table: str, values: dict, filters: dict[str, str]) -> list[dict]:
+        """PATCH rows matching `filters`; returns the updated rows."""
+        if not filters:
+            raise ValueError("update() without filters would touch every row")
+        return await self._request(
+            "PATCH", table, params=filters, json=values,
+            headers={"Prefer": "return=representation"},
+            idempotent=True,
+        )
+
+    async def rpc(self, function: str, params: dict | None = None) -> list[dict] | dict:
+        """Call a Postgres function exposed by PostgREST."""
+        return await self._request("POST", f"rpc/{function}", json=params or {}, idempotent=False)
+
+    async def _request(self, method: str, path: str, idempotent: bool, **kwargs):
+        """Send with retries, timing the whole call (retries included)."""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self._send(method, path, idempotent, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            db_query_duration.observe(
+                time.perf_counter() - start,
+                method=method, table=path.split("/")[0], outcome=outcome,
+            )
+
+    async def _send(self, method: str, path: str, idempotent: bool, **kwargs):
+        """Non-idempotent calls only retry when the request provably never
+        reached the server."""
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, f"/{path}", **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if attempt >= self.retries:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt >= self.retries:
+                    raise
+            else:
+                if response.status_code in self.RETRY_STATUS and idempotent and attempt < self.retries:
+                    pass
+                elif response.is_error:
+                    raise PostgrestError(response.status_code, response.text)
+                else:
+                    return response.json() if response.content else []
+            attempt += 1
+            await asyncio.sleep(0.1 * 2 ** attempt)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_postgrest(url: str, key: str) -> AsyncPostgrest:
+    """Client configured from the DB_* settings."""
+    return AsyncPostgrest(
+        url, key,
+        pool_size=DB_POOL_SIZE,
+        timeout=DB_TIMEOUT,
+        retries=DB_RETRIES,
+        http2=DB_HTTP2,
+    )
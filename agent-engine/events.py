@@ -0,0 +1,96 @@
+"""
+Worker Wakeups — Push-driven scheduling for the agent loop
+
+- Database webhooks (POST /events, Supabase "Database Webhooks" payloads)
+  wake the worker as soon as a NEW inbox item lands or an agent's status
+  changes, instead of waiting out a 45–90 s sleep
+- Adaptive backoff stretches the idle interval while nothing changes, so
+  a quiet fleet stops polling the database every minute
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+
+
+class AdaptiveBackoff:
+    """Idle interval that grows while nothing changes and resets on change."""
+
+    def __init__(self, minimum: float, maximum: float, factor: float = 2.0, jitter: float = 0.1):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.factor = factor
+        self.jitter = jitter
+        self.current = minimum
+
+    def reset(self) -> None:
+        self.current = self.minimum
+
+    def next(self, changed: bool) -> float:
+        """Delay before the next cycle, given whether the last one saw changes."""
+        if changed:
+            self.reset()
+        else:
+            self.current = min(self.current * self.factor, self.maximum)
+        return self.current * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class Wakeup:
+    """Event the worker sleeps on; notify() cuts its sleep short."""
+
+    def __init__(self, debounce: float = 0.5):
+        self.debounce = debounce  # Let a burst of changes settle into one wakeup
+        self._event = asyncio.Event()
+        self._reasons: Counter[str] = Counter()
+        self._last_notified: float | None = None
+
+    def notify(self, reason: str) -> None:
+        self._reasons[reason] += 1
+        self._last_notified = time.monotonic()
+        self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Sleep up to `timeout` seconds; True if woken by a notification."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        await asyncio.sleep(self.debounce)
+        self._event.clear()
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "notifications": dict(self._reasons),
+            "seconds_since_last": round(time.monotonic() - self._last_notified, 1)
+            if self._last_notified is not None else None,
+        }
+
+
+def should_wake(table: str, change: str, record: dict | None, old_record: dict | None) -> bool:
+    """Changes that give agents something new to act on.
+
+    The worker's own writes (heartbeats, task changes, replies filed as
+    READ) must not wake it, or every cycle would trigger the next.
+    """
+    record = record or {}
+    old_record = old_record or {}
+    if table == "inbox_items":
+        return record.get("status") == "NEW" and (change == "INSERT" or old_record.get("status") != "NEW")
+    if table == "agents":
+        return change in ("INSERT", "DELETE") or record.get("status") != old_record.get("status")
+    return False
+
+
+def changed_columns(record: dict | None, old_record: dict | None) -> set:
+    """Columns whose value differs between a webhook's old and new row."""
+    record = record or {}
+    old_record = old_record or {}
+    if not old_record:
+        return set(record)
+    return {k for k in record.keys() | old_record.keys() if record.get(k) != old_record.get(k)}
+
+
+# Singleton
+wakeup = Wakeup()
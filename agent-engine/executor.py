@@ -0,0 +1,147 @@
+"""
+Crush Executor — Keeps CPU-bound SmartCrusher work off the event loop
+
+Modes (CRUSH_EXECUTOR):
+- inline  — crush on the event loop (previous behaviour)
+- thread  — thread pool; cheap hand-off, but crushes still contend with
+            the loop for the GIL
+- process — process pool; the loop stays fully responsive and crushes
+            run in parallel across cores
+
+Payloads shorter than CRUSH_INLINE_THRESHOLD chars always run inline,
+since handing them off costs more than crushing them.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+from config import CRUSH_EXECUTOR, CRUSH_WORKERS, CRUSH_INLINE_THRESHOLD
+from crusher import CrushResult, SmartCrusher
+
+
+@functools.lru_cache(maxsize=64)
+def _crusher(options: tuple) -> SmartCrusher:
+    """One SmartCrusher (and its compiled matchers) per distinct option set."""
+    return SmartCrusher(**dict(options))
+
+
+def _options_key(options: dict) -> tuple:
+    return tuple(sorted(options.items()))
+
+
+def _fit_in_worker(aligned: str, options: tuple) -> tuple[str, dict[str, float]]:
+    """Process-pool entry point: Stages 2 and 3 only. The parent aligns,
+    owns the result cache and the originals store, and records metrics."""
+    stage_seconds: dict[str, float] = {}
+    return _crusher(options).fit(aligned, stage_seconds), stage_seconds
+
+
+class BatchItem(NamedTuple):
+    result: CrushResult
+    seconds: float  # Wall time for this item, queueing included
+    duplicate_of: int | None  # Earlier identical item whose result was reused
+
+
+class CrushExecutor:
+    """Dispatches crush jobs inline, to a thread pool or to a process pool."""
+
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, mode: str = "process", workers: int = 0, inline_threshold: int = 20_000):
+        if mode not in self.MODES:
+            raise ValueError(f"CRUSH_EXECUTOR must be one of {self.MODES}, got {mode!r}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.inline_threshold = inline_threshold
+        self._pool: Executor | None = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                # spawn: never fork a process that may hold cache/store locks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crush")
+        return self._pool
+
+    async def crush(self, content: str | list | dict, **options) -> CrushResult:
+        """Crush `content` without blocking the event loop on large payloads.
+
+        `options` are SmartCrusher keyword arguments (max_chars, max_tokens, ...).
+        """
+        key = _options_key(options)
+        return await self._crush_raw(_crusher(key).serialize(content), key)
+
+    async def _crush_raw(self, raw: str, key: tuple) -> CrushResult:
+        c = _crusher(key)
+        if self.mode == "inline" or len(raw) < self.inline_threshold:
+            return c.crush(raw)
+
+        loop = asyncio.get_running_loop()
+        if self.mode == "thread":
+            return await loop.run_in_executor(self._get_pool(), c.crush, raw)
+
+        # Stage 1 and the cache lookup stay in the parent, so every process
+        # shares one result cache and /crush/stats sees every lookup
+        start = time.perf_counter()
+        aligned = c.aligner.align(raw)
+        stage_seconds = {"align_cache": time.perf_counter() - start}
+        cache_key = c.cache_key(aligned)
+        fitted = c.cache.get(cache_key)
+        if fitted is None:
+            fitted, fit_seconds = await loop.run_in_executor(self._get_pool(), _fit_in_worker, aligned, key)
+            stage_seconds.update(fit_seconds)
+            c.cache.set(cache_key, fitted, size=len(fitted))
+        # Originals and metrics stay here too: the worker's registry is never scraped
+        return c.result(raw, fitted, stage_seconds)
+
+    async def crush_many(self, items: list[tuple[str | list | dict, dict]]) -> list[BatchItem]:
+        """Crush (content, options) items concurrently; results keep input order.
+
+        Items identical in content and options are crushed once.
+        """
+        jobs: list[tuple[str, tuple]] = []
+        for content, options in items:
+            key = _options_key(options)
+            jobs.append((_crusher(key).serialize(content), key))
+        slots: dict[tuple[str, tuple], int] = {}  # job -> index into firsts
+        firsts: list[int] = []  # item index of each distinct job
+        for i, job in enumerate(jobs):
+            if job not in slots:
+                slots[job] = len(firsts)
+                firsts.append(i)
+
+        async def timed(raw: str, key: tuple) -> tuple[CrushResult, float]:
+            start = time.perf_counter()
+            result = await self._crush_raw(raw, key)
+            return result, time.perf_counter() - start
+
+        done = await asyncio.gather(*(timed(*jobs[i]) for i in firsts))
+
+        out: list[BatchItem] = []
+        for i, job in enumerate(jobs):
+            first = firsts[slots[job]]
+            result, seconds = done[slots[job]]
+            out.append(BatchItem(result, seconds, None) if first == i else BatchItem(result, 0.0, first))
+        return out
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Singleton
+crush_executor = CrushExecutor(
+    mode=CRUSH_EXECUTOR,
+    workers=CRUSH_WORKERS,
+    inline_threshold=CRUSH_INLINE_THRESHOLD,
+)
@@ -0,0 +1,165 @@
+"""
+Fake PostgREST — In-memory stand-in for Supabase's /rest/v1 API
+
+Implements the subset Custodian uses (select / insert / update with eq,
+neq, lt, lte, gt, gte, like, ilike, in, is filters, order and limit, and
+the worker lease functions from migrations/) so the agent engine can be
+run and load-tested without network.
+
+Run standalone:
+    uvicorn fakes.postgrest:app --port 54321
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=fake uvicorn main:app
+
+Or in-process, via httpx.ASGITransport(app) passed to AsyncPostgrest.
+Set FAKE_PG_LATENCY_MS to simulate network round-trip time.
+"""
+
+import asyncio
+import fnmatch
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, HTTPException, Request
+
+LATENCY = float(os.getenv("FAKE_PG_LATENCY_MS", "0")) / 1000
+
+app = FastAPI(title="Fake PostgREST")
+tables: dict[str, list[dict]] = {}
+
+
+def seed(agents: int = 5, inbox: int = 5, memories: int = 20) -> None:
+    """Reset tables to a small fleet, inbox and memory log."""
+    tables.clear()
+    names = ["THE BOSS", "THE ENGINEER", "THE ANALYST", "THE CUSTODIAN", "THE DEPLOYER"]
+    tables["agents"] = [
+        _row({
+            "name": names[i] if i < len(names) else f"AGENT {i}",
+            "role": "Operations",
+            "status": "RUNNING",
+            "current_task": "Monitoring system",
+            "last_heartbeat": None,
+        })
+        for i in range(agents)
+    ]
+    tables["inbox_items"] = [
+        _row({"type": "ALERT", "source": "SENTRY", "title": f"Alert {i}", "body": f"Error rate spike #{i}",
+              "priority": "P1", "status": "NEW"})
+        for i in range(inbox)
+    ]
+    tables["boss_memory"] = [
+        _row({"content": f"Decision {i}: keep deploy cadence steady", "category": "DECISION"})
+        for i in range(memories)
+    ]
+
+
+def _row(values: dict) -> dict:
+    return {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat(), **values}
+
+
+def _matches(row: dict, column: str, expr: str) -> bool:
+    op, _, value = expr.partition(".")
+    field = row.get(column)
+    if op == "is":
+        return field is None if value == "null" else str(field).lower() == value
+    if op == "in":
+        return str(field) in value.strip("()").split(",")
+    if field is None:
+        return False
+    if op == "eq":
+        return str(field) == value
+    if op == "neq":
+        return str(field) != value
+    if op in ("like", "ilike"):
+        pattern = value.replace("%", "*")  # PostgREST accepts either wildcard
+        if op == "ilike":
+            return fnmatch.fnmatchcase(str(field).lower(), pattern.lower())
+        return fnmatch.fnmatchcase(str(field), pattern)
+    if op in ("lt", "lte", "gt", "gte"):
+        left, right = str(field), value
+        return {"lt": left < right, "lte": left <= right, "gt": left > right, "gte": left >= right}[op]
+    raise HTTPException(status_code=400, detail=f"Unsupported operator: {op}")
+
+
+def _filter(rows: list[dict], params) -> list[dict]:
+    reserved = {"select", "order", "limit", "offset"}
+    for column, expr in params.multi_items():
+        if column not in reserved:
+            rows = [r for r in rows if _matches(r, column, expr)]
+    return rows
+
+
+@app.get("/rest/v1/{table}")
+async def select(table: str, request: Request):
+    await asyncio.sleep(LATENCY)
+    rows = _filter(tables.get(table, []), request.query_params)
+    order = request.query_params.get("order")
+    if order:
+        for part in reversed(order.split(",")):
+            column, _, direction = part.partition(".")
+            rows = sorted(rows, key=lambda r: (r.get(column) is None, str(r.get(column))),
+                          reverse=direction.startswith("desc"))
+    offset = int(request.query_params.get("offset", 0))
+    limit = request.query_params.get("limit")
+    return rows[offset:offset + int(limit) if limit else None]
+
+
+@app.post("/rest/v1/{table}", status_code=201)
+async def insert(table: str, request: Request):
+    await asyncio.sleep(LATENCY)
+    body = await request.json()
+    rows = [_row(r) for r in (body if isinstance(body, list) else [body])]
+    tables.setdefault(table, []).extend(rows)
+    return rows
+
+
+def _lease(row: dict, owner: str, ttl: int, now: datetime) -> bool:
+    """Take the row's lease unless another owner holds a live one. Handlers
+    never await between check and set, which makes this as atomic as the
+    FOR UPDATE SKIP LOCKED claim it stands in for."""
+    expires = row.get("lease_expires_at")
+    if row.get("lease_owner") not in (None, owner) and expires and expires > now.isoformat():
+        return False
+    row["lease_owner"] = owner
+    row["lease_expires_at"] = (now + timedelta(seconds=ttl)).isoformat()
+    return True
+
+
+@app.post("/rest/v1/rpc/{function}")
+async def rpc(function: str, request: Request):
+    await asyncio.sleep(LATENCY)
+    args = await request.json()
+    now = datetime.now(timezone.utc)
+    if function == "claim_agents":
+        running = sorted((a for a in tables.get("agents", []) if a.get("status") == "RUNNING"),
+                         key=lambda a: (a.get("lease_expires_at") is not None, str(a.get("lease_expires_at"))))
+        claimed = []
+        for agent in running:
+            if len(claimed) >= args["p_limit"]:
+                break
+            if _lease(agent, args["p_owner"], args["p_ttl_seconds"], now):
+                claimed.append(agent)
+        return claimed
+    if function == "release_agents":
+        for agent in tables.get("agents", []):
+            if agent["id"] in args["p_ids"] and agent.get("lease_owner") == args["p_owner"]:
+                agent.update(lease_owner=None, lease_expires_at=now.isoformat())
+        return None
+    if function == "claim_inbox_item":
+        return [item for item in tables.get("inbox_items", [])
+                if item["id"] == args["p_id"] and item.get("status") == "NEW"
+                and _lease(item, args["p_owner"], args["p_ttl_seconds"], now)]
+    raise HTTPException(status_code=404, detail=f"Unknown function: {function}")
+
+
+@app.patch("/rest/v1/{table}")
+async def update(table: str, request: Request):
+    await asyncio.sleep(LATENCY)
+    values = await request.json()
+    rows = _filter(tables.get(table, []), request.query_params)
+    for row in rows:
+        row.update(values)
+    return rows
+
+
+seed()
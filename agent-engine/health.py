@@ -0,0 +1,108 @@
+"""
+Dependency Health — Background probes behind /ready
+
+- Each dependency (Supabase, LLM) is probed on an interval by a
+  background task, never by the request that asks about it
+- /health and /ready read the cached state, so orchestrator probes at
+  any frequency cost no external calls
+- Per-dependency latency and error counters
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("health")
+
+
+class DependencyProbe:
+    """Cached connectivity state for one dependency."""
+
+    def __init__(self, name: str, check: Callable[[], Awaitable[object]], required: bool = True, timeout: float = 5.0):
+        self.name = name
+        self.check = check
+        self.required = required  # Whether readiness depends on it
+        self.timeout = timeout
+        self.ok: bool | None = None  # None until the first probe finishes
+        self.last_error: str | None = None
+        self.last_checked: float | None = None
+        self.last_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+        self._counters = {"checks": 0, "failures": 0, "consecutive_failures": 0}
+
+    async def probe(self) -> bool:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.check(), self.timeout)
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        else:
+            ok, error = True, None
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        self._counters["checks"] += 1
+        self._total_latency_ms += latency_ms
+        self.last_latency_ms = latency_ms
+        self.last_checked = time.monotonic()
+        if ok:
+            self._counters["consecutive_failures"] = 0
+        else:
+            self._counters["failures"] += 1
+            self._counters["consecutive_failures"] += 1
+            if self.ok is not False:
+                logger.warning(f"⚠️ {self.name} probe failing: {error}")
+        if ok and self.ok is False:
+            logger.info(f"✅ {self.name} probe recovered")
+        self.ok, self.last_error = ok, error
+        return ok
+
+    def stats(self) -> dict:
+        checks = self._counters["checks"]
+        return {
+            "status": "unknown" if self.ok is None else "up" if self.ok else "down",
+            "required": self.required,
+            **self._counters,
+            "last_latency_ms": round(self.last_latency_ms, 1),
+            "avg_latency_ms": round(self._total_latency_ms / checks, 1) if checks else 0.0,
+            "seconds_since_check": round(time.monotonic() - self.last_checked, 1) if self.last_checked else None,
+            "last_error": self.last_error,
+        }
+
+
+class HealthMonitor:
+    """Runs every probe on an interval in the background."""
+
+    def __init__(self, interval: float = 15.0):
+        self.interval = interval
+        self.probes: dict[str, DependencyProbe] = {}
+        self._task: asyncio.Task | None = None
+
+    def add(self, probe: DependencyProbe) -> None:
+        self.probes[probe.name] = probe
+
+    @property
+    def ready(self) -> bool:
+        """Every required dependency answered its latest probe."""
+        return all(p.ok for p in self.probes.values() if p.required)
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(p.probe() for p in self.probes.values()))
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None and self.probes:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {name: probe.stats() for name, probe in self.probes.items()}
@@ -0,0 +1,102 @@
+"""
+Worker Leases — Partition agent turns across worker processes
+
+Every process running the agent loop (replicas, `uvicorn --workers N`,
+standalone `python worker.py`) claims what it works on:
+- Agents: each cycle leases RUNNING agents nobody else holds a batch at a
+  time, least recently run first, claiming the next batch as turns free
+  up until none are left; they are released after the cycle
+- Inbox items: a REPLY first leases its target for the replying agent;
+  losing the race (to any other agent, on any worker) drops the reply
+- Claimed inbox items are left out of every other prompt
+
+Claims are row leases with an expiry, taken by Postgres functions using
+SELECT ... FOR UPDATE SKIP LOCKED (migrations/001_worker_leases.sql), so
+concurrent workers get disjoint batches and a crashed worker's claims
+lapse after WORKER_LEASE_TTL.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger("leases")
+
+
+class Leases:
+    """Claims agents and inbox items on behalf of one worker process."""
+
+    def __init__(self, owner: str, ttl: int = 300, batch: int = 4):
+        self.owner = owner
+        self.ttl = ttl
+        self.batch = max(batch, 1)
+        self.agents_claimed = 0
+        self.cycles_empty = 0  # cycles where other workers held every RUNNING agent
+        self.items_claimed = 0
+        self.items_lost = 0
+
+    async def claim_agents(self, custodian, held: dict[str, dict] | None = None) -> list[dict]:
+        """Lease up to `batch` RUNNING agents.
+
+        `held` (id -> agent) collects a cycle's claims: agents already in it
+        are renewed but not returned again, so a cycle claims until every
+        agent no other worker holds has had its turn.
+        """
+        first = not held
+        agents = await custodian.claim_agents(self.owner, self.ttl, self.batch)
+        if held is not None:
+            fresh = [a for a in agents if a["id"] not in held]
+            held.update((a["id"], a) for a in agents)
+            agents = fresh
+        self.agents_claimed += len(agents)
+        if not agents and first:
+            self.cycles_empty += 1
+        return agents
+
+    async def release_agents(self, custodian, agents: list[dict]) -> None:
+        """Hand agents back once their turns are done, so the next cycle
+        of any worker can take them without waiting for expiry."""
+        if not agents:
+            return
+        try:
+            await custodian.release_agents(self.owner, [a["id"] for a in agents])
+        except Exception as e:
+            logger.warning(f"⚠️ Lease release failed (expires in {self.ttl}s): {e}")
+
+    async def claim_inbox_item(self, custodian, item_id: str, agent: str) -> bool:
+        """True if `agent` may answer the item."""
+        if await custodian.claim_inbox_item(item_id, f"{self.owner}/{agent}", self.ttl):
+            self.items_claimed += 1
+            return True
+        self.items_lost += 1
+        return False
+
+    def held_elsewhere(self, row: dict, now: datetime | None = None) -> bool:
+        """True while someone else's lease on `row` is live (inbox claims
+        belong to an agent, so they count even when taken by this worker)."""
+        owner, expires = row.get("lease_owner"), row.get("lease_expires_at")
+        if not owner or owner == self.owner or not expires:
+            return False
+        now = now or datetime.now(timezone.utc)
+        try:
+            expiry = datetime.fromisoformat(str(expires).replace("Z", "+00:00"))
+        except ValueError:
+            return False
+        if expiry.tzinfo is None:
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        return expiry > now
+
+    def visible(self, items: list[dict]) -> list[dict]:
+        """Rows no other worker is currently handling."""
+        now = datetime.now(timezone.utc)
+        return [i for i in items if not self.held_elsewhere(i, now)]
+
+    def stats(self) -> dict:
+        return {
+            "owner": self.owner,
+            "ttl": self.ttl,
+            "batch": self.batch,
+            "agents_claimed": self.agents_claimed,
+            "cycles_empty": self.cycles_empty,
+            "items_claimed": self.items_claimed,
+            "items_lost": self.items_lost,
+        }
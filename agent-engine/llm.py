@@ -0,0 +1,146 @@
+"""
+LLM Backends — Long-lived model clients for agent turns
+
+- One GenerativeModel per agent role, built once with its static system
+  instruction; each turn only sends the dynamic context
+- Structured JSON output (response_schema), so replies parse directly
+- Optional provider-side context caching of the system instruction
+  (LLM_CONTEXT_CACHE); Gemini only caches prompts above a minimum size,
+  so this falls back to the plain model when the cache is refused
+- MockLLM for offline runs and benchmarks (LLM_BACKEND=mock)
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+
+logger = logging.getLogger("llm")
+
+# Structured output for agent decisions
+DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "format": "enum", "enum": ["LOG", "UPDATE_TASK", "REPLY"]},
+        "content": {"type": "string"},
+        "thought": {"type": "string"},
+        "target_id": {"type": "string", "nullable": True},
+    },
+    "required": ["action", "content", "thought"],
+}
+
+
+class GeminiPool:
+    """Reusable Gemini models keyed by role."""
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "gemini-2.0-flash",
+        context_cache: bool = False,
+        cache_ttl: float = 3600,
+    ):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.model_name = model_name
+        self.context_cache = context_cache
+        self.cache_ttl = cache_ttl
+        self.generation_config = genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=DECISION_SCHEMA,
+        )
+        self._models: dict[str, tuple[object, float]] = {}  # role -> (model, expires)
+
+    async def model_for(self, role: str, system_instruction: str):
+        entry = self._models.get(role)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        if self.context_cache:
+            # Creating the cache is a blocking API call
+            model, expires = await asyncio.to_thread(self._build, role, system_instruction)
+        else:
+            model, expires = self._build(role, system_instruction)
+        self._models[role] = (model, expires)
+        return model
+
+    def _build(self, role: str, system_instruction: str) -> tuple[object, float]:
+        genai = self._genai
+        if self.context_cache:
+            try:
+                from google.generativeai import caching
+
+                cached = caching.CachedContent.create(
+                    model=f"models/{self.model_name}",
+                    display_name=f"agent-engine {role}"[:128],
+                    system_instruction=system_instruction,
+                    ttl=self.cache_ttl,
+                )
+                model = genai.GenerativeModel.from_cached_content(cached, generation_config=self.generation_config)
+                # Rebuild a little before the provider expires the cache
+                return model, time.monotonic() + self.cache_ttl * 0.9
+            except Exception as e:
+                logger.warning(f"⚠️ Context cache unavailable for {role}, using plain model: {e}")
+        model = genai.GenerativeModel(
+            self.model_name,
+            system_instruction=system_instruction,
+            generation_config=self.generation_config,
+        )
+        return model, float("inf")
+
+    async def ping(self) -> None:
+        """Model metadata lookup: checks key and reachability without
+        spending generation quota."""
+        await asyncio.to_thread(self._genai.get_model, f"models/{self.model_name}")
+
+    async def generate(self, role: str, system_instruction: str, prompt: str) -> str:
+        model = await self.model_for(role, system_instruction)
+        response = await model.generate_content_async(prompt)
+        return response.text
+
+
+class MockLLM:
+    """Offline stand-in: schema-shaped decisions after a simulated latency."""
+
+    _INBOX_ID = re.compile(r'\bid=([\w-]+)')
+
+    def __init__(self, latency: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    async def ping(self) -> None:
+        pass
+
+    async def generate(self, role: str, system_instruction: str, prompt: str) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        inbox_ids = self._INBOX_ID.findall(prompt)
+        roll = self._rng.random()
+        if inbox_ids and roll < 0.5:
+            decision = {"action": "REPLY", "content": f"{role} acknowledges.", "target_id": inbox_ids[0]}
+        elif roll < 0.8:
+            decision = {"action": "LOG", "content": f"{role} checked in; nothing unusual."}
+        else:
+            decision = {"action": "UPDATE_TASK", "content": f"{role} review cycle {self.calls}"}
+        decision["thought"] = "mock"
+        return json.dumps(decision)
+
+
+def create_llm(
+    backend: str,
+    api_key: str = "",
+    model_name: str = "gemini-2.0-flash",
+    context_cache: bool = False,
+    mock_latency: float = 0.0,
+) -> GeminiPool | MockLLM:
+    """Backend from the LLM_* settings."""
+    if backend == "mock":
+        return MockLLM(latency=mock_latency)
+    if backend == "gemini":
+        return GeminiPool(api_key, model_name, context_cache=context_cache)
+    raise ValueError(f"LLM_BACKEND must be 'gemini' or 'mock', got {backend!r}")
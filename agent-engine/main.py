@@ -3,30 +3,80 @@ Agent Engine — FastAPI Backend for Antigravity Agent Intelligence
 
 Endpoints:
 - POST /crush     — Compress context (SmartCrusher)
+- POST /crush/batch  — Compress many documents in parallel (deduped, per-item timings)
+- POST /crush/stream — Compress a chunked text / NDJSON upload incrementally
+- GET  /crush/stats  — Originals store and result cache counters
 - POST /memory    — Save a memory
-- GET  /recall    — Search memories
+- GET  /memory/stats — Write-behind queue depth and flush latency
+- GET  /recall    — Search memories (ranked, with scores)
+- POST /recall/batch — Many recall queries at once (deduped, concurrent)
 - GET  /context   — Get live context summary for AI
-- GET  /fleet     — Get fleet status
-- GET  /inbox     — Get inbox items
-- GET  /health    — Health check
+- GET  /fleet     — Get fleet status (ETag / If-None-Match)
+- GET  /inbox     — Get inbox items (ETag / If-None-Match)
+- GET  /views/stats  — In-memory agents / inbox view counters
+- GET  /worker/stats — Agent scheduler throughput, queue wait and prompt token savings (incl. delta context)
+- POST /events    — Database webhook; wakes the worker on new inbox items / fleet changes
+- GET  /health    — Liveness (no external calls)
+- GET  /ready     — Readiness from background dependency probes
+- GET  /metrics   — Prometheus text-format latency histograms and counters
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
 import asyncio
-from crusher import crusher, SmartCrusher
-from config import PORT
-from worker import agent_loop
+import codecs
+import hashlib
+import hmac
+import json
+import time
+from crusher import crusher, result_cache, CrushResult, SmartCrusher
+from originals import originals
+from executor import crush_executor
+from config import PORT, STORAGE_CONFIGURED, EVENTS_SECRET, HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT, WORKER_MODE
+from events import wakeup, should_wake, changed_columns
+from health import DependencyProbe, HealthMonitor
+from metrics import registry, http_request_duration
+from worker import agent_loop, contexts, get_llm, leases, prompts, replies, scheduler
+
+health_monitor = HealthMonitor(interval=HEALTH_PROBE_INTERVAL)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Lifecycle manager: Start the agent worker loop on startup."""
-    task = asyncio.create_task(agent_loop())
+    """Lifecycle manager: Start the agent worker loop (unless it runs
+    externally) and dependency probes on startup.
+
+    Nothing heavy happens before the first request can be served: the
+    storage client and the Gemini SDK are built by the probes and the
+    worker once the loop is running."""
+    if STORAGE_CONFIGURED:
+        health_monitor.add(DependencyProbe("database", _ping_database, timeout=HEALTH_PROBE_TIMEOUT))
+    # The API serves without the LLM; only the worker needs it
+    health_monitor.add(DependencyProbe("llm", _ping_llm, required=False, timeout=HEALTH_PROBE_TIMEOUT))
+    health_monitor.start()
+    # WORKER_MODE=external: the agent loop runs in its own process (`python worker.py`)
+    task = asyncio.create_task(agent_loop()) if WORKER_MODE == "embedded" else None
     yield
-    # Cancel task on shutdown if needed
-    task.cancel()
+    # Stop the worker first so its last writes make the final flush
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    await health_monitor.stop()
+    crush_executor.shutdown()
+    from memory import custodian
+    if custodian:
+        await custodian.aclose()  # Flushes the write-behind buffer
+
+async def _ping_database():
+    from memory import custodian
+    await custodian.ping()
+
+async def _ping_llm():
+    # First call imports the Gemini SDK (~1s); keep that off the event loop
+    llm = await asyncio.to_thread(get_llm)
+    await llm.ping()
 
 app = FastAPI(
     title="Antigravity Agent Engine",
@@ -45,6 +95,39 @@ app.add_middleware(
 )
 
 
+class MetricsMiddleware:
+    """Times every HTTP request by route template. Plain ASGI rather than
+    @app.middleware so /crush/stream keeps its duplex body handling."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),  # Template, so ids don't explode cardinality
+                status=status,
+            )
+
+app.add_middleware(MetricsMiddleware)
+
+
 # ═══════════════════════════════════════
 # Request/Response Models
 # ═══════════════════════════════════════
@@ -52,6 +135,13 @@ app.add_middleware(
 class CrushRequest(BaseModel):
     content: str | list | dict
     max_chars: int = 4000
+    max_tokens: int | None = None  # Overrides the budget derived from max_chars
+    near_duplicates: bool = False  # Also fold lines differing only in paths/hex/wording
+    structured: bool = True  # Summarize JSON arrays/objects as compact valid JSON
+
+    def options(self) -> dict:
+        """SmartCrusher keyword arguments for this request."""
+        return self.model_dump(exclude={"content"})
 
 class CrushResponse(BaseModel):
     original_chars: int
@@ -60,6 +150,19 @@ class CrushResponse(BaseModel):
     content: str
     hash: str
 
+class CrushBatchRequest(BaseModel):
+    items: list[CrushRequest]
+
+class CrushBatchItem(CrushResponse):
+    ms: float  # Wall time for this item; 0 for duplicates
+    stages_ms: dict[str, float]  # Per-stage time; empty on a result-cache hit
+    duplicate_of: int | None = None  # Index of the identical item crushed instead
+
+class CrushBatchResponse(BaseModel):
+    results: list[CrushBatchItem]
+    unique: int  # Distinct items actually crushed
+    ms: float
+
 class MemoryRequest(BaseModel):
     content: str
     category: str = "NOTE"
@@ -72,16 +175,23 @@ class RecallQuery(BaseModel):
     query: str
     limit: int = 5
 
+class RecallBatchRequest(BaseModel):
+    queries: list[RecallQuery]
+
+class DatabaseEvent(BaseModel):
+    """Supabase database webhook payload."""
+    type: str  # INSERT | UPDATE | DELETE
+    table: str
+    schema_name: str = Field("public", alias="schema")
+    record: dict | None = None
+    old_record: dict | None = None
+
 
 # ═══════════════════════════════════════
 # Smart Crusher Endpoints
 # ═══════════════════════════════════════
 
-@app.post("/crush", response_model=CrushResponse)
-async def crush_context(req: CrushRequest):
-    """Compress context using SmartCrusher pipeline."""
-    c = SmartCrusher(max_chars=req.max_chars)
-    result = c.crush(req.content)
+def _crush_response(result: CrushResult) -> CrushResponse:
     return CrushResponse(
         original_chars=result.original_chars,
         crushed_chars=result.crushed_chars,
@@ -90,6 +200,73 @@ async def crush_context(req: CrushRequest):
         hash=result.originals_hash,
     )
 
+@app.post("/crush", response_model=CrushResponse)
+async def crush_context(req: CrushRequest):
+    """Compress context using SmartCrusher pipeline."""
+    result = await crush_executor.crush(req.content, **req.options())
+    return _crush_response(result)
+
+@app.post("/crush/batch", response_model=CrushBatchResponse)
+async def crush_batch(req: CrushBatchRequest):
+    """Compress many documents in parallel; results are in request order.
+    Identical items (content and options) are crushed once."""
+    start = time.perf_counter()
+    items = await crush_executor.crush_many([(item.content, item.options()) for item in req.items])
+    return CrushBatchResponse(
+        results=[
+            CrushBatchItem(
+                **_crush_response(item.result).model_dump(),
+                ms=round(item.seconds * 1000, 2),
+                stages_ms={k: round(v * 1000, 2) for k, v in item.result.stage_seconds.items()} if item.duplicate_of is None else {},
+                duplicate_of=item.duplicate_of,
+            )
+            for item in items
+        ],
+        unique=sum(item.duplicate_of is None for item in items),
+        ms=round((time.perf_counter() - start) * 1000, 2),
+    )
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that may start sending while the request body is
+    still being read.
+
+    Starlette's default response listens for disconnects by calling
+    `receive()`, which would steal body chunks from `request.stream()`.
+    Here the request stream itself surfaces disconnects instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/crush/stream")
+async def crush_stream(request: Request, max_chars: int = 4000):
+    """Compress a chunked text or NDJSON upload, streaming output as it is ready.
+
+    Send `Content-Type: application/x-ndjson` to treat each line as a JSON
+    record; anything else is handled as plain text lines.
+    """
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    stream = SmartCrusher(max_chars=max_chars).stream(ndjson=ndjson)
+
+    async def pipeline():
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for chunk in request.stream():
+            pieces = stream.feed(decoder.decode(chunk))
+            if pieces:
+                yield "".join(pieces)
+        pieces = stream.feed(decoder.decode(b"", final=True)) + stream.close()
+        if pieces:
+            yield "".join(pieces)
+
+    return DuplexStreamingResponse(pipeline(), media_type="text/plain; charset=utf-8")
+
+@app.get("/crush/stats")
+async def crush_stats():
+    """Originals store and result cache counters and occupancy."""
+    return {"originals": originals.stats(), "results": result_cache.stats()}
+
 @app.get("/crush/{content_hash}")
 async def retrieve_original(content_hash: str):
     """Retrieve original uncompressed content by hash."""
@@ -109,20 +286,50 @@ async def save_memory(req: MemoryRequest):
     try:
         from memory import custodian
         if not custodian:
-            raise HTTPException(status_code=503, detail="Supabase not configured")
-        result = custodian.save(req.content, req.category)
+            raise HTTPException(status_code=503, detail="Storage not configured")
+        result = await custodian.save(req.content, req.category)
         return MemoryResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/memory/stats")
+async def memory_stats():
+    """Write-behind buffer counters: depth, coalesced writes, flush latency."""
+    from memory import custodian
+    if not custodian:
+        raise HTTPException(status_code=503, detail="Storage not configured")
+    return {"write_behind": custodian.writes.stats() if custodian.writes else None}
+
 @app.get("/recall")
 async def recall_memories(query: str, limit: int = 5):
-    """Search past decisions/memories by keyword."""
+    """Search past decisions/memories by keyword, best match first."""
+    try:
+        from memory import custodian
+        if not custodian:
+            raise HTTPException(status_code=503, detail="Storage not configured")
+        return {"results": await custodian.recall(query, limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/recall/batch")
+async def recall_batch(req: RecallBatchRequest):
+    """Many recall queries in one request; repeats are searched once and
+    the rest run concurrently. Results are in request order."""
     try:
         from memory import custodian
         if not custodian:
-            raise HTTPException(status_code=503, detail="Supabase not configured")
-        return {"results": custodian.recall(query, limit)}
+            raise HTTPException(status_code=503, detail="Storage not configured")
+        start = time.perf_counter()
+        found = await custodian.recall_many([(q.query, q.limit) for q in req.queries])
+        return {
+            "results": [
+                {"query": q.query, "results": rows, "ms": round(seconds * 1000, 2)}
+                for q, (rows, seconds) in zip(req.queries, found)
+            ],
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -132,8 +339,8 @@ async def get_context():
     try:
         from memory import custodian
         if not custodian:
-            return {"context": "Supabase not configured — running without memory."}
-        return {"context": custodian.build_context_summary()}
+            return {"context": "Storage not configured — running without memory."}
+        return {"context": await custodian.build_context_summary()}
     except Exception as e:
         return {"context": f"Context build error: {str(e)}"}
 
@@ -142,28 +349,74 @@ async def get_context():
 # Fleet & Inbox Endpoints
 # ═══════════════════════════════════════
 
+def _etag_response(request: Request, payload: dict) -> Response:
+    """JSON response tagged with a hash of its body; 304 when the client's
+    If-None-Match already names it."""
+    body = json.dumps(payload, default=str, separators=(",", ":")).encode()
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    known = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in known or "*" in known:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
 @app.get("/fleet")
-async def get_fleet():
+async def get_fleet(request: Request):
     """Get agent fleet status."""
     try:
         from memory import custodian
         if not custodian:
-            raise HTTPException(status_code=503, detail="Supabase not configured")
-        return {"agents": custodian.get_fleet_status()}
+            raise HTTPException(status_code=503, detail="Storage not configured")
+        return _etag_response(request, {"agents": await custodian.get_fleet_status()})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/inbox")
-async def get_inbox(status: str = "NEW", limit: int = 10):
+async def get_inbox(request: Request, status: str = "NEW", limit: int = 10):
     """Get inbox items."""
     try:
         from memory import custodian
         if not custodian:
-            raise HTTPException(status_code=503, detail="Supabase not configured")
-        return {"items": custodian.get_inbox(status, limit)}
+            raise HTTPException(status_code=503, detail="Storage not configured")
+        return _etag_response(request, {"items": await custodian.get_inbox(status, limit)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/views/stats")
+async def view_stats():
+    """Hit / refresh / upsert counters for the in-memory table views."""
+    from memory import custodian
+    if not custodian:
+        raise HTTPException(status_code=503, detail="Storage not configured")
+    return {"agents": custodian.fleet_view.stats(), "inbox": custodian.inbox_view.stats()}
+
+
+@app.get("/worker/stats")
+async def worker_stats():
+    """Agent scheduler metrics: decisions per minute, queue wait, turn time."""
+    return {"scheduler": scheduler.stats(), "prompt": prompts.stats(), "context": contexts.stats(),
+            "replies": replies.stats(), "leases": leases.stats() if leases else None, "wakeups": wakeup.stats()}
+
+@app.post("/events")
+async def database_event(event: DatabaseEvent, request: Request):
+    """Receive a row change notification; drop cached copies of the table
+    and wake the worker if agents may have something new to act on.
+
+    The payload is only a signal: views refetch from storage, so a forged
+    record never reaches an agent. Disabled unless EVENTS_SECRET is set."""
+    if not EVENTS_SECRET:
+        raise HTTPException(status_code=404, detail="Events webhook disabled (EVENTS_SECRET not set)")
+    if not hmac.compare_digest(request.headers.get("x-events-secret", ""), EVENTS_SECRET):
+        raise HTTPException(status_code=401, detail="Invalid events secret")
+
+    from memory import custodian
+    if custodian:
+        custodian.apply_change(event.table, changed_columns(event.record, event.old_record))
+
+    woke = should_wake(event.table, event.type, event.record, event.old_record)
+    if woke:
+        wakeup.notify(f"{event.table}.{event.type.lower()}")
+    return {"received": True, "woke": woke}
+
 
 # ═══════════════════════════════════════
 # Health Check
@@ -171,24 +424,29 @@ async def get_inbox(status: str = "NEW", limit: int = 10):
 
 @app.get("/health")
 async def health():
-    """Service health check."""
-    db_ok = False
-    try:
-        from memory import custodian
-        if custodian:
-            custodian.get_fleet_status()
-            db_ok = True
-    except:
-        pass
-
+    """Liveness: the process is serving. Touches nothing external; the
+    database field is the background probe's last result."""
+    database = health_monitor.probes.get("database")
     return {
         "status": "online",
         "service": "agent-engine",
         "version": "0.1.0",
-        "database": "connected" if db_ok else "disconnected",
+        "database": "connected" if database and database.ok else "disconnected",
         "crusher": "ready",
     }
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once every required dependency passed its latest
+    background probe, 503 otherwise. Includes per-dependency counters."""
+    body = {"ready": health_monitor.ready, "dependencies": health_monitor.stats()}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape target."""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 if __name__ == "__main__":
     import uvicorn
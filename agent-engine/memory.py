@@ -1,104 +1,303 @@
 """
 Custodian Memory — Athena-style Persistent Decision Log
-Manages memory across sessions using Supabase as the backend.
+Manages memory across sessions in Supabase, or locally in SQLite
+(STORAGE_BACKEND; see storage.py).
 
 Features:
 - Save decisions, notes, reviews, context to persistent storage
-- Search/recall past decisions by keyword
+- Ranked recall of past decisions (BM25 index, optional vector similarity)
 - Session logging (start/end lifecycle)
 - Memory summary for context injection
-"""
+- Optional write-behind: deferred writes are batched and coalesced
+- Fleet and inbox reads served from in-memory table views
 
-import os
-from datetime import datetime, timezone
-from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY
+All methods are async and share one storage client (pooled PostgREST
+for Supabase), so concurrent requests overlap instead of blocking the
+event loop.
+"""
 
+import asyncio
+import time
+from typing import Awaitable, Callable
 
-def get_supabase() -> Client:
-    """Get Supabase client."""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY required")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+from cache import TTLCache
+from config import (
+    STORAGE_CONFIGURED, CONTEXT_CACHE_TTL, VIEW_TTL, INBOX_VIEW_SIZE,
+    RECALL_ENGINE, RECALL_SEMANTIC, RECALL_REFRESH_INTERVAL,
+    WRITE_BEHIND, WRITE_BEHIND_MAX_BATCH, WRITE_BEHIND_INTERVAL,
+)
+from prompt import ContextSnapshot, render_context
+from recall import RecallEngine
+from storage import Storage, create_storage
+from views import TableView
+from writebehind import WriteBehind
 
 
 class Custodian:
     """Persistent memory manager — the agent's long-term brain."""
 
-    def __init__(self):
-        self.db = get_supabase()
-
-    def save(self, content: str, category: str = "NOTE") -> dict:
-        """Save a memory entry."""
-        result = self.db.table("boss_memory").insert({
-            "content": content,
-            "category": category.upper(),
-        }).execute()
-        return {"saved": True, "id": result.data[0]["id"] if result.data else None}
-
-    def recall(self, query: str, limit: int = 5) -> list[dict]:
-        """Search memories by keyword."""
-        result = self.db.table("boss_memory") \
-            .select("*") \
-            .ilike("content", f"%{query}%") \
-            .order("created_at", desc=True) \
-            .limit(limit) \
-            .execute()
-        return result.data or []
-
-    def get_recent(self, limit: int = 10) -> list[dict]:
+    # Agent columns rendered in the context summary
+    SUMMARY_AGENT_FIELDS = {"name", "role", "status"}
+    # Agent columns rewritten on every turn or lease; a change to these alone
+    # leaves the fleet view to its TTL instead of refetching it
+    ROUTINE_AGENT_FIELDS = {"last_heartbeat", "current_task", "lease_owner", "lease_expires_at"}
+
+    def __init__(self, db: Storage | None = None):
+        self.db = db or create_storage()
+        if RECALL_ENGINE == "fts" and not hasattr(self.db, "search"):
+            raise ValueError("RECALL_ENGINE=fts needs the sqlite or memory storage backend")
+        # Pieces of the context summary; invalidated by the writes that change them
+        self._context_cache = TTLCache(ttl=CONTEXT_CACHE_TTL, max_entries=8)
+        # Hot tables held in memory; writes and /events changes patch them in place
+        self.fleet_view = TableView(
+            lambda: self.db.select("agents", order="name"),
+            ttl=VIEW_TTL, order="name",
+        )
+        self.inbox_view = TableView(
+            lambda: self.db.select("inbox_items", order="created_at.desc", limit=INBOX_VIEW_SIZE),
+            ttl=VIEW_TTL, order="created_at", descending=True, limit=INBOX_VIEW_SIZE,
+        )
+        self.recall_engine = RecallEngine(
+            self._memories_since,
+            semantic=RECALL_SEMANTIC,
+            refresh_interval=RECALL_REFRESH_INTERVAL,
+        ) if RECALL_ENGINE == "index" else None
+        self.writes = WriteBehind(
+            self.db,
+            max_batch=WRITE_BEHIND_MAX_BATCH,
+            interval=WRITE_BEHIND_INTERVAL,
+            on_flush=self._wrote,
+        ) if WRITE_BEHIND else None
+
+    async def save(self, content: str, category: str = "NOTE", defer: bool = False) -> dict:
+        """Save a memory entry.
+
+        With `defer`, the row is queued for a bulk insert and no id is
+        returned; it becomes visible to recall once flushed.
+        """
+        row = {"content": content, "category": category.upper()}
+        if defer and self.writes is not None:
+            await self.writes.insert("boss_memory", row)
+            return {"saved": True, "id": None}
+        rows = await self.db.insert("boss_memory", row)
+        self._wrote("boss_memory", rows, set(row))
+        return {"saved": True, "id": rows[0]["id"] if rows else None}
+
+    async def recall(self, query: str, limit: int = 5) -> list[dict]:
+        """Search memories by keyword, best match first.
+
+        With the index and fts engines each row carries a relevance
+        `score`; the ilike fallback returns plain substring matches, newest
+        first.
+        """
+        if self.recall_engine is not None:
+            return await self.recall_engine.search(query, limit)
+        if RECALL_ENGINE == "fts":
+            return await self.db.search(query, limit)
+        return await self.db.select(
+            "boss_memory",
+            filters={"content": f"ilike.*{query}*"},
+            order="created_at.desc",
+            limit=limit,
+        )
+
+    async def recall_many(self, queries: list[tuple[str, int]]) -> list[tuple[list[dict], float]]:
+        """recall() for each (query, limit), as (rows, seconds) in input order.
+
+        Repeated queries are searched once; the rest run concurrently, so the
+        ilike fallback overlaps its round-trips on the pooled client.
+        """
+        async def timed(query: str, limit: int) -> tuple[list[dict], float]:
+            start = time.perf_counter()
+            rows = await self.recall(query, limit)
+            return rows, time.perf_counter() - start
+
+        unique = list(dict.fromkeys(queries))
+        found = dict(zip(unique, await asyncio.gather(*(timed(q, limit) for q, limit in unique))))
+        return [found[key] for key in queries]
+
+    async def _memories_since(self, after: tuple[str, str] | None, limit: int) -> list[dict]:
+        """Page of memories past the (created_at, id) cursor `after`, in that
+        order (index sync). Rows sharing the cursor's timestamp are paged by
+        id first, so bulk inserts with one timestamp are never cut at a page
+        boundary."""
+        order = "created_at.asc,id.asc"
+        if after is None:
+            return await self.db.select("boss_memory", order=order, limit=limit)
+        created_at, row_id = after
+        page = await self.db.select(
+            "boss_memory",
+            filters={"created_at": f"eq.{created_at}", "id": f"gt.{row_id}"},
+            order="id.asc",
+            limit=limit,
+        )
+        if len(page) < limit:
+            page += await self.db.select(
+                "boss_memory", filters={"created_at": f"gt.{created_at}"}, order=order, limit=limit - len(page),
+            )
+        return page
+
+    async def get_recent(self, limit: int = 10) -> list[dict]:
         """Get most recent memories."""
-        result = self.db.table("boss_memory") \
-            .select("*") \
-            .order("created_at", desc=True) \
-            .limit(limit) \
-            .execute()
-        return result.data or []
-
-    def get_fleet_status(self) -> list[dict]:
+        return await self.db.select("boss_memory", order="created_at.desc", limit=limit)
+
+    async def get_fleet_status(self) -> list[dict]:
         """Get current agent fleet status."""
-        result = self.db.table("agents") \
-            .select("*") \
-            .order("name") \
-            .execute()
-        return result.data or []
-
-    def get_inbox(self, status: str = "NEW", limit: int = 10) -> list[dict]:
-        """Get inbox items."""
-        query = self.db.table("inbox_items") \
-            .select("*") \
-            .order("created_at", desc=True) \
-            .limit(limit)
-        if status:
-            query = query.eq("status", status)
-        return query.execute().data or []
-
-    def build_context_summary(self) -> str:
+        return await self.fleet_view.rows()
+
+    async def get_inbox(self, status: str = "NEW", limit: int = 10) -> list[dict]:
+        """Get inbox items, newest first."""
+        rows = await self.inbox_view.rows()
+        matches = [r for r in rows if not status or r.get("status") == status]
+        if len(matches) >= limit or not self.inbox_view.full:
+            return matches[:limit]
+        # Older matches may sit beyond the view's window
+        filters = {"status": f"eq.{status}"} if status else None
+        return await self.db.select("inbox_items", filters=filters, order="created_at.desc", limit=limit)
+
+    async def update_agent(self, name: str, values: dict, defer: bool = False) -> list[dict]:
+        """Update an agent row by name (heartbeat, current task, ...).
+
+        Deferred updates to one agent collapse into a single PATCH.
+        """
+        return await self._update("agents", values, {"name": f"eq.{name}"}, defer)
+
+    async def update_inbox_item(self, item_id: str, values: dict, defer: bool = False) -> list[dict]:
+        """Update an inbox item by id (e.g. mark it READ)."""
+        return await self._update("inbox_items", values, {"id": f"eq.{item_id}"}, defer)
+
+    async def add_inbox_item(self, item: dict, defer: bool = False) -> list[dict]:
+        """Insert a new inbox item."""
+        if defer and self.writes is not None:
+            await self.writes.insert("inbox_items", item)
+            return []
+        rows = await self.db.insert("inbox_items", item)
+        self._wrote("inbox_items", rows, set(item))
+        return rows
+
+    async def claim_agents(self, owner: str, ttl: int, limit: int) -> list[dict]:
+        """Lease up to `limit` RUNNING agents no other worker holds."""
+        rows = await self.db.rpc("claim_agents", {"p_owner": owner, "p_ttl_seconds": ttl, "p_limit": limit})
+        self.fleet_view.upsert(rows)
+        return rows
+
+    async def release_agents(self, owner: str, agent_ids: list[str]) -> None:
+        """Drop this worker's leases on the given agents."""
+        await self.db.rpc("release_agents", {"p_owner": owner, "p_ids": agent_ids})
+
+    async def claim_inbox_item(self, item_id: str, owner: str, ttl: int) -> bool:
+        """Lease a NEW inbox item; False if another worker holds it or it
+        was already handled."""
+        rows = await self.db.rpc("claim_inbox_item", {"p_id": item_id, "p_owner": owner, "p_ttl_seconds": ttl})
+        self.inbox_view.upsert(rows)
+        return bool(rows)
+
+    async def _update(self, table: str, values: dict, filters: dict[str, str], defer: bool) -> list[dict]:
+        if defer and self.writes is not None:
+            await self.writes.update(table, values, filters)
+            return []
+        rows = await self.db.update(table, values, filters)
+        self._wrote(table, rows, set(values))
+        return rows
+
+    def apply_change(self, table: str, columns: set | None = None) -> None:
+        """A row of `table` changed elsewhere (e.g. reported by the /events
+        webhook): drop what is held of it, so the next read refetches from
+        storage. Rows are never taken from the notification itself.
+
+        `columns` are the ones that changed, if known. Agent updates to
+        routine columns only (heartbeats, tasks, leases) keep the fleet view.
+        """
+        if table == "boss_memory":
+            self._context_cache.invalidate("recent")
+            if self.recall_engine is not None:
+                self.recall_engine.expire()
+        elif table == "inbox_items":
+            self.inbox_view.invalidate()
+            self._context_cache.invalidate("inbox")
+        elif table == "agents":
+            if columns and columns <= self.ROUTINE_AGENT_FIELDS:
+                return
+            self.fleet_view.invalidate()
+            self._context_cache.invalidate("fleet")
+
+    def _wrote(self, table: str, rows: list[dict], columns: set) -> None:
+        """Keep table views, the context cache and the recall index in step
+        with a write once it has landed (immediately, or when the
+        write-behind flushes)."""
+        if table == "boss_memory":
+            self._context_cache.invalidate("recent")
+            if self.recall_engine is not None:
+                for row in rows:
+                    self.recall_engine.add(row)
+        elif table == "inbox_items":
+            self.inbox_view.upsert(rows)
+            self._context_cache.invalidate("inbox")
+        elif table == "agents":
+            self.fleet_view.upsert(rows)
+            if self.SUMMARY_AGENT_FIELDS & columns:
+                self._context_cache.invalidate("fleet")
+
+    async def context_snapshot(
+        self,
+        fleet: list[dict] | None = None,
+        inbox: list[dict] | None = None,
+    ) -> ContextSnapshot:
+        """Fleet, recent memories and NEW inbox items behind the context.
+
+        Pass `fleet` / `inbox` when the caller already fetched them (NEW
+        items, default limit); anything missing is fetched concurrently or
+        served from the short-TTL cache.
+        """
+        return ContextSnapshot(*await asyncio.gather(
+            self._context_piece("fleet", self.get_fleet_status, fleet),
+            self._context_piece("recent", lambda: self.get_recent(5)),
+            self._context_piece("inbox", self.get_inbox, inbox),
+        ))
+
+    async def build_context_summary(
+        self,
+        fleet: list[dict] | None = None,
+        inbox: list[dict] | None = None,
+    ) -> str:
         """Build a compressed context summary for AI prompts."""
-        lines = []
+        return render_context(await self.context_snapshot(fleet, inbox))
 
-        # Fleet
-        fleet = self.get_fleet_status()
-        if fleet:
-            running = sum(1 for a in fleet if a.get("status") == "RUNNING")
-            lines.append(f"Fleet: {running}/{len(fleet)} active")
-            for a in fleet:
-                icon = "🟢" if a["status"] == "RUNNING" else "⚪"
-                lines.append(f"  {icon} {a['name']} ({a.get('role', 'N/A')}) — {a['status']}")
+    async def _context_piece(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[list[dict]]],
+        provided: list[dict] | None = None,
+    ) -> list[dict]:
+        if provided is not None:
+            self._context_cache.set(key, provided)
+            return provided
+        value = self._context_cache.get(key)
+        if value is None:
+            value = await fetch()
+            self._context_cache.set(key, value)
+        return value
 
-        # Recent memories
-        memories = self.get_recent(5)
-        if memories:
-            lines.append("\nRecent Memory:")
-            for m in memories:
-                lines.append(f"  [{m.get('category', 'NOTE')}] {m['content'][:80]}")
+    async def ping(self) -> None:
+        """Cheapest round-trip that proves the database answers."""
+        await self.db.select("agents", columns="id", limit=1)
 
-        # Inbox count
-        inbox = self.get_inbox()
-        lines.append(f"\nInbox: {len(inbox)} unread items")
+    async def flush(self) -> None:
+        """Write out deferred writes now."""
+        if self.writes is not None:
+            await self.writes.flush()
 
-        return "\n".join(lines)
+    async def aclose(self) -> None:
+        """Flush deferred writes, then release pooled connections."""
+        if self.writes is not None:
+            await self.writes.close()
+        await self.db.aclose()
 
 
-# Singleton
-custodian = Custodian() if SUPABASE_URL and SUPABASE_KEY else None
+def __getattr__(name: str):
+    """Singleton, built on first `from memory import custodian` rather than
+    at import: startup and storage-free routes never open a client."""
+    if name == "custodian":
+        globals()["custodian"] = Custodian() if STORAGE_CONFIGURED else None
+        return globals()["custodian"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
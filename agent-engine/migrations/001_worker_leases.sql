@@ -0,0 +1,62 @@
+-- Worker leases: lets several agent-engine workers (replicas, uvicorn
+-- --workers, standalone `python worker.py`) share one fleet without turning
+-- the same agent or answering the same inbox item twice.
+-- Enable with WORKER_LEASES=1 once applied.
+
+alter table agents add column if not exists lease_owner text;
+alter table agents add column if not exists lease_expires_at timestamptz;
+alter table inbox_items add column if not exists lease_owner text;
+alter table inbox_items add column if not exists lease_expires_at timestamptz;
+
+create index if not exists agents_lease_idx on agents (status, lease_expires_at);
+
+-- Lease up to p_limit RUNNING agents that nobody else holds, least recently
+-- leased first (release stamps the expiry with now(), so it doubles as
+-- "last turned"). SKIP LOCKED lets concurrent callers take disjoint batches
+-- instead of queueing on the same rows.
+create or replace function claim_agents(p_owner text, p_ttl_seconds integer, p_limit integer)
+returns setof agents
+language sql
+as $$
+    update agents a
+    set lease_owner = p_owner,
+        lease_expires_at = now() + make_interval(secs => p_ttl_seconds)
+    where a.id in (
+        select id from agents
+        where status = 'RUNNING'
+          and (lease_expires_at is null or lease_expires_at <= now() or lease_owner = p_owner)
+        order by lease_expires_at asc nulls first
+        limit p_limit
+        for update skip locked
+    )
+    returning a.*;
+$$;
+
+-- Hand agents back after their turns; any worker may claim them next cycle.
+create or replace function release_agents(p_owner text, p_ids uuid[])
+returns void
+language sql
+as $$
+    update agents
+    set lease_owner = null, lease_expires_at = now()
+    where id = any(p_ids) and lease_owner = p_owner;
+$$;
+
+-- Lease one NEW inbox item; returns no row if another worker holds it or it
+-- was already handled.
+create or replace function claim_inbox_item(p_id uuid, p_owner text, p_ttl_seconds integer)
+returns setof inbox_items
+language sql
+as $$
+    update inbox_items i
+    set lease_owner = p_owner,
+        lease_expires_at = now() + make_interval(secs => p_ttl_seconds)
+    where i.id in (
+        select id from inbox_items
+        where id = p_id
+          and status = 'NEW'
+          and (lease_expires_at is null or lease_expires_at <= now() or lease_owner = p_owner)
+        for update skip locked
+    )
+    returning i.*;
+$$;
@@ -0,0 +1,175 @@
+"""
+Originals Store — Bounded retrieval tier behind SmartCrusher.retrieve
+
+Every crush keeps its uncompressed input so agents can fetch the full
+content by hash. This store bounds that memory:
+- LRU eviction by entry count and by stored bytes
+- Optional zlib / zstd compression of stored bodies
+- Optional SQLite spill tier that catches evicted entries
+- Hit / miss / eviction counters for /crush/stats
+"""
+
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+from config import (
+    ORIGINALS_MAX_ENTRIES,
+    ORIGINALS_MAX_BYTES,
+    ORIGINALS_COMPRESSION,
+    ORIGINALS_SPILL_PATH,
+    ORIGINALS_SPILL_MAX_ENTRIES,
+)
+
+
+class OriginalsStore:
+    """Thread-safe LRU of original payloads with an optional on-disk tier."""
+
+    CODECS = ("none", "zlib", "zstd")
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        compression: str = "zlib",
+        spill_path: str = "",
+        spill_max_entries: int = 100_000,
+    ):
+        if compression not in self.CODECS:
+            raise ValueError(f"compression must be one of {self.CODECS}, got {compression!r}")
+        if compression == "zstd" and zstandard is None:
+            compression = "zlib"  # zstandard not installed
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.spill_max_entries = spill_max_entries
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[str, bytes]] = OrderedDict()  # key -> (codec, body)
+        self._bytes = 0
+        self._counters = {
+            "hits": 0,
+            "spill_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "spills": 0,
+            "spill_evictions": 0,
+        }
+
+        self._spill: sqlite3.Connection | None = None
+        if spill_path:
+            self._spill = sqlite3.connect(spill_path, check_same_thread=False, isolation_level=None)
+            self._spill.execute("PRAGMA journal_mode=WAL")
+            self._spill.execute("PRAGMA synchronous=NORMAL")
+            self._spill.execute(
+                "CREATE TABLE IF NOT EXISTS originals ("
+                " key TEXT PRIMARY KEY, codec TEXT NOT NULL, body BLOB NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._spill.execute("CREATE INDEX IF NOT EXISTS originals_stored_at ON originals (stored_at)")
+
+    def put(self, key: str, text: str) -> None:
+        """Store `text` under `key`, evicting least-recently-used entries."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            codec, body = self._encode(text)
+            self._entries[key] = (codec, body)
+            self._bytes += len(body)
+            self._evict()
+
+    def get(self, key: str) -> str | None:
+        """Return the original for `key`, checking memory then the spill tier."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return self._decode(*entry)
+
+            if self._spill is not None:
+                row = self._spill.execute("SELECT codec, body FROM originals WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._counters["spill_hits"] += 1
+                    codec, body = row[0], bytes(row[1])
+                    # Promote back into memory
+                    self._spill.execute("DELETE FROM originals WHERE key = ?", (key,))
+                    self._entries[key] = (codec, body)
+                    self._bytes += len(body)
+                    self._evict()
+                    return self._decode(codec, body)
+
+            self._counters["misses"] += 1
+            return None
+
+    def stats(self) -> dict:
+        """Counters plus current occupancy of each tier."""
+        with self._lock:
+            spilled = 0
+            if self._spill is not None:
+                spilled = self._spill.execute("SELECT COUNT(*) FROM originals").fetchone()[0]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "spilled_entries": spilled,
+                "compression": self.compression,
+            }
+
+    def _evict(self) -> None:
+        """Drop LRU entries until within bounds; caller holds the lock."""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key, (codec, body) = self._entries.popitem(last=False)
+            self._bytes -= len(body)
+            self._counters["evictions"] += 1
+            if self._spill is not None:
+                self._spill_write(key, codec, body)
+
+    def _spill_write(self, key: str, codec: str, body: bytes) -> None:
+        self._spill.execute(
+            "INSERT OR REPLACE INTO originals (key, codec, body, stored_at) VALUES (?, ?, ?, ?)",
+            (key, codec, body, time.time()),
+        )
+        self._counters["spills"] += 1
+        # Trim the oldest rows in batches so the table stays bounded
+        if self._counters["spills"] % 256 == 0:
+            cur = self._spill.execute(
+                "DELETE FROM originals WHERE key IN ("
+                " SELECT key FROM originals ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.spill_max_entries,),
+            )
+            self._counters["spill_evictions"] += max(cur.rowcount, 0)
+
+    def _encode(self, text: str) -> tuple[str, bytes]:
+        raw = text.encode()
+        if self.compression == "zlib":
+            return "zlib", zlib.compress(raw, 1)
+        if self.compression == "zstd":
+            return "zstd", zstandard.ZstdCompressor(level=3).compress(raw)
+        return "none", raw
+
+    @staticmethod
+    def _decode(codec: str, body: bytes) -> str:
+        if codec == "zlib":
+            body = zlib.decompress(body)
+        elif codec == "zstd":
+            body = zstandard.ZstdDecompressor().decompress(body)
+        return body.decode()
+
+
+# Singleton — shared by every SmartCrusher so /crush/{hash} finds results
+originals = OriginalsStore(
+    max_entries=ORIGINALS_MAX_ENTRIES,
+    max_bytes=ORIGINALS_MAX_BYTES,
+    compression=ORIGINALS_COMPRESSION,
+    spill_path=ORIGINALS_SPILL_PATH,
+    spill_max_entries=ORIGINALS_SPILL_MAX_ENTRIES,
+)
@@ -0,0 +1,294 @@
+"""
+Prompt Assembly — Budgeted, crushed context for agent turns
+
+- Each dynamic prompt section goes through SmartCrusher with its own
+  token budget (PROMPT_BUDGET_*)
+- Inbox items render as compact lines; identical bodies collapse into
+  one entry, and bodies an agent was already shown in an earlier cycle
+  are elided to their title
+- Token counts before/after are tracked per turn and in aggregate
+- Delta context: per agent, fingerprints of what the last prompt showed,
+  so later turns carry only changed agents, new memories and new inbox
+  items, with a full refresh every CONTEXT_FULL_REFRESH turns
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import NamedTuple
+
+from crusher import CacheAligner, SmartCrusher, content_hash, estimate_tokens
+
+# Inbox ids must survive alignment: agents quote them back as target_id
+PROMPT_ALIGNER = CacheAligner([r for r in CacheAligner.DEFAULT_RULES if r.replacement != '[UUID]'])
+
+
+class PromptSection(NamedTuple):
+    title: str
+    text: str
+    budget: int | None  # tokens; None = include verbatim
+
+
+class ContextSnapshot(NamedTuple):
+    """Raw pieces behind one cycle's context."""
+    fleet: list[dict]
+    memories: list[dict]  # most recent first
+    inbox: list[dict]  # NEW items
+
+
+def render_context(snapshot: ContextSnapshot) -> str:
+    """Full context summary: fleet, recent memories, unread count."""
+    lines = []
+
+    # Fleet
+    if snapshot.fleet:
+        lines.append(_fleet_header(snapshot.fleet))
+        lines.extend(_agent_line(a) for a in snapshot.fleet)
+
+    # Recent memories
+    if snapshot.memories:
+        lines.append("\nRecent Memory:")
+        lines.extend(_memory_line(m) for m in snapshot.memories)
+
+    # Inbox count
+    lines.append(f"\nInbox: {len(snapshot.inbox)} unread items")
+
+    return "\n".join(lines)
+
+
+def _fleet_header(fleet: list[dict]) -> str:
+    running = sum(1 for a in fleet if a.get("status") == "RUNNING")
+    return f"Fleet: {running}/{len(fleet)} active"
+
+
+def _agent_line(agent: dict) -> str:
+    icon = "🟢" if agent["status"] == "RUNNING" else "⚪"
+    return f"  {icon} {agent['name']} ({agent.get('role', 'N/A')}) — {agent['status']}"
+
+
+def _memory_line(memory: dict) -> str:
+    return f"  [{memory.get('category', 'NOTE')}] {memory['content'][:80]}"
+
+
+def _inbox_groups(items: list[dict]) -> dict[bytes, list[dict]]:
+    """Inbox items grouped by aligned body, in first-seen order."""
+    groups: dict[bytes, list[dict]] = {}
+    for item in items:
+        body = PROMPT_ALIGNER.align(str(item.get("body", "")))
+        groups.setdefault(hashlib.blake2b(body.encode(), digest_size=8).digest(), []).append(item)
+    return groups
+
+
+def _inbox_line(group: list[dict], body: bool = True) -> str:
+    first = group[0]
+    line = (f"- id={first.get('id')} | {first.get('priority', '')} {first.get('type', '')}"
+            f" from {first.get('source', '')} | {first.get('title', '')}")
+    if body:
+        line += f": {first.get('body', '')}"
+    return line
+
+
+def _identical_suffix(group: list[dict]) -> str:
+    if len(group) < 2:
+        return ""
+    return f" (+{len(group) - 1} identical: {', '.join(str(i.get('id')) for i in group[1:])})"
+
+
+class AgentView(NamedTuple):
+    """Fingerprints of what one agent's last prompt showed."""
+    fleet: dict[str, str]  # agent name -> fingerprint of its summary line
+    memories: frozenset[str]
+    inbox: frozenset[str]  # id + body fingerprints
+    turns: int  # delta turns since the last full refresh
+
+
+class ContextTracker:
+    """Remembers, per agent, what its previous prompt already contained
+    and renders only what changed since: agents whose summary changed,
+    memories and inbox items it has not been shown. Still-open inbox items
+    it has seen shrink to id and title so it can keep replying to them.
+
+    Every `full_refresh` turns (and on an agent's first turn) the full
+    context is sent instead, so state the model never saw in full cannot
+    drift. The caller passes the returned view to `remember()` once the
+    turn succeeded; a failed turn leaves the previous view in place.
+    """
+
+    def __init__(self, full_refresh: int = 10, max_agents: int = 1024):
+        self.full_refresh = max(full_refresh, 1)
+        self.max_agents = max_agents
+        self._views: OrderedDict[str, AgentView] = OrderedDict()
+        self.full_turns = 0
+        self.delta_turns = 0
+        self.chars_full = 0  # what full renders of the same turns would have cost
+        self.chars_sent = 0
+
+    def render(self, agent: str, snapshot: ContextSnapshot) -> tuple[str, str, AgentView]:
+        """Returns (context text, inbox text, view to remember)."""
+        fleet = {a["name"]: self._agent_key(a) for a in snapshot.fleet}
+        memories = {self._memory_key(m): m for m in snapshot.memories}
+        inbox = {self._inbox_key(i): i for i in snapshot.inbox}
+        full_context, full_inbox = render_context(snapshot), self._inbox_text(snapshot.inbox, frozenset())
+
+        previous = self._views.get(agent)
+        if previous is None or previous.turns + 1 >= self.full_refresh:
+            context, inbox_text, turns = full_context, full_inbox, 0
+            self.full_turns += 1
+        else:
+            context = self._delta_context(previous, snapshot, fleet, memories)
+            inbox_text = self._inbox_text(snapshot.inbox, previous.inbox)
+            turns = previous.turns + 1
+            self.delta_turns += 1
+        self.chars_full += len(full_context) + len(full_inbox)
+        self.chars_sent += len(context) + len(inbox_text)
+        return context, inbox_text, AgentView(fleet, frozenset(memories), frozenset(inbox), turns)
+
+    def remember(self, agent: str, view: AgentView) -> None:
+        self._views[agent] = view
+        self._views.move_to_end(agent)
+        if len(self._views) > self.max_agents:
+            self._views.popitem(last=False)
+
+    def reset(self, agent: str | None = None) -> None:
+        """Force a full context on the next turn (one agent, or all)."""
+        if agent is None:
+            self._views.clear()
+        else:
+            self._views.pop(agent, None)
+
+    def _delta_context(
+        self,
+        previous: AgentView,
+        snapshot: ContextSnapshot,
+        fleet: dict[str, str],
+        memories: dict[str, dict],
+    ) -> str:
+        lines = []
+
+        changed = [a for a in snapshot.fleet if previous.fleet.get(a["name"]) != fleet[a["name"]]]
+        removed = [name for name in previous.fleet if name not in fleet]
+        if changed or removed:
+            lines.append(f"{_fleet_header(snapshot.fleet)} — changes since your last turn:")
+            lines.extend(_agent_line(a) for a in changed)
+            lines.extend(f"  ✖ {name} — removed" for name in removed)
+        elif snapshot.fleet:
+            lines.append(f"{_fleet_header(snapshot.fleet)} — unchanged since your last turn")
+
+        new = [m for key, m in memories.items() if key not in previous.memories]
+        if new:
+            lines.append("\nNew Memory:")
+            lines.extend(_memory_line(m) for m in new)
+        else:
+            lines.append("\nNo new memory since your last turn")
+
+        fresh = sum(1 for i in snapshot.inbox if self._inbox_key(i) not in previous.inbox)
+        lines.append(f"\nInbox: {len(snapshot.inbox)} unread items ({fresh} new)")
+
+        return "\n".join(lines)
+
+    def _inbox_text(self, items: list[dict], seen: frozenset[str]) -> str:
+        lines, earlier = [], []
+        for group in _inbox_groups(items).values():
+            if all(self._inbox_key(i) in seen for i in group):
+                earlier.extend(group)
+            else:
+                lines.append(_inbox_line(group) + _identical_suffix(group))
+        if earlier:
+            lines.append("- Still open from earlier turns: "
+                         + ", ".join(f"id={i.get('id')} ({i.get('title', '')})" for i in earlier))
+        return "\n".join(lines) if lines else "(empty)"
+
+    @staticmethod
+    def _agent_key(agent: dict) -> str:
+        return content_hash(_agent_line(agent))
+
+    @staticmethod
+    def _memory_key(memory: dict) -> str:
+        if memory.get("id") is not None:
+            return str(memory["id"])
+        return content_hash(f"{memory.get('category')}\0{memory.get('content')}")
+
+    @staticmethod
+    def _inbox_key(item: dict) -> str:
+        return f"{item.get('id')}:{content_hash(str(item.get('body', '')))}"
+
+    def stats(self) -> dict:
+        return {
+            "agents": len(self._views),
+            "full_turns": self.full_turns,
+            "delta_turns": self.delta_turns,
+            "chars_full": self.chars_full,
+            "chars_sent": self.chars_sent,
+            "savings_pct": round(100 * (1 - self.chars_sent / self.chars_full), 1) if self.chars_full else 0.0,
+        }
+
+
+class PromptAssembler:
+    """Builds the per-turn prompt from crushed sections."""
+
+    SEEN_PER_AGENT = 512  # inbox fingerprints remembered per agent
+
+    def __init__(self):
+        self._crushers: dict[int, SmartCrusher] = {}
+        self._seen: dict[str, OrderedDict[bytes, None]] = {}
+        self.turns = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def assemble(self, sections: list[PromptSection]) -> tuple[str, int, int]:
+        """Returns (prompt, tokens before crushing, tokens after)."""
+        parts = []
+        before = after = 0
+        for section in sections:
+            text = section.text
+            before += estimate_tokens(text)
+            if section.budget and text:
+                text = self._crusher(section.budget).crush(text, retain=False).content
+            after += estimate_tokens(text)
+            parts.append(f"{section.title}:\n{text}")
+        self.turns += 1
+        self.tokens_before += before
+        self.tokens_after += after
+        return "\n\n".join(parts) + "\n", before, after
+
+    def inbox_text(self, agent: str, items: list[dict]) -> tuple[str, list[bytes]]:
+        """One line per distinct inbox body; repeats are folded and bodies
+        this agent has already seen are reduced to their title.
+
+        Returns (text, fingerprints of every body in it). The caller passes
+        the fingerprints to `remember()` once the turn succeeded, so a body
+        of a failed turn is shown in full again next time.
+        """
+        seen = self._seen.get(agent, {})
+        lines, fingerprints = [], []
+        for fingerprint, group in _inbox_groups(items).items():
+            if fingerprint in seen:
+                line = _inbox_line(group, body=False) + " (body seen in an earlier cycle)"
+            else:
+                line = _inbox_line(group)
+            fingerprints.append(fingerprint)
+            lines.append(line + _identical_suffix(group))
+        return ("\n".join(lines) if lines else "(empty)"), fingerprints
+
+    def remember(self, agent: str, fingerprints: list[bytes]) -> None:
+        """The model saw these inbox bodies; later prompts show only their
+        titles. Refreshes the recency of bodies seen before."""
+        seen = self._seen.setdefault(agent, OrderedDict())
+        for fingerprint in fingerprints:
+            seen[fingerprint] = None
+            seen.move_to_end(fingerprint)
+        while len(seen) > self.SEEN_PER_AGENT:
+            seen.popitem(last=False)
+
+    def _crusher(self, budget: int) -> SmartCrusher:
+        crusher = self._crushers.get(budget)
+        if crusher is None:
+            crusher = self._crushers[budget] = SmartCrusher(max_tokens=budget, aligner=PROMPT_ALIGNER)
+        return crusher
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "savings_pct": round(100 * (1 - self.tokens_after / self.tokens_before), 1) if self.tokens_before else 0.0,
+        }
@@ -0,0 +1,259 @@
+"""
+Recall Engine — Ranked memory search without ILIKE table scans
+
+- BM25 inverted index over boss_memory, maintained incrementally on save
+- Prefix expansion so "deploy" still finds "deployment" (as ILIKE did)
+- Optional semantic similarity via a local vector index (needs numpy)
+- Periodic catch-up on rows written by other replicas
+"""
+
+import asyncio
+import hashlib
+import heapq
+import importlib.util
+import math
+import re
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+# numpy (optional) is imported on first vector use, not at module import
+if TYPE_CHECKING:
+    import numpy as np
+
+_TOKENS = re.compile(r'[a-z0-9]{2,}')
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKENS.findall(text.lower())
+
+
+class InvertedIndex:
+    """BM25-ranked inverted index over short documents."""
+
+    K1 = 1.2
+    B = 0.75
+    MAX_EXPANSIONS = 16  # Vocabulary terms a query prefix may expand to
+    PREFIX_WEIGHT = 0.5  # Relative weight of prefix matches vs. exact terms
+    COMMON_FRACTION = 0.05  # Once `limit` docs matched, terms in more docs than this only rescore them
+
+    def __init__(self):
+        self.postings: dict[str, dict[int, int]] = {}  # term -> {doc: term frequency}
+        self.lengths: list[int] = []
+        self._total_length = 0
+        self._vocabulary: list[str] = []
+        self._vocabulary_dirty = False
+        # Per-doc BM25 length normalisation, K1 * (1 - B + B * len / avg_len).
+        # The average drifts slowly, so it is frozen until the corpus grows 10%.
+        self._norms: list[float] = []
+        self._norm_avg = 0.0
+        self._norm_docs = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, text: str) -> int:
+        """Index `text`; returns its document number."""
+        doc = len(self.lengths)
+        tokens = tokenize(text)
+        self.lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        if self._norm_docs:
+            self._norms.append(self._norm(len(tokens)))
+        for term, tf in Counter(tokens).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                self._vocabulary_dirty = True
+            posting[doc] = tf
+        return doc
+
+    def search(self, query: str, limit: int) -> list[tuple[float, int]]:
+        """Top `limit` (score, doc) pairs, best first; ties favour newer docs."""
+        n = len(self.lengths)
+        if not n:
+            return []
+        if n > self._norm_docs * 1.1:
+            self._norm_avg = self._total_length / n or 1.0
+            self._norm_docs = n
+            self._norms = [self._norm(length) for length in self.lengths]
+
+        norms = self._norms
+        k1 = self.K1 + 1
+        scores: dict[int, float] = {}
+        get = scores.get
+        # Rarest terms first, so common ones can skip docs nothing rarer matched
+        terms = sorted(self._expand(tokenize(query)), key=lambda item: len(self.postings[item[0]]))
+        for term, weight in terms:
+            posting = self.postings[term]
+            scale = weight * k1 * math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            if len(scores) >= limit and len(posting) > n * self.COMMON_FRACTION:
+                for doc in scores:
+                    tf = posting.get(doc)
+                    if tf:
+                        scores[doc] += scale * tf / (tf + norms[doc])
+                continue
+            for doc, tf in posting.items():
+                scores[doc] = get(doc, 0.0) + scale * tf / (tf + norms[doc])
+        return heapq.nlargest(limit, ((score, doc) for doc, score in scores.items()))
+
+    def _norm(self, length: int) -> float:
+        return self.K1 * (1 - self.B + self.B * length / self._norm_avg)
+
+    def _expand(self, terms: list[str]) -> list[tuple[str, float]]:
+        """Map query terms to indexed terms: exact hits plus prefix matches."""
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self.postings)
+            self._vocabulary_dirty = False
+
+        expanded: dict[str, float] = {}
+        for term in terms:
+            if term in self.postings:
+                expanded[term] = 1.0
+            start = bisect_left(self._vocabulary, term)
+            for candidate in self._vocabulary[start:start + self.MAX_EXPANSIONS + 1]:
+                if not candidate.startswith(term):
+                    break
+                expanded.setdefault(candidate, self.PREFIX_WEIGHT)
+        return list(expanded.items())
+
+
+class HashingEmbedder:
+    """Local embedding: hashed word and character-trigram features.
+
+    No model download or network call; similarity is lexical-fuzzy rather
+    than truly semantic. Swap in a real embedder via RecallEngine(embed=...).
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, text: str) -> "np.ndarray":
+        import numpy as np
+        vector = np.zeros(self.dim, dtype=np.float32)
+        lowered = f" {text.lower()} "
+        features = tokenize(text) + [lowered[i:i + 3] for i in range(len(lowered) - 2)]
+        for feature in features:
+            h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "little")
+            vector[h % self.dim] += 1.0 if h >> 31 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """Brute-force cosine index; rows are appended and stacked lazily."""
+
+    def __init__(self, embed: Callable[[str], "np.ndarray"]):
+        self.embed = embed
+        self._pending: list["np.ndarray"] = []
+        self._matrix: "np.ndarray | None" = None
+
+    def add(self, text: str) -> None:
+        self._pending.append(self.embed(text))
+
+    def search(self, query: str, limit: int) -> list[tuple[float, int]]:
+        import numpy as np
+        if self._pending:
+            stacked = np.vstack(self._pending)
+            self._matrix = stacked if self._matrix is None else np.vstack([self._matrix, stacked])
+            self._pending = []
+        if self._matrix is None:
+            return []
+        similarities = self._matrix @ self.embed(query)
+        limit = min(limit, len(similarities))
+        top = np.argpartition(-similarities, limit - 1)[:limit]
+        return sorted(((float(similarities[i]), int(i)) for i in top), reverse=True)
+
+
+class RecallEngine:
+    """Ranked recall over memory rows, kept in sync with the database.
+
+    `fetch_since(after, limit)` pages rows past the keyset cursor `after`
+    ((created_at, id), or None for the start) in ascending (created_at, id)
+    order; it loads the index on first use and then catches up on writes
+    from other replicas every `refresh_interval`. The cursor only moves
+    over rows sync() fetched: rows added locally are indexed straight
+    away, but other processes' rows from before them are still to come.
+    """
+
+    PAGE_SIZE = 1000
+    SEMANTIC_WEIGHT = 0.5  # Cosine similarity vs. normalized BM25
+
+    def __init__(
+        self,
+        fetch_since: Callable[[tuple[str, str] | None, int], Awaitable[list[dict]]],
+        semantic: bool = False,
+        refresh_interval: float = 30.0,
+        embed: Callable[[str], "np.ndarray"] | None = None,
+    ):
+        if semantic and importlib.util.find_spec("numpy") is None:
+            semantic = False  # numpy not installed
+        self.fetch_since = fetch_since
+        self.refresh_interval = refresh_interval
+        self.index = InvertedIndex()
+        self.vectors = VectorIndex(embed or HashingEmbedder()) if semantic else None
+        self.rows: list[dict] = []
+        self._ids: set = set()
+        self._cursor: tuple[str, str] | None = None  # (created_at, id) of the last synced row
+        self._last_refresh: float | None = None
+        self._lock = asyncio.Lock()
+
+    def add(self, row: dict) -> None:
+        """Index a freshly saved row. Before the first sync it is left for
+        the initial load, which must not start after it."""
+        if self._last_refresh is not None:
+            self._index(row)
+
+    def _index(self, row: dict) -> None:
+        if row.get("id") in self._ids:
+            return
+        self._ids.add(row.get("id"))
+        self.rows.append(row)
+        self.index.add(f"{row.get('category', '')} {row.get('content', '')}")
+        if self.vectors is not None:
+            self.vectors.add(row.get("content", ""))
+
+    async def sync(self, force: bool = False) -> None:
+        """Pull rows created since the last sync."""
+        if not force and not self._stale():
+            return
+        async with self._lock:
+            if not force and not self._stale():
+                return  # A concurrent search synced while we waited
+            while True:
+                page = await self.fetch_since(self._cursor, self.PAGE_SIZE)
+                for row in page:
+                    self._index(row)
+                if page:
+                    self._cursor = (page[-1]["created_at"], page[-1]["id"])
+                if len(page) < self.PAGE_SIZE:
+                    break
+            self._last_refresh = time.monotonic()
+
+    def expire(self) -> None:
+        """Catch up on the next search rather than after `refresh_interval`."""
+        if self._last_refresh is not None:
+            self._last_refresh = -math.inf
+
+    def _stale(self) -> bool:
+        return self._last_refresh is None or time.monotonic() - self._last_refresh >= self.refresh_interval
+
+    async def search(self, query: str, limit: int = 5) -> list[dict]:
+        """Best matches first, each row carrying a `score`."""
+        await self.sync()
+        candidates = limit * 5 if self.vectors is not None else limit
+        lexical = self.index.search(query, candidates)
+
+        combined: dict[int, float] = {}
+        if lexical:
+            top = lexical[0][0] or 1.0
+            for score, doc in lexical:
+                combined[doc] = score / top
+        if self.vectors is not None:
+            for similarity, doc in self.vectors.search(query, candidates):
+                if similarity > 0:
+                    combined[doc] = combined.get(doc, 0.0) + self.SEMANTIC_WEIGHT * similarity
+
+        ranked = heapq.nlargest(limit, ((score, doc) for doc, score in combined.items()))
+        return [{**self.rows[doc], "score": round(score, 4)} for score, doc in ranked]
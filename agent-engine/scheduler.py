@@ -0,0 +1,204 @@
+"""
+Agent Scheduler — Concurrent, rate-limited agent turns
+
+- Runs every due agent's turn each cycle, at most AGENT_CONCURRENCY at once
+- Token bucket keeps LLM calls within the Gemini quota (LLM_RATE_PER_MIN)
+- Priority: agents with matching inbox items first, then least recently run
+- Each NEW inbox item is answered by at most one agent of this process
+- Metrics: decisions per minute, queue wait and turn duration
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Iterable
+
+logger = logging.getLogger("scheduler")
+
+
+class TokenBucket:
+    """Async token bucket; waiters are served in arrival order."""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60  # tokens per second
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SchedulerMetrics:
+    """Rolling counters for scheduled turns."""
+
+    WINDOW = 60.0  # seconds, for decisions per minute
+    SAMPLES = 256  # recent waits/durations kept for averages
+
+    def __init__(self):
+        self.decisions = 0
+        self.failures = 0
+        self.in_flight = 0
+        self._completed: deque[float] = deque()
+        self._waits: deque[float] = deque(maxlen=self.SAMPLES)
+        self._durations: deque[float] = deque(maxlen=self.SAMPLES)
+
+    def started(self, wait: float) -> None:
+        self.in_flight += 1
+        self._waits.append(wait)
+
+    def finished(self, duration: float, ok: bool) -> None:
+        self.in_flight -= 1
+        self._durations.append(duration)
+        if ok:
+            self.decisions += 1
+            self._completed.append(time.monotonic())
+        else:
+            self.failures += 1
+
+    def decisions_per_minute(self) -> float:
+        cutoff = time.monotonic() - self.WINDOW
+        while self._completed and self._completed[0] < cutoff:
+            self._completed.popleft()
+        return len(self._completed) * 60 / self.WINDOW
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "decisions": self.decisions,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "decisions_per_minute": round(self.decisions_per_minute(), 2),
+            "queue_wait_ms_avg": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+            "queue_wait_ms_p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+            "turn_ms_avg": round(1000 * sum(self._durations) / len(self._durations), 1) if self._durations else 0.0,
+        }
+
+
+class ReplyClaims:
+    """Inbox items an agent of this process has answered.
+
+    Turns in a cycle share one snapshot, so several agents may pick the
+    same NEW item. The first REPLY claims it; later ones are dropped and
+    later prompts leave it out. A claim lasts until the item leaves the
+    NEW inbox, since its READ mark may still sit in the write-behind
+    buffer when the next cycle starts.
+    """
+
+    def __init__(self):
+        self._ids: set[str] = set()
+        self.claimed = 0
+        self.dropped = 0
+
+    def open(self, inbox: list[dict]) -> list[dict]:
+        """Start a cycle: forget items no longer NEW, hide claimed ones."""
+        self._ids &= {item.get("id") for item in inbox}
+        return self.visible(inbox)
+
+    def visible(self, inbox: list[dict]) -> list[dict]:
+        return [item for item in inbox if item.get("id") not in self._ids]
+
+    def claim(self, item_id: str) -> bool:
+        """True if nobody here has answered the item yet."""
+        if item_id in self._ids:
+            self.dropped += 1
+            return False
+        self._ids.add(item_id)
+        self.claimed += 1
+        return True
+
+    def stats(self) -> dict:
+        return {"held": len(self._ids), "claimed": self.claimed, "dropped": self.dropped}
+
+
+class AgentScheduler:
+    """Runs agent turns concurrently under a concurrency cap and rate limit."""
+
+    def __init__(self, concurrency: int = 4, rate_per_minute: float = 15, burst: int = 5):
+        self.concurrency = max(concurrency, 1)
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.metrics = SchedulerMetrics()
+        self._last_turn: dict[str, float] = {}  # agent name -> monotonic time of last turn
+
+    @staticmethod
+    def inbox_matches(agent: dict, inbox: Iterable[dict]) -> int:
+        """Inbox items addressed to or mentioning the agent, by name or role."""
+        name = agent["name"].lower()
+        keys = {name, name.removeprefix("the ")}
+        if agent.get("role"):
+            keys.add(agent["role"].lower())
+        count = 0
+        for item in inbox:
+            text = f"{item.get('title', '')} {item.get('body', '')} {item.get('target', '')}".lower()
+            if any(key in text for key in keys):
+                count += 1
+        return count
+
+    def prioritize(self, agents: list[dict], inbox: list[dict]) -> list[dict]:
+        """Agents with the most matching inbox items first; ties go to
+        whoever has waited longest since their last turn."""
+        return sorted(agents, key=lambda a: (-self.inbox_matches(a, inbox), self._last_turn.get(a["name"], 0.0)))
+
+    async def run_cycle(
+        self,
+        agents: list[dict],
+        turn: Callable[[dict], Awaitable[object]],
+        inbox: list[dict] | None = None,
+        refill: Callable[[], Awaitable[list[dict]]] | None = None,
+    ) -> None:
+        """Give each agent one turn; returns when all have finished.
+
+        `turn(agent)` returns a falsy value (or raises) when it produced no
+        decision, which counts as a failure. `refill()`, if given, is asked
+        for more agents whenever the queue runs dry (e.g. the next leased
+        batch); the cycle ends once it returns none.
+        """
+        queue = deque((agent, time.monotonic()) for agent in self.prioritize(agents, inbox or []))
+        refilling = asyncio.Lock()
+        exhausted = refill is None
+
+        async def next_agent() -> tuple[dict, float] | None:
+            nonlocal exhausted
+            if not queue and not exhausted:
+                async with refilling:  # One refill at a time; the others wait for its agents
+                    if not queue and not exhausted:
+                        more = await refill()
+                        now = time.monotonic()
+                        queue.extend((agent, now) for agent in self.prioritize(more, inbox or []))
+                        exhausted = not more
+            return queue.popleft() if queue else None
+
+        async def consume():
+            while (queued := await next_agent()) is not None:
+                agent, enqueued = queued
+                await self.bucket.acquire()
+                start = time.monotonic()
+                self._last_turn[agent["name"]] = start
+                self.metrics.started(start - enqueued)
+                ok = False
+                try:
+                    ok = bool(await turn(agent))
+                except Exception as e:
+                    logger.error(f"❌ Turn failed for {agent['name']}: {e}")
+                finally:
+                    self.metrics.finished(time.monotonic() - start, ok)
+
+        workers = self.concurrency if refill is not None else min(self.concurrency, len(queue))
+        await asyncio.gather(*(consume() for _ in range(workers)))
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics.stats(),
+            "concurrency": self.concurrency,
+            "rate_per_minute": round(self.bucket.rate * 60, 2),
+        }
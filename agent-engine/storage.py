@@ -0,0 +1,404 @@
+"""
+Storage Backends — Where Custodian keeps agents, inbox items and memories
+
+Custodian talks to storage through the PostgREST-shaped surface of
+AsyncPostgrest (select / insert / update / rpc with PostgREST filter
+strings), so a backend is anything with that surface (`Storage`):
+- supabase: AsyncPostgrest over HTTP (default)
+- sqlite: local file, for single-node and edge deployments
+- memory: SQLite in RAM, for tests and offline benchmarks
+
+The SQLite backend:
+- WAL journal, synchronous=NORMAL, memory-mapped reads
+- Filters become parameterized SQL with stable text, so repeated query
+  shapes hit sqlite3's prepared-statement cache
+- FTS5 index over boss_memory behind `search()` (RECALL_ENGINE=fts)
+- The worker lease functions, with BEGIN IMMEDIATE standing in for
+  FOR UPDATE SKIP LOCKED
+- Queries run in order on one dedicated thread, so waiting on another
+  process's write lock (the API and `python worker.py` sharing a file)
+  never stalls the event loop
+"""
+
+import asyncio
+import json
+import re
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Protocol
+
+from config import STORAGE_BACKEND, SQLITE_PATH, SUPABASE_URL, SUPABASE_KEY
+from db import PostgrestError, create_postgrest
+from metrics import db_query_duration
+
+
+class Storage(Protocol):
+    async def select(
+        self,
+        table: str,
+        filters: dict[str, str] | None = None,
+        columns: str = "*",
+        order: str | None = None,
+        limit: int | None = None,
+    ) -> list[dict]: ...
+
+    async def insert(self, table: str, rows: dict | list[dict]) -> list[dict]: ...
+
+    async def update(self, table: str, values: dict, filters: dict[str, str]) -> list[dict]: ...
+
+    async def rpc(self, function: str, params: dict | None = None) -> list[dict] | dict: ...
+
+    async def aclose(self) -> None: ...
+
+
+# table -> {column: SQL declaration}; mirrors src/db/schema.ts for the tables Custodian uses
+SCHEMA = {
+    "agents": {
+        "id": "TEXT PRIMARY KEY",
+        "name": "TEXT NOT NULL",
+        "role": "TEXT NOT NULL",
+        "status": "TEXT DEFAULT 'IDLE'",
+        "current_task": "TEXT",
+        "last_heartbeat": "TEXT",
+        "config": "TEXT",
+        "lease_owner": "TEXT",
+        "lease_expires_at": "TEXT",
+    },
+    "inbox_items": {
+        "id": "TEXT PRIMARY KEY",
+        "type": "TEXT NOT NULL",
+        "source": "TEXT NOT NULL",
+        "title": "TEXT NOT NULL",
+        "body": "TEXT",
+        "priority": "TEXT DEFAULT 'P2'",
+        "status": "TEXT DEFAULT 'NEW'",
+        "metadata": "TEXT",
+        "lease_owner": "TEXT",
+        "lease_expires_at": "TEXT",
+        "created_at": "TEXT",
+    },
+    "boss_memory": {
+        "id": "TEXT PRIMARY KEY",
+        "content": "TEXT NOT NULL",
+        "category": "TEXT DEFAULT 'NOTE'",
+        "created_at": "TEXT",
+    },
+}
+
+JSON_COLUMNS = {"config", "metadata"}
+
+# Column values filled in on insert when the row leaves them out
+DEFAULTS = {
+    "agents": {"status": "IDLE"},
+    "inbox_items": {"priority": "P2", "status": "NEW"},
+    "boss_memory": {"category": "NOTE"},
+}
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS agents_name ON agents (name)",
+    "CREATE INDEX IF NOT EXISTS agents_lease ON agents (status, lease_expires_at)",
+    "CREATE INDEX IF NOT EXISTS inbox_items_created ON inbox_items (created_at)",
+    "CREATE INDEX IF NOT EXISTS inbox_items_status ON inbox_items (status, created_at)",
+    "CREATE INDEX IF NOT EXISTS boss_memory_created ON boss_memory (created_at)",
+]
+
+# External-content FTS5 index kept in step with boss_memory by triggers
+FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS boss_memory_fts USING fts5("
+    "content, category, content='boss_memory', content_rowid='rowid', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS boss_memory_ai AFTER INSERT ON boss_memory BEGIN "
+    "INSERT INTO boss_memory_fts (rowid, content, category) VALUES (new.rowid, new.content, new.category); END",
+    "CREATE TRIGGER IF NOT EXISTS boss_memory_ad AFTER DELETE ON boss_memory BEGIN "
+    "INSERT INTO boss_memory_fts (boss_memory_fts, rowid, content, category) "
+    "VALUES ('delete', old.rowid, old.content, old.category); END",
+    "CREATE TRIGGER IF NOT EXISTS boss_memory_au AFTER UPDATE ON boss_memory BEGIN "
+    "INSERT INTO boss_memory_fts (boss_memory_fts, rowid, content, category) "
+    "VALUES ('delete', old.rowid, old.content, old.category); "
+    "INSERT INTO boss_memory_fts (rowid, content, category) VALUES (new.rowid, new.content, new.category); END",
+]
+
+OPERATORS = {"eq": "=", "neq": "<>", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+_WORD = re.compile(r"\w+")
+_LIKE_SPECIAL = re.compile(r"[\\%_]")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(moment: datetime) -> str:
+    """Fixed-width ISO 8601, so timestamps compare correctly as text."""
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+class SqliteStorage:
+    """PostgREST-compatible storage on one SQLite connection, owned by one
+    worker thread."""
+
+    def __init__(self, path: str = ":memory:", cached_statements: int = 512):
+        self.path = path
+        self.conn: sqlite3.Connection | None = None
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._closed = False
+        # Queued first, so every query runs after it; not awaited, since the
+        # file may be locked by another process for a while
+        self._opened = self._thread.submit(self._open, cached_statements)
+
+    def _open(self, cached_statements: int) -> None:
+        self.conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=cached_statements)
+        self.conn.row_factory = self._row
+        for pragma in ("journal_mode=WAL", "synchronous=NORMAL", "temp_store=MEMORY",
+                       "mmap_size=268435456", "busy_timeout=5000"):
+            self.conn.execute(f"PRAGMA {pragma}")
+        for table, columns in SCHEMA.items():
+            body = ", ".join(f"{name} {decl}" for name, decl in columns.items())
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({body})")
+        for statement in INDEXES + FTS:
+            self.conn.execute(statement)
+
+    @staticmethod
+    def _row(cursor: sqlite3.Cursor, values: tuple) -> dict:
+        row = {description[0]: value for description, value in zip(cursor.description, values)}
+        for column in JSON_COLUMNS.intersection(row):
+            if row[column] is not None:
+                row[column] = json.loads(row[column])
+        return row
+
+    async def select(
+        self,
+        table: str,
+        filters: dict[str, str] | None = None,
+        columns: str = "*",
+        order: str | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        """SELECT rows; arguments as in AsyncPostgrest.select()."""
+        known = self._columns(table)
+        selected = "*" if columns == "*" else ", ".join(self._column(known, c.strip()) for c in columns.split(","))
+        where, params = self._where(known, filters)
+        sql = f"SELECT {selected} FROM {table}{where}{self._order(known, order)}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return await self._run("GET", table, lambda: self.conn.execute(sql, params).fetchall())
+
+    async def insert(self, table: str, rows: dict | list[dict]) -> list[dict]:
+        """INSERT one or many rows in one transaction; returns them with
+        ids, timestamps and column defaults filled in."""
+        known = self._columns(table)
+        rows = [self._complete(table, known, row) for row in (rows if isinstance(rows, list) else [rows])]
+
+        def run() -> list[dict]:
+            by_shape: dict[tuple, list[dict]] = {}
+            for row in rows:
+                by_shape.setdefault(tuple(row), []).append(row)
+            with self._transaction():
+                for shape, group in by_shape.items():
+                    sql = f"INSERT INTO {table} ({', '.join(shape)}) VALUES ({', '.join('?' * len(shape))})"
+                    self.conn.executemany(sql, [[self._value(r[c]) for c in shape] for r in group])
+            return rows
+
+        return await self._run("POST", table, run)
+
+    async def update(self, table: str, values: dict, filters: dict[str, str]) -> list[dict]:
+        """UPDATE rows matching `filters`; returns the updated rows."""
+        if not filters:
+            raise ValueError("update() without filters would touch every row")
+        known = self._columns(table)
+        assignments = ", ".join(f"{self._column(known, c)} = ?" for c in values)
+        where, params = self._where(known, filters)
+        sql = f"UPDATE {table} SET {assignments}{where} RETURNING *"
+        params = [self._value(v) for v in values.values()] + params
+        return await self._run("PATCH", table, lambda: self.conn.execute(sql, params).fetchall())
+
+    async def rpc(self, function: str, params: dict | None = None) -> list[dict] | dict:
+        """The Postgres functions the engine calls (migrations/)."""
+        handler = {
+            "claim_agents": self._claim_agents,
+            "release_agents": self._release_agents,
+            "claim_inbox_item": self._claim_inbox_item,
+        }.get(function)
+        if handler is None:
+            raise PostgrestError(404, f"Unknown function: {function}")
+        return await self._run("POST", "rpc", lambda: handler(**(params or {})))
+
+    async def search(self, query: str, limit: int = 5) -> list[dict]:
+        """Full-text memory search (FTS5, BM25), best match first. Rows carry
+        a `score` relative to the best match, like the in-process index."""
+        terms = _WORD.findall(query.lower())
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        sql = ("SELECT m.*, bm25(boss_memory_fts) AS rank FROM boss_memory_fts "
+               "JOIN boss_memory m ON m.rowid = boss_memory_fts.rowid "
+               "WHERE boss_memory_fts MATCH ? ORDER BY rank LIMIT ?")
+        rows = await self._run("GET", "boss_memory", lambda: self.conn.execute(sql, (match, limit)).fetchall())
+        best = rows[0]["rank"] if rows else 0.0
+        for row in rows:
+            rank = row.pop("rank")
+            row["score"] = round(rank / best, 4) if best else 0.0
+        return rows
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+
+        def close() -> None:
+            if self.conn is not None:
+                self.conn.close()
+
+        await asyncio.get_running_loop().run_in_executor(self._thread, close)
+        self._thread.shutdown()
+
+    def _claim_agents(self, p_owner: str, p_ttl_seconds: int, p_limit: int) -> list[dict]:
+        now = _now()
+        with self._transaction():
+            ids = [r["id"] for r in self.conn.execute(
+                "SELECT id FROM agents WHERE status = 'RUNNING' "
+                "AND (lease_expires_at IS NULL OR lease_expires_at <= ? OR lease_owner = ?) "
+                "ORDER BY lease_expires_at ASC NULLS FIRST LIMIT ?",
+                (_timestamp(now), p_owner, p_limit),
+            )]
+            if not ids:
+                return []
+            return self.conn.execute(
+                f"UPDATE agents SET lease_owner = ?, lease_expires_at = ? "
+                f"WHERE id IN ({', '.join('?' * len(ids))}) RETURNING *",
+                [p_owner, _timestamp(now + timedelta(seconds=p_ttl_seconds)), *ids],
+            ).fetchall()
+
+    def _release_agents(self, p_owner: str, p_ids: list[str]) -> list[dict]:
+        if p_ids:
+            self.conn.execute(
+                f"UPDATE agents SET lease_owner = NULL, lease_expires_at = ? "
+                f"WHERE lease_owner = ? AND id IN ({', '.join('?' * len(p_ids))})",
+                [_timestamp(_now()), p_owner, *p_ids],
+            )
+        return []
+
+    def _claim_inbox_item(self, p_id: str, p_owner: str, p_ttl_seconds: int) -> list[dict]:
+        now = _now()
+        return self.conn.execute(
+            "UPDATE inbox_items SET lease_owner = ?, lease_expires_at = ? "
+            "WHERE id = ? AND status = 'NEW' "
+            "AND (lease_expires_at IS NULL OR lease_expires_at <= ? OR lease_owner = ?) RETURNING *",
+            (p_owner, _timestamp(now + timedelta(seconds=p_ttl_seconds)), p_id, _timestamp(now), p_owner),
+        ).fetchall()
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT: takes the write lock up front, so
+        concurrent processes serialize instead of failing mid-transaction."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    async def _run(self, method: str, table: str, run):
+        """Run `run()` on the storage thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._thread, self._timed, method, table, run)
+
+    def _timed(self, method: str, table: str, run):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            self._opened.result()  # Re-raises a failed open
+            result = run()
+            outcome = "ok"
+            return result
+        except sqlite3.IntegrityError as e:
+            raise PostgrestError(409, str(e)) from e
+        except sqlite3.OperationalError as e:
+            raise PostgrestError(503 if "locked" in str(e) else 400, str(e)) from e
+        except sqlite3.Error as e:
+            raise PostgrestError(500, str(e)) from e
+        finally:
+            db_query_duration.observe(time.perf_counter() - start, method=method, table=table, outcome=outcome)
+
+    def _complete(self, table: str, known: dict, row: dict) -> dict:
+        for column in row:
+            self._column(known, column)
+        complete = {**DEFAULTS.get(table, {}), "id": str(uuid.uuid4()), **row}
+        if "created_at" in known and complete.get("created_at") is None:
+            complete["created_at"] = _timestamp(_now())
+        return complete
+
+    @staticmethod
+    def _value(value):
+        return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+    @staticmethod
+    def _columns(table: str) -> dict:
+        columns = SCHEMA.get(table)
+        if columns is None:
+            raise PostgrestError(404, f"Unknown table: {table}")
+        return columns
+
+    @staticmethod
+    def _column(known: dict, column: str) -> str:
+        """Identifiers can't be parameters; only schema columns get into SQL."""
+        if column not in known:
+            raise PostgrestError(400, f"Unknown column: {column}")
+        return column
+
+    def _where(self, known: dict, filters: dict[str, str] | None) -> tuple[str, list]:
+        clauses, params = [], []
+        for column, expr in (filters or {}).items():
+            column = self._column(known, column)
+            op, _, value = expr.partition(".")
+            if op in OPERATORS:
+                clauses.append(f"{column} {OPERATORS[op]} ?")
+                params.append(value)
+            elif op == "like":
+                clauses.append(f"{column} GLOB ?")  # Case-sensitive, like PostgREST's like
+                params.append(value.replace("[", "[[]").replace("?", "[?]").replace("%", "*"))
+            elif op == "ilike":
+                # Case-insensitive for ASCII; only * is a wildcard, so user
+                # text (recall queries) matches literally
+                clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+                params.append(_LIKE_SPECIAL.sub(r"\\\g<0>", value).replace("*", "%"))
+            elif op == "in":
+                values = [v.strip().strip('"') for v in value.strip("()").split(",")]
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+            elif op == "is" and value == "null":
+                clauses.append(f"{column} IS NULL")
+            else:
+                raise PostgrestError(400, f"Unsupported filter: {column}={expr}")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _order(self, known: dict, order: str | None) -> str:
+        if not order:
+            return ""
+        terms = []
+        for part in order.split(","):
+            column, *modifiers = part.strip().split(".")
+            term = self._column(known, column)
+            for modifier in modifiers:
+                keyword = {"asc": "ASC", "desc": "DESC", "nullsfirst": "NULLS FIRST", "nullslast": "NULLS LAST"}.get(modifier)
+                if keyword is None:
+                    raise PostgrestError(400, f"Unsupported order: {part}")
+                term += f" {keyword}"
+            terms.append(term)
+        return " ORDER BY " + ", ".join(terms)
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    """Backend from the STORAGE_BACKEND settings."""
+    if backend == "supabase":
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY required")
+        return create_postgrest(SUPABASE_URL, SUPABASE_KEY)
+    if backend == "sqlite":
+        return SqliteStorage(SQLITE_PATH)
+    if backend == "memory":
+        return SqliteStorage(":memory:")
+    raise ValueError(f"STORAGE_BACKEND must be 'supabase', 'sqlite' or 'memory', got {backend!r}")
@@ -0,0 +1,53 @@
+"""
+Shared fixtures — offline storage for every test
+
+Tests run against the fake PostgREST (in process, over ASGITransport) and
+in-memory SQLite; nothing reaches the network. Settings are pinned here,
+before any engine module reads config.
+"""
+
+import os
+
+os.environ.update({
+    "STORAGE_BACKEND": "memory",
+    "RECALL_ENGINE": "index",
+    "LLM_BACKEND": "mock",
+    "WORKER_LEASES": "0",
+    "CRUSH_EXECUTOR": "inline",
+    "EVENTS_SECRET": "",
+})
+
+import httpx
+import pytest
+
+from db import AsyncPostgrest
+from fakes import postgrest as fake
+from storage import SqliteStorage
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def fake_db():
+    """AsyncPostgrest over the fake PostgREST, with empty tables."""
+    fake.seed(agents=0, inbox=0, memories=0)
+    fake.LATENCY = 0
+    db = AsyncPostgrest("http://fake", "fake", transport=httpx.ASGITransport(app=fake.app))
+    yield db
+    await db.aclose()
+
+
+@pytest.fixture
+async def sqlite_db():
+    db = SqliteStorage(":memory:")
+    yield db
+    await db.aclose()
+
+
+@pytest.fixture(params=["fake", "sqlite"])
+async def db(request, fake_db, sqlite_db):
+    """Each storage backend in turn."""
+    return fake_db if request.param == "fake" else sqlite_db
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import crusher
+from benchmarks.bench_align import OVERLAPS, legacy_align, make_log_dump
+from cache import TTLCache
+from crusher import CacheAligner, ContextFitter, SmartCrusher, estimate_tokens, simhash
+
+
+@pytest.mark.parametrize("text", OVERLAPS + [
+    "GET /api req-42 session_ab12 at 2024-05-01T10:00:00.123Z for 0f8fad5b-d9cb-469f-a165-70867728950e",
+    "session_xreq-7 then req-9",
+])
+def test_aligner_matches_legacy_substitutions(text):
+    assert CacheAligner().align(text) == legacy_align(text)
+
+
+def test_aligner_matches_legacy_on_log_dump():
+    text = make_log_dump(64 * 1024)
+    assert CacheAligner().align(text) == legacy_align(text)
+
+
+def test_registered_rules_apply():
+    aligner = CacheAligner()
+    aligner.register(r'#\d+', '[TICKET]')
+    assert aligner.align("fixes #123 in req-9") == "fixes [TICKET] in [REQ_ID]"
+
+
+def make_records(count: int) -> list[dict]:
+    return [{"id": i, "status": "ok" if i % 7 else "error", "message": f"request {i} served in {i % 90} ms"}
+            for i in range(count)]
+
+
+@pytest.mark.parametrize("content", [make_records(200), {"records": make_records(200), "next": "cursor-9"}])
+@pytest.mark.parametrize("max_chars", [4, 8, 40, 400])
+def test_structured_output_is_json_at_any_budget(content, max_chars):
+    result = SmartCrusher(max_chars=max_chars, cache=TTLCache()).crush(content)
+    json.loads(result.content)
+    assert estimate_tokens(result.content) <= max(max_chars // 4, 1) or result.content in ("[]", "{}")
+
+
+@pytest.mark.parametrize("budget", [0, 1, 2, 3, 5, 8, 20])
+def test_context_fitter_stays_within_tiny_budgets(budget):
+    fitter = ContextFitter(SmartCrusher.CRITICAL_SIGNALS)
+    text = "\n".join(f"worker {i} processed batch {i * 7} without incident" for i in range(100))
+    assert fitter.tokenizer(fitter.fit(text, budget)) <= budget
+
+
+def test_text_crush_stays_within_max_chars():
+    result = SmartCrusher(max_chars=8, cache=TTLCache()).crush(make_log_dump(16 * 1024))
+    assert estimate_tokens(result.content) <= 2
+
+
+def test_crushers_with_different_tokenizers_do_not_share_results():
+    cache = TTLCache()
+    text = make_log_dump(8 * 1024)
+    coarse = SmartCrusher(max_tokens=200, cache=cache, tokenizer=lambda s: len(s) // 8 + 1).crush(text)
+    fine = SmartCrusher(max_tokens=200, cache=cache, tokenizer=lambda s: len(s) // 2 + 1).crush(text)
+    assert cache.stats()["hits"] == 0
+    assert len(fine.content) < len(coarse.content)
+
+
+def test_simhash_is_stable_across_processes():
+    script = "from crusher import simhash; print(simhash('disk /dev/sda1 at 91% on host web-3'))"
+    outputs = {
+        subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                       cwd=os.path.dirname(crusher.__file__), env={**os.environ, "PYTHONHASHSEED": seed}).stdout
+        for seed in ("1", "2")
+    }
+    assert outputs == {f"{simhash('disk /dev/sda1 at 91% on host web-3')}\n"}
+
+
+@pytest.mark.parametrize("structured", [True, False])
+def test_json_original_is_stored_pretty_printed(structured):
+    records = make_records(200)
+    crusher = SmartCrusher(cache=TTLCache(), structured=structured)
+    result = crusher.crush(records)
+    assert crusher.retrieve(result.originals_hash) == json.dumps(records, indent=2)
+    assert result.original_chars == len(json.dumps(records, indent=2))
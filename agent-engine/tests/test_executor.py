@@ -0,0 +1,48 @@
+import pytest
+
+import crusher
+import executor as executor_module
+from benchmarks.bench_align import make_log_dump
+from cache import TTLCache
+from executor import CrushExecutor
+from originals import originals
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    """A fresh shared result cache, seen by every crusher built in the test."""
+    cache = TTLCache(ttl=60)
+    monkeypatch.setattr(crusher, "result_cache", cache)
+    executor_module._crusher.cache_clear()
+    yield cache
+    executor_module._crusher.cache_clear()
+
+
+@pytest.fixture
+def process_executor():
+    executor = CrushExecutor(mode="process", workers=1, inline_threshold=20_000)
+    yield executor
+    executor.shutdown()
+
+
+async def test_process_crushes_share_the_parent_result_cache(process_executor, result_cache):
+    large = make_log_dump(50_000, seed=1)
+
+    first = await process_executor.crush(large, max_chars=2000)
+    second = await process_executor.crush(large, max_chars=2000)
+
+    assert (result_cache.stats()["misses"], result_cache.stats()["hits"]) == (1, 1)
+    assert "smart_crush" in first.stage_seconds and "smart_crush" not in second.stage_seconds
+    assert first.content == second.content
+    assert originals.get(first.originals_hash) == large
+
+
+async def test_process_crush_matches_inline(process_executor, result_cache):
+    large = make_log_dump(50_000, seed=2)
+
+    offloaded = await process_executor.crush(large, max_chars=2000)
+    inline = crusher.SmartCrusher(max_chars=2000, cache=TTLCache()).crush(large)
+
+    assert offloaded.content == inline.content
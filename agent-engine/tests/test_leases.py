@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from leases import Leases
+from memory import Custodian
+from scheduler import AgentScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def custodian(db):
+    await db.insert("agents", [{"name": f"AGENT {i}", "role": "Ops", "status": "RUNNING"} for i in range(6)])
+    await db.insert("agents", {"name": "IDLE AGENT", "role": "Ops", "status": "IDLE"})
+    return Custodian(db)
+
+
+def names(agents: list[dict]) -> set[str]:
+    return {a["name"] for a in agents}
+
+
+async def test_workers_claim_disjoint_batches(custodian):
+    a, b, c = Leases("a", batch=3), Leases("b", batch=3), Leases("c", batch=3)
+    first, second = await a.claim_agents(custodian), await b.claim_agents(custodian)
+
+    assert len(first) == len(second) == 3
+    assert not names(first) & names(second)
+    assert "IDLE AGENT" not in names(first) | names(second)
+    assert await c.claim_agents(custodian) == []
+    assert c.stats()["cycles_empty"] == 1
+
+
+async def test_released_agents_are_claimable_at_once(custodian):
+    a, b = Leases("a", batch=6), Leases("b", batch=6)
+    held = await a.claim_agents(custodian)
+    await a.release_agents(custodian, held[:2])
+
+    assert names(await b.claim_agents(custodian)) == names(held[:2])
+
+
+async def test_cycle_claims_until_every_free_agent_is_held(custodian):
+    a, b = Leases("a", batch=2), Leases("b", batch=2)
+    taken_by_b = await b.claim_agents(custodian)
+    held: dict[str, dict] = {}
+    batches = []
+    while batch := await a.claim_agents(custodian, held):
+        batches.append(batch)
+
+    claimed = [agent for batch in batches for agent in batch]
+    assert len(claimed) == len(names(claimed)) == 4
+    assert not names(claimed) & names(taken_by_b)
+    assert set(held) == {agent["id"] for agent in claimed}
+
+
+async def test_scheduler_refill_never_runs_an_agent_on_two_workers_at_once(custodian):
+    in_flight: set[str] = set()
+    overlaps: list[str] = []
+    turns: dict[str, set[str]] = {"a": set(), "b": set()}
+
+    async def cycle(leases: Leases) -> None:
+        held: dict[str, dict] = {}
+        scheduler = AgentScheduler(concurrency=2, rate_per_minute=60_000, burst=100)
+
+        async def turn(agent: dict) -> bool:
+            if agent["name"] in in_flight:
+                overlaps.append(agent["name"])
+            in_flight.add(agent["name"])
+            turns[leases.owner].add(agent["name"])
+            await asyncio.sleep(0.01)
+            in_flight.discard(agent["name"])
+            return True
+
+        first = await leases.claim_agents(custodian, held)
+        await scheduler.run_cycle(first, turn, refill=lambda: leases.claim_agents(custodian, held))
+        await leases.release_agents(custodian, list(held.values()))
+
+    await asyncio.gather(cycle(Leases("a", batch=2)), cycle(Leases("b", batch=2)))
+
+    assert overlaps == []
+    assert turns["a"] and turns["b"]
+    assert turns["a"] | turns["b"] == {f"AGENT {i}" for i in range(6)}
+
+
+async def test_one_agent_wins_an_inbox_item(custodian):
+    [item] = await custodian.db.insert("inbox_items", {"type": "ALERT", "source": "SENTRY", "title": "Disk full",
+                                                       "priority": "P1", "status": "NEW"})
+    a, b = Leases("a"), Leases("b")
+
+    assert await a.claim_inbox_item(custodian, item["id"], "AGENT 0")
+    assert not await b.claim_inbox_item(custodian, item["id"], "AGENT 1")
+    assert (a.stats()["items_claimed"], b.stats()["items_lost"]) == (1, 1)
+
+    [read] = await custodian.db.insert("inbox_items", {"type": "ALERT", "source": "SENTRY", "title": "Old",
+                                                       "priority": "P1", "status": "READ"})
+    assert not await a.claim_inbox_item(custodian, read["id"], "AGENT 0")
+
+
+def test_only_live_foreign_leases_hide_rows():
+    leases = Leases("me")
+    later = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
+    earlier = (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat()
+    rows = [
+        {"id": "free"},
+        {"id": "mine", "lease_owner": "me", "lease_expires_at": later},
+        {"id": "expired", "lease_owner": "other", "lease_expires_at": earlier},
+        {"id": "taken", "lease_owner": "other", "lease_expires_at": later},
+    ]
+    assert [r["id"] for r in leases.visible(rows)] == ["free", "mine", "expired"]
@@ -0,0 +1,47 @@
+import pytest
+
+import memory
+from fakes import postgrest as fake
+from memory import Custodian
+from recall import InvertedIndex
+
+pytestmark = pytest.mark.anyio
+
+
+def test_index_ranks_exact_terms_above_prefix_matches():
+    index = InvertedIndex()
+    exact = index.add("rollback the deploy")
+    prefix = index.add("deployment finished")
+    index.add("nothing relevant here")
+
+    ranked = [doc for _, doc in index.search("deploy", 3)]
+    assert ranked[:2] == [exact, prefix]
+
+
+async def test_sync_finds_rows_other_replicas_wrote_before_a_local_save(fake_db, monkeypatch):
+    monkeypatch.setattr(memory, "WRITE_BEHIND", False)
+    replica_a, replica_b = Custodian(fake_db), Custodian(fake_db)
+    await replica_a.recall("warm up")
+
+    # B's row is stamped first but lands after A's own save moved on
+    late = fake._row({"content": "zebra crossing from replica b", "category": "NOTE"})
+    await replica_a.save("aardvark noted locally by a")
+    fake.tables["boss_memory"].append(late)
+
+    await replica_a.recall_engine.sync(force=True)
+    assert [r["content"] for r in await replica_a.recall("zebra")] == [late["content"]]
+    assert [r["content"] for r in await replica_b.recall("zebra")] == [late["content"]]
+
+
+async def test_sync_pages_rows_sharing_one_timestamp(fake_db):
+    custodian = Custodian(fake_db)
+    await custodian.recall("warm up")
+    custodian.recall_engine.PAGE_SIZE = 2
+
+    stamp = "2030-01-01T00:00:00+00:00"
+    fake.tables["boss_memory"].extend(
+        fake._row({"content": f"bulk yak {i}", "category": "NOTE", "created_at": stamp}) for i in range(5)
+    )
+    await custodian.recall_engine.sync(force=True)
+
+    assert len(await custodian.recall("yak", limit=10)) == 5
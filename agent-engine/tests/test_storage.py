@@ -0,0 +1,93 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from db import PostgrestError
+from storage import SqliteStorage
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_insert_fills_ids_defaults_and_timestamps(db):
+    [row] = await db.insert("inbox_items", {"type": "ALERT", "source": "SENTRY", "title": "Disk full",
+                                            "priority": "P2", "status": "NEW"})
+    assert row["id"] and row["created_at"]
+    assert (row["priority"], row["status"]) == ("P2", "NEW")
+
+
+async def test_filters_order_and_limit(db):
+    await db.insert("agents", [
+        {"name": name, "role": "Ops", "status": status}
+        for name, status in [("B", "RUNNING"), ("A", "RUNNING"), ("C", "IDLE")]
+    ])
+    rows = await db.select("agents", filters={"status": "eq.RUNNING"}, order="name.asc")
+    assert [r["name"] for r in rows] == ["A", "B"]
+    rows = await db.select("agents", filters={"name": "in.(A,C)"}, order="name.desc", limit=1)
+    assert [r["name"] for r in rows] == ["C"]
+
+
+async def test_update_returns_changed_rows(db):
+    await db.insert("agents", [{"name": "A", "role": "Ops"}, {"name": "B", "role": "Ops"}])
+    rows = await db.update("agents", {"status": "RUNNING"}, {"name": "eq.A"})
+    assert [(r["name"], r["status"]) for r in rows] == [("A", "RUNNING")]
+
+
+async def test_json_columns_round_trip(sqlite_db):
+    await sqlite_db.insert("agents", {"name": "A", "role": "Ops", "config": {"model": "flash", "tools": ["git"]}})
+    [row] = await sqlite_db.select("agents")
+    assert row["config"] == {"model": "flash", "tools": ["git"]}
+
+
+async def test_ilike_matches_user_wildcards_literally(sqlite_db):
+    await sqlite_db.insert("boss_memory", [{"content": c} for c in ("100% done", "1000 done", "a_b", "axb")])
+    found = await sqlite_db.select("boss_memory", filters={"content": "ilike.*0%*"})
+    assert [r["content"] for r in found] == ["100% done"]
+    found = await sqlite_db.select("boss_memory", filters={"content": "ilike.*A_B*"})
+    assert [r["content"] for r in found] == ["a_b"]
+
+
+async def test_unknown_columns_are_rejected(sqlite_db):
+    with pytest.raises(PostgrestError) as error:
+        await sqlite_db.select("agents", filters={"name; DROP TABLE agents": "eq.x"})
+    assert error.value.status_code == 400
+
+
+async def test_fts_search_ranks_best_match_first(sqlite_db):
+    await sqlite_db.insert("boss_memory", [
+        {"content": "Deploy froze during the rollback"},
+        {"content": "Rollback rollback rollback after deploy"},
+        {"content": "Lunch menu"},
+    ])
+    rows = await sqlite_db.search("rollback", limit=5)
+    assert rows[0]["content"].startswith("Rollback rollback")
+    assert rows[0]["score"] == 1.0 and len(rows) == 2
+
+
+async def test_lock_wait_does_not_block_the_event_loop(tmp_path):
+    path = str(tmp_path / "engine.db")
+    db = SqliteStorage(path)
+    await db.select("agents")  # Schema in place before another process locks the file
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    async def unlock():
+        await asyncio.sleep(0.5)
+        other.execute("COMMIT")
+
+    ticker = asyncio.create_task(tick())
+    try:
+        await asyncio.gather(db.insert("agents", {"name": "A", "role": "Ops"}), unlock())
+    finally:
+        ticker.cancel()
+        other.close()
+        await db.aclose()
+    assert ticks >= 20
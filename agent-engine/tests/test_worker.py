@@ -0,0 +1,101 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+import memory
+import worker
+from memory import Custodian
+from prompt import PromptAssembler
+from scheduler import AgentScheduler, ReplyClaims
+
+pytestmark = pytest.mark.anyio
+
+
+class FirstItemLLM:
+    """Every agent answers the first inbox item in its prompt, if any."""
+
+    async def generate(self, role: str, system_instruction: str, prompt: str) -> str:
+        await asyncio.sleep(0.01)  # Let the cycle's turns overlap
+        ids = re.findall(r"\bid=([\w-]+)", prompt)
+        if ids:
+            return json.dumps({"action": "REPLY", "content": f"{role} on it", "target_id": ids[0], "thought": "t"})
+        return json.dumps({"action": "LOG", "content": f"{role} idle", "thought": "t"})
+
+
+@pytest.fixture
+async def custodian(sqlite_db, monkeypatch):
+    custodian = Custodian(sqlite_db)
+    monkeypatch.setattr(memory, "custodian", custodian)
+    monkeypatch.setattr(worker, "_llm", FirstItemLLM())
+    monkeypatch.setattr(worker, "replies", ReplyClaims())
+    await sqlite_db.insert("agents", [
+        {"name": f"AGENT {i}", "role": "Operations", "status": "RUNNING"} for i in range(6)
+    ])
+    yield custodian
+    await custodian.aclose()
+
+
+async def run_cycle(custodian: Custodian) -> None:
+    """One agent_loop cycle without leases."""
+    fleet = await custodian.get_fleet_status()
+    inbox = worker.replies.open(await custodian.get_inbox(status="NEW"))
+    snapshot = await custodian.context_snapshot(fleet=fleet, inbox=inbox)
+    scheduler = AgentScheduler(concurrency=6, rate_per_minute=60_000, burst=100)
+    await scheduler.run_cycle(fleet, lambda agent: worker.run_agent_turn(agent, snapshot), inbox=inbox)
+
+
+async def test_one_reply_per_new_item_across_concurrent_turns(custodian):
+    [item] = await custodian.db.insert("inbox_items", {"type": "ALERT", "source": "SENTRY", "title": "Disk full"})
+
+    await run_cycle(custodian)
+    await run_cycle(custodian)  # READ mark still in the write-behind buffer
+    await custodian.writes.flush()
+
+    replies = await custodian.db.select("inbox_items", filters={"type": "eq.MESSAGE"})
+    assert len(replies) == 1
+    [answered] = await custodian.db.select("inbox_items", filters={"id": f"eq.{item['id']}"})
+    assert answered["status"] == "READ"
+    assert worker.replies.stats()["claimed"] == 1
+
+
+async def test_claims_lapse_once_the_item_is_no_longer_new(custodian):
+    await custodian.db.insert("inbox_items", {"type": "ALERT", "source": "SENTRY", "title": "Disk full"})
+    await run_cycle(custodian)
+    await custodian.writes.flush()
+
+    await run_cycle(custodian)
+    assert worker.replies.stats()["held"] == 0
+
+
+class FlakyLLM:
+    """Fails the first call, then logs; keeps every prompt."""
+
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    async def generate(self, role: str, system_instruction: str, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if len(self.prompts) == 1:
+            raise RuntimeError("429 quota exceeded")
+        return json.dumps({"action": "LOG", "content": f"{role} read it", "thought": "t"})
+
+
+async def test_inbox_body_is_resent_after_a_failed_turn(custodian, monkeypatch):
+    llm = FlakyLLM()
+    monkeypatch.setattr(worker, "_llm", llm)
+    monkeypatch.setattr(worker, "CONTEXT_MODE", "full")
+    monkeypatch.setattr(worker, "prompts", PromptAssembler())
+    await custodian.db.insert("inbox_items", {"type": "ALERT", "source": "SENTRY", "title": "Disk full",
+                                              "body": "volume /data at 97%"})
+    [agent] = (await custodian.get_fleet_status())[:1]
+    snapshot = await custodian.context_snapshot()
+
+    with pytest.raises(RuntimeError):
+        await worker.run_agent_turn(agent, snapshot)
+    assert await worker.run_agent_turn(agent, snapshot)
+    await worker.run_agent_turn(agent, snapshot)
+
+    assert ["volume /data at 97%" in prompt for prompt in llm.prompts] == [True, True, False]
+    assert "body seen in an earlier cycle" in llm.prompts[2]
@@ -0,0 +1,80 @@
+import httpx
+import pytest
+
+from db import PostgrestError
+from writebehind import WriteBehind
+
+pytestmark = pytest.mark.anyio
+
+
+class FlakyStorage:
+    """Wraps a storage backend; the next calls raise the queued errors."""
+
+    def __init__(self, db, errors: list[Exception]):
+        self.db = db
+        self.errors = errors
+
+    async def insert(self, table, rows):
+        if self.errors:
+            raise self.errors.pop(0)
+        return await self.db.insert(table, rows)
+
+    async def update(self, table, values, filters):
+        if self.errors:
+            raise self.errors.pop(0)
+        return await self.db.update(table, values, filters)
+
+
+@pytest.mark.parametrize("error", [
+    PostgrestError(503, "database is locked"),
+    PostgrestError(429, "rate limited"),
+    httpx.ConnectError("refused"),
+])
+async def test_unapplied_insert_is_requeued(db, error):
+    writes = WriteBehind(FlakyStorage(db, [error]))
+    await writes.insert("boss_memory", {"content": "kept"})
+
+    await writes.flush()
+    assert writes.depth == 1
+    assert writes.stats()["requeued"] == 1
+
+    await writes.flush()
+    assert writes.depth == 0
+    assert [r["content"] for r in await db.select("boss_memory")] == ["kept"]
+
+
+async def test_rejected_insert_is_dropped_and_counted(db):
+    writes = WriteBehind(FlakyStorage(db, [PostgrestError(400, "bad row")]))
+    await writes.insert("boss_memory", {"content": "lost"})
+
+    await writes.flush()
+    assert writes.depth == 0
+    assert writes.stats()["dropped"] == 1
+    assert await db.select("boss_memory") == []
+
+
+async def test_update_requeued_on_gateway_error_keeps_newer_values(db):
+    [agent] = await db.insert("agents", {"name": "THE BOSS", "role": "Lead", "current_task": "old"})
+    flaky = FlakyStorage(db, [PostgrestError(502, "bad gateway")])
+    writes = WriteBehind(flaky)
+    await writes.update("agents", {"current_task": "first", "status": "RUNNING"}, {"id": f"eq.{agent['id']}"})
+
+    await writes.flush()
+    await writes.update("agents", {"current_task": "second"}, {"id": f"eq.{agent['id']}"})
+    await writes.flush()
+
+    [row] = await db.select("agents")
+    assert (row["current_task"], row["status"]) == ("second", "RUNNING")
+    assert writes.stats()["requeued"] == 1
+
+
+async def test_updates_to_one_row_coalesce(db):
+    [agent] = await db.insert("agents", {"name": "THE BOSS", "role": "Lead"})
+    writes = WriteBehind(db)
+    for beat in range(5):
+        await writes.update("agents", {"last_heartbeat": f"t{beat}"}, {"id": f"eq.{agent['id']}"})
+
+    assert writes.depth == 1
+    await writes.close()
+    assert (await db.select("agents"))[0]["last_heartbeat"] == "t4"
+    assert writes.stats()["requests"] == 1
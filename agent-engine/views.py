@@ -0,0 +1,78 @@
+"""
+Table Views — In-process materialized copies of hot tables
+
+- Serve `agents` and recent `inbox_items` reads from memory instead of a
+  full select per request
+- Kept fresh by applying the service's own writes and /events changes
+  in place, with a TTL refetch as the safety net
+- Endpoints answer If-None-Match from the served body's ETag, so
+  dashboard polling of unchanged data costs neither a query nor a body
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+
+class TableView:
+    """Cached rows of one table query, patched by id as writes land."""
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[list[dict]]],
+        ttl: float = 15.0,
+        order: str | None = None,
+        descending: bool = False,
+        limit: int | None = None,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.order = order  # Column to keep rows sorted by after upserts
+        self.descending = descending
+        self.limit = limit  # Window size, matching the fetch query's limit
+        self._rows: list[dict] = []
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+        self._counters = {"hits": 0, "refreshes": 0, "upserts": 0, "invalidations": 0}
+
+    async def rows(self) -> list[dict]:
+        """Current rows, refetched first if stale."""
+        if self._expires <= time.monotonic():
+            async with self._lock:
+                if self._expires <= time.monotonic():  # Another caller may have refreshed
+                    self._rows = await self.fetch()
+                    self._expires = time.monotonic() + self.ttl
+                    self._counters["refreshes"] += 1
+                    return list(self._rows)
+        self._counters["hits"] += 1
+        return list(self._rows)
+
+    @property
+    def full(self) -> bool:
+        """True if the window may be hiding older rows beyond `limit`."""
+        return self.limit is not None and len(self._rows) >= self.limit
+
+    def upsert(self, rows: list[dict]) -> None:
+        """Merge written rows into the view, matching on id."""
+        if not rows or not self._expires:
+            return  # Nothing loaded yet; the first read fetches fresh rows
+        by_id = {row.get("id"): i for i, row in enumerate(self._rows)}
+        for row in rows:
+            i = by_id.get(row.get("id"))
+            if i is None:
+                self._rows.append(dict(row))
+            else:
+                self._rows[i] = {**self._rows[i], **row}
+        if self.order:
+            self._rows.sort(key=lambda r: str(r.get(self.order, "")), reverse=self.descending)
+        if self.limit is not None:
+            del self._rows[self.limit:]
+        self._counters["upserts"] += 1
+
+    def invalidate(self) -> None:
+        """Force a refetch on the next read."""
+        self._expires = 0.0
+        self._counters["invalidations"] += 1
+
+    def stats(self) -> dict:
+        return {**self._counters, "rows": len(self._rows)}
@@ -4,19 +4,27 @@ import os
 import random
 import logging
 import json
-import google.generativeai as genai
-from memory import custodian
+import time
+from functools import lru_cache
 from datetime import datetime, timezone
 
 # Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("worker")
 
-from config import GOOGLE_API_KEY
-
-# AI Setup
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+from config import (
+    GOOGLE_API_KEY, AGENT_CONCURRENCY, LLM_RATE_PER_MIN, LLM_BURST,
+    LLM_BACKEND, LLM_MODEL, LLM_CONTEXT_CACHE, LLM_MOCK_LATENCY,
+    PROMPT_BUDGET_TASK, PROMPT_BUDGET_CONTEXT, PROMPT_BUDGET_INBOX, CONTEXT_MODE, CONTEXT_FULL_REFRESH,
+    MIN_POLL_INTERVAL, MAX_POLL_INTERVAL, MAX_IDLE_INTERVAL, WORKER_WAKE_MODE,
+    WORKER_LEASES, WORKER_ID, WORKER_LEASE_TTL, WORKER_LEASE_BATCH,
+)
+from events import AdaptiveBackoff, wakeup
+from leases import Leases
+from llm import create_llm
+from metrics import agent_actions, agent_parse_failures, llm_request_duration
+from prompt import ContextSnapshot, ContextTracker, PromptAssembler, PromptSection, render_context
+from scheduler import AgentScheduler, ReplyClaims
 
 # Agent Definitions (Mirroring Route.ts but more detailed)
 SYSTEM_PROMPTS = {
@@ -27,121 +35,240 @@ SYSTEM_PROMPTS = {
     'THE DEPLOYER': "You are **The Deployer**. Operational. Focus: Git status, CI/CD pipeline health."
 }
 
+# Static half of every prompt; sent once per role as the system instruction
+RESPONSE_GUIDE = """
+Goal:
+Decide on your next immediate action.
+- If there is a new inbox item relevant to you, address it.
+- If not, make progress on your current task.
+- If idle, define a new task for yourself based on your role.
+
+Respond with one JSON decision:
+- action: "LOG" (general update) | "UPDATE_TASK" (change your task) | "REPLY" (respond to inbox item)
+- content: the content of the log, new task, or reply
+- thought: why you chose this action
+- target_id: ID of the inbox item if REPLYing
+"""
+
+@lru_cache(maxsize=None)
+def system_instruction(agent_name: str) -> str:
+    role = SYSTEM_PROMPTS.get(agent_name.upper(), "You are a helpful agent.")
+    return f"Role: {role}\n{RESPONSE_GUIDE}"
+
+_llm = None
+
+def get_llm():
+    """Shared LLM backend (one pooled model per role)."""
+    global _llm
+    if _llm is None:
+        _llm = create_llm(
+            LLM_BACKEND,
+            api_key=GOOGLE_API_KEY,
+            model_name=LLM_MODEL,
+            context_cache=LLM_CONTEXT_CACHE,
+            mock_latency=LLM_MOCK_LATENCY,
+        )
+    return _llm
+
+prompts = PromptAssembler()
+contexts = ContextTracker(full_refresh=CONTEXT_FULL_REFRESH)
+
+# Claims agents / inbox items so several workers can share one fleet
+leases = Leases(WORKER_ID, ttl=WORKER_LEASE_TTL, batch=WORKER_LEASE_BATCH or AGENT_CONCURRENCY) if WORKER_LEASES else None
+
+# One reply per NEW inbox item among this process's agents
+replies = ReplyClaims()
+
+scheduler = AgentScheduler(
+    concurrency=AGENT_CONCURRENCY,
+    rate_per_minute=LLM_RATE_PER_MIN,
+    burst=LLM_BURST,
+)
+
+async def run_agent_turn(agent: dict, snapshot: ContextSnapshot) -> dict | None:
+    """One agent decides and acts; returns the decision, or None if unusable."""
+    from memory import custodian
+    logger.info(f"🎲 Turn: {agent['name']}")
+
+    # HEARTBEAT UPDATE (Vital for Dashboard)
+    try:
+        await custodian.update_agent(agent["name"], {
+            "last_heartbeat": datetime.now(timezone.utc).isoformat()
+        }, defer=True)
+    except Exception as hb_err:
+        logger.error(f"⚠️ Heartbeat Update Failed: {hb_err}")
+
+    # Items answered since the snapshot was taken are off the table
+    snapshot = snapshot._replace(inbox=replies.visible(snapshot.inbox))
+    view = bodies = None  # What the model is shown; remembered once the turn succeeds
+    if CONTEXT_MODE == "delta":
+        context, inbox_text, view = contexts.render(agent["name"], snapshot)
+    else:
+        context = render_context(snapshot)
+        inbox_text, bodies = prompts.inbox_text(agent["name"], snapshot.inbox)
+
+    prompt, tokens_before, tokens_after = prompts.assemble([
+        PromptSection("Current Task", agent.get('current_task') or 'Monitoring system', PROMPT_BUDGET_TASK),
+        PromptSection("Context", context, PROMPT_BUDGET_CONTEXT),
+        PromptSection("Inbox (New items needing attention)", inbox_text, PROMPT_BUDGET_INBOX),
+    ])
+    logger.info(f"🧮 {agent['name']} prompt tokens: {tokens_before} → {tokens_after}")
+
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        text = await get_llm().generate(agent["name"], system_instruction(agent["name"]), prompt)
+        outcome = "ok"
+    finally:
+        llm_request_duration.observe(time.perf_counter() - start, backend=LLM_BACKEND, outcome=outcome)
+
+    try:
+        decision = json.loads(text)
+    except json.JSONDecodeError:
+        agent_parse_failures.inc()
+        logger.error(f"❌ JSON Parse Error for {agent['name']}: {text}")
+        return None
+    agent_actions.inc(action=decision.get("action", "UNKNOWN"))
+    if view is not None:
+        contexts.remember(agent["name"], view)  # The model saw this context; next turn is relative to it
+    if bodies is not None:
+        prompts.remember(agent["name"], bodies)
+
+    # Execute Action
+    if decision["action"] == "LOG":
+        await custodian.save(decision["content"], category=f"{agent['name']} LOG", defer=True)
+
+    elif decision["action"] == "UPDATE_TASK":
+        await custodian.update_agent(agent["name"], {"current_task": decision["content"]}, defer=True)
+        await custodian.save(f"Changed task to: {decision['content']}", category=f"{agent['name']} TASK", defer=True)
+
+    elif decision["action"] == "REPLY":
+        # Another agent of this cycle may have answered it first
+        if decision.get("target_id") and not replies.claim(decision["target_id"]):
+            logger.info(f"🔁 {agent['name']}: inbox item {decision['target_id']} already answered; reply dropped")
+            return decision
+        # Another worker may be answering the same item
+        if decision.get("target_id") and leases and not await leases.claim_inbox_item(custodian, decision["target_id"], agent["name"]):
+            logger.info(f"🔒 {agent['name']}: inbox item {decision['target_id']} claimed elsewhere; reply dropped")
+            return decision
+        # Mark inbox item read
+        if decision.get("target_id"):
+            await custodian.update_inbox_item(decision.get("target_id"), {"status": "READ"}, defer=True)
+        # Save reply
+        await custodian.add_inbox_item({
+            "type": "MESSAGE",
+            "source": agent["name"],
+            "title": f"Reply from {agent['name']}",
+            "body": decision["content"],
+            "status": "READ",
+            "priority": "P2"
+        }, defer=True)
+
+    logger.info(f"✅ {agent['name']} Action: {decision['action']} - {decision['thought']}")
+    return decision
+
+async def idle(backoff: AdaptiveBackoff, changed: bool) -> None:
+    """Sleep between cycles. In events mode the sleep grows while nothing
+    changes and a /events notification ends it early."""
+    if WORKER_WAKE_MODE != "events":
+        sleep_time = random.randint(MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
+        logger.info(f"⏳ Sleeping {sleep_time}s...")
+        await asyncio.sleep(sleep_time)
+        return
+
+    delay = backoff.next(changed)
+    logger.info(f"⏳ Waiting up to {delay:.0f}s for events...")
+    if await wakeup.wait(delay):
+        logger.info("🔔 Woken by event")
+        backoff.reset()
+
 async def agent_loop():
-    """Main worker loop for autonomous agents."""
+    """Main worker loop: every cycle, each RUNNING agent takes a turn."""
     logger.info("🤖 Agent Worker Started")
     
-    if not GOOGLE_API_KEY:
+    if LLM_BACKEND == "gemini" and not GOOGLE_API_KEY:
         logger.error("❌ GOOGLE_API_KEY missing. Worker cannot think.")
         return
 
+    backoff = AdaptiveBackoff(MIN_POLL_INTERVAL, MAX_IDLE_INTERVAL)
+    last_seen = None  # fleet statuses + NEW inbox ids from the previous cycle
+
     while True:
+        changed = False
         try:
             # 1. Check Fleet Status
+            from memory import custodian
             if not custodian:
-                logger.warning("Supabase not connected. Retrying in 30s...")
+                logger.warning("Storage not configured. Retrying in 30s...")
                 await asyncio.sleep(30)
                 continue
 
-            fleet = custodian.get_fleet_status()
+            fleet = await custodian.get_fleet_status()
             active_agents = [a for a in fleet if a['status'] == 'RUNNING']
 
             if not active_agents:
-                logger.info("💤 No active agents. Pulse check in 60s...")
-                await asyncio.sleep(60)
+                logger.info("💤 No active agents.")
+                await idle(backoff, changed=False)
                 continue
 
-            # 2. Pick an Agent (Rate Limit Protection: 1 action per 15s)
-            agent = random.choice(active_agents)
-            logger.info(f"🎲 Selected Agent: {agent['name']}")
+            # Several workers: turn only the agents this one holds leases on
+            held: dict[str, dict] = {}
+            if leases:
+                active_agents = await leases.claim_agents(custodian, held)
+                if not active_agents:
+                    logger.info("🔒 Every running agent is leased by another worker.")
+                    await idle(backoff, changed=False)
+                    continue
 
-            # HEARTBEAT UPDATE (Vital for Dashboard)
-            try:
-                custodian.db.table("agents").update({
-                    "last_heartbeat": datetime.now(timezone.utc).isoformat()
-                }).eq("name", agent["name"]).execute()
-            except Exception as hb_err:
-                logger.error(f"⚠️ Heartbeat Update Failed: {hb_err}")
-
-            # 3. Context & Prompting
-            inbox = custodian.get_inbox(status="NEW", limit=5)
-            context = custodian.build_context_summary()
-            
-            prompt = f"""
-            Role: {SYSTEM_PROMPTS.get(agent['name'].upper(), "You are a helpful agent.")}
-            Current Task: {agent.get('current_task', 'Monitoring system')}
-            
-            Context:
-            {context}
-            
-            Inbox (New items needing attention):
-            {json.dumps(inbox, default=str)}
-
-            Goal:
-            Decide on your next immediate action. 
-            - If there is a new inbox item relevan to you, address it.
-            - If not, make progress on your current task.
-            - If idle, define a new task for yourself based on your role.
-
-            Output strictly JSON:
-            {{
-                "action": "LOG" (general update) | "UPDATE_TASK" (change your task) | "REPLY" (respond to inbox item),
-                "content": "The content of the log, new task, or reply",
-                "thought": "Why you chose this action",
-                "target_id": "ID of inbox item if REPLYing"
-            }}
-            """
-
-
-
-
-            model = genai.GenerativeModel("gemini-2.0-flash")
-            response = await model.generate_content_async(prompt) # Async call if supported, else sync
-            # Note: generate_content_async is standard in python sdk
-            
-            text = response.text
-            # Clean json
-            text = text.replace("```json", "").replace("```", "").strip()
-            
+            # 2. Shared context — one inbox fetch serves the summary and every prompt
+            if leases:
+                custodian.inbox_view.invalidate()  # Other workers' claims and replies never patch this view
+            inbox = await custodian.get_inbox(status="NEW")
+            if leases:
+                inbox = leases.visible(inbox)
+            inbox = replies.open(inbox)
+            seen = ({(a["name"], a["status"]) for a in fleet}, {i.get("id") for i in inbox})
+            changed, last_seen = seen != last_seen, seen
+            snapshot = await custodian.context_snapshot(fleet=fleet, inbox=inbox)
+
+            # 3. Concurrent turns; the token bucket protects the Gemini quota.
+            # With leases, the next batch is claimed as turns free up.
             try:
-                decision = json.loads(text)
-                
-                # Execute Action
-                if decision["action"] == "LOG":
-                    custodian.save(decision["content"], category=f"{agent['name']} LOG")
-                    
-                elif decision["action"] == "UPDATE_TASK":
-                    custodian.db.table("agents").update({"current_task": decision["content"]}).eq("name", agent["name"]).execute()
-                    custodian.save(f"Changed task to: {decision['content']}", category=f"{agent['name']} TASK")
-                    
-                elif decision["action"] == "REPLY":
-                    # Mark inbox item read
-                    if decision.get("target_id"):
-                        custodian.db.table("inbox_items").update({"status": "READ"}).eq("id", decision.get("target_id")).execute()
-                    # Save reply
-                    custodian.db.table("inbox_items").insert({
-                        "type": "MESSAGE",
-                        "source": agent["name"],
-                        "title": f"Reply from {agent['name']}",
-                        "body": decision["content"],
-                        "status": "READ",
-                        "priority": "P2"
-                    }).execute()
-
-                logger.info(f"✅ {agent['name']} Action: {decision['action']} - {decision['thought']}")
-
-            except json.JSONDecodeError:
-                logger.error(f"❌ JSON Parse Error for {agent['name']}: {text}")
+                await scheduler.run_cycle(
+                    active_agents,
+                    lambda agent: run_agent_turn(agent, snapshot),
+                    inbox=inbox,
+                    refill=(lambda: leases.claim_agents(custodian, held)) if leases else None,
+                )
+            finally:
+                if leases:
+                    await leases.release_agents(custodian, list(held.values()))
+            logger.info(f"📊 Scheduler: {scheduler.stats()}")
+            if CONTEXT_MODE == "delta":
+                logger.info(f"🧾 Context: {contexts.stats()}")
+            if leases:
+                logger.info(f"🔒 Leases: {leases.stats()}")
 
         except Exception as e:
             logger.error(f"❌ Worker Loop Error: {e}")
 
-        # Sleep between turns
-        from config import MIN_POLL_INTERVAL, MAX_POLL_INTERVAL
-        sleep_time = random.randint(MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
-        logger.info(f"⏳ Sleeping {sleep_time}s...")
-        await asyncio.sleep(sleep_time)
+        await idle(backoff, changed)
+
+async def main():
+    """Standalone worker process, for running the agent loop apart from
+    the API (WORKER_MODE=external there)."""
+    if WORKER_WAKE_MODE == "events":
+        logger.warning("⚠️ /events wakeups reach the API process only; this worker "
+                       f"idles on backoff up to {MAX_IDLE_INTERVAL}s (WORKER_WAKE_MODE=poll to poll instead)")
+    try:
+        await agent_loop()
+    finally:
+        from memory import custodian
+        if custodian:
+            await custodian.aclose()  # Flushes the write-behind buffer
 
 if __name__ == "__main__":
-    # Test Run
-    asyncio.run(agent_loop())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,186 @@
+"""
+Write-Behind Buffer — Coalesced, batched PostgREST writes
+
+- Inserts are grouped per table (and column set) into one bulk POST
+- Repeated updates to the same row collapse into one PATCH carrying the
+  latest value of every column (e.g. a burst of heartbeats)
+- Flushes when WRITE_BEHIND_MAX_BATCH writes are pending, every
+  WRITE_BEHIND_INTERVAL seconds, and on close()
+- Writes the storage backend failed to apply (transport errors, busy or
+  unavailable database) are requeued; ones it rejected are dropped, and
+  both are logged and counted
+- Counters for queue depth, coalescing and flush latency
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable
+
+import httpx
+
+from db import AsyncPostgrest, PostgrestError
+
+logger = logging.getLogger("writebehind")
+
+
+class WriteBehind:
+    """Buffers inserts and updates for one PostgREST client."""
+
+    UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    UNAPPLIED_STATUS = {429, 503}  # Rate limited, or the database was unavailable / locked (SQLite)
+    RETRY_STATUS = AsyncPostgrest.RETRY_STATUS  # Also gateway errors, for writes safe to repeat
+
+    def __init__(
+        self,
+        db: AsyncPostgrest,
+        max_batch: int = 200,
+        interval: float = 1.0,
+        max_pending: int = 10_000,
+        on_flush: Callable[[str, list[dict], set], None] | None = None,
+    ):
+        self.db = db
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending  # Writers wait for a flush beyond this
+        self.on_flush = on_flush  # Called with (table, returned rows, columns) after each write lands
+        self._inserts: dict[tuple[str, frozenset], list[dict]] = {}
+        self._updates: dict[tuple[str, tuple], dict] = {}  # (table, filters) -> merged values
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        self._counters = {
+            "enqueued": 0, "coalesced": 0, "flushes": 0, "requests": 0,
+            "rows_written": 0, "requeued": 0, "dropped": 0,
+        }
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Writes waiting to be flushed (after coalescing)."""
+        return sum(len(rows) for rows in self._inserts.values()) + len(self._updates)
+
+    async def insert(self, table: str, row: dict) -> None:
+        """Queue one row for a later bulk insert."""
+        self._inserts.setdefault((table, frozenset(row)), []).append(row)
+        await self._enqueued()
+
+    async def update(self, table: str, values: dict, filters: dict[str, str]) -> None:
+        """Queue a PATCH; merges into any pending update of the same rows."""
+        if not filters:
+            raise ValueError("update() without filters would touch every row")
+        key = (table, tuple(sorted(filters.items())))
+        pending = self._updates.get(key)
+        if pending is None:
+            self._updates[key] = dict(values)
+        else:
+            pending.update(values)
+            self._counters["coalesced"] += 1
+        await self._enqueued()
+
+    async def _enqueued(self) -> None:
+        self._counters["enqueued"] += 1
+        if self._closed:
+            await self.flush()  # Shutting down: write through
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        depth = self.depth
+        if depth >= self.max_pending:
+            await self.flush()  # Backpressure: the database is not keeping up
+        elif depth >= self.max_batch:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"⚠️ Write-behind flush failed: {e}")
+
+    async def flush(self) -> None:
+        """Write everything pending; concurrent callers wait for one flush."""
+        async with self._flush_lock:
+            if not self._inserts and not self._updates:
+                return
+            inserts, self._inserts = self._inserts, {}
+            updates, self._updates = self._updates, {}
+
+            start = time.perf_counter()
+            jobs = [self._write_insert(table, rows) for (table, _), rows in inserts.items()]
+            jobs += [self._write_update(key, values) for key, values in updates.items()]
+            await asyncio.gather(*jobs)
+            elapsed = (time.perf_counter() - start) * 1000
+
+            self._counters["flushes"] += 1
+            self._last_flush_ms = elapsed
+            self._max_flush_ms = max(self._max_flush_ms, elapsed)
+
+    async def _write_insert(self, table: str, rows: list[dict]) -> None:
+        for i in range(0, len(rows), self.max_batch):
+            batch = rows[i:i + self.max_batch]
+            try:
+                written = await self.db.insert(table, batch)
+            except Exception as e:
+                if self._should_requeue(e, len(batch), idempotent=False):
+                    key = (table, frozenset(batch[0]))
+                    self._inserts[key] = batch + self._inserts.get(key, [])
+                continue
+            self._written(table, written, len(batch), set(batch[0]))
+
+    async def _write_update(self, key: tuple[str, tuple], values: dict) -> None:
+        table, filters = key
+        try:
+            written = await self.db.update(table, values, dict(filters))
+        except Exception as e:
+            if self._should_requeue(e, 1, idempotent=True):
+                # Values queued since this flush began are newer
+                self._updates[key] = {**values, **self._updates.get(key, {})}
+            return
+        self._written(table, written, 1, set(values))
+
+    def _written(self, table: str, rows: list[dict], count: int, columns: set) -> None:
+        self._counters["requests"] += 1
+        self._counters["rows_written"] += count
+        if self.on_flush is not None:
+            self.on_flush(table, rows, columns)
+
+    def _should_requeue(self, error: Exception, count: int, idempotent: bool) -> bool:
+        """Writes that failed in transit or on a busy database are retried
+        next flush (inserts only if they were certainly not applied); ones
+        the storage rejected are dropped."""
+        if isinstance(error, PostgrestError):
+            retryable = error.status_code in (self.RETRY_STATUS if idempotent else self.UNAPPLIED_STATUS)
+        else:
+            retryable = isinstance(error, httpx.TransportError if idempotent else self.UNSENT_ERRORS)
+        if retryable and not self._closed:
+            self._counters["requeued"] += count
+            logger.warning(f"⚠️ Write-behind requeued {count} write(s): {error}")
+            return True
+        self._counters["dropped"] += count
+        logger.error(f"❌ Write-behind dropped {count} write(s): {error}")
+        return False
+
+    async def close(self) -> None:
+        """Stop the background flusher and write out what is left."""
+        self._closed = True
+        if self._task is not None:
+            self._wake.set()  # Let an in-progress flush finish rather than cancel it
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "depth": self.depth,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+            "max_flush_ms": round(self._max_flush_ms, 2),
+        }
@@ -14,6 +14,8 @@ export const agents = pgTable("agents", {
     currentTask: text("current_task"),
     lastHeartbeat: timestamp("last_heartbeat").defaultNow(),
     config: jsonb("config"), // Model, Tools
+    leaseOwner: text("lease_owner"), // Worker holding this agent's turn (WORKER_LEASES)
+    leaseExpiresAt: timestamp("lease_expires_at", { withTimezone: true }),
 });
 
 // 2. Tasks (The Intent)
@@ -55,6 +57,8 @@ export const inboxItems = pgTable("inbox_items", {
     priority: inboxPriorityEnum("priority").default('P2'),
     status: inboxStatusEnum("status").default('NEW'),
     metadata: jsonb("metadata"), // External IDs
+    leaseOwner: text("lease_owner"), // Worker replying to this item (WORKER_LEASES)
+    leaseExpiresAt: timestamp("lease_expires_at", { withTimezone: true }),
     createdAt: timestamp("created_at").defaultNow(),
 });
 